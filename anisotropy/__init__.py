@@ -34,6 +34,19 @@ env.update(
     db_name = "anisotropy",
     db_path = env["BUILD"],
     salome_timeout = 15 * 60,
+    # Time limits of OpenFOAM solvers in seconds (None for no limit)
+    potentialfoam_timeout = 30 * 60,
+    simplefoam_timeout = None,
+    # Defaults of `convergence` of flow, overridden by keys of structure in configuration.
+    # Solver runs to `endTime` unless configuration enables early stop
+    flow_convergence = dict(enabled = False, tolerance = 1e-3, window = 100, minIterations = 200),
+    # Defaults of `writePolicy` of flow, overridden by keys of structure in configuration.
+    # Same as controlDict of template, so output is changed only by configuration
+    flow_writepolicy = dict(format = "ascii", compression = False, purgeWrite = 0, writeInterval = 50, writeAtEnd = False),
+    job_lease = 5 * 60,
+    db_timeout = 30,
+    db_retries = 8,
+    db_theta_digits = 6,
     openfoam_template = os.path.join(env["ROOT"], "anisotropy/openfoam/template")
 )
 
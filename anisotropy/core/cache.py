@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# This file is part of anisotropy.
+# License: GNU GPL version 3, see the file "LICENSE" for details.
+
+import os
+import json
+import shutil
+import tempfile
+import hashlib
+import logging
+
+from anisotropy import env
+
+logger = logging.getLogger(env["logger_name"])
+
+
+def normalize(value):
+    """Rounds floats in nested structure, so float drift (e.g. 0.07000000000000001) 
+    does not change a hash
+    """
+    if isinstance(value, float):
+        return float("{:.12g}".format(value))
+
+    elif isinstance(value, dict):
+        return { k: normalize(v) for k, v in value.items() }
+
+    elif isinstance(value, (list, tuple)):
+        return [ normalize(v) for v in value ]
+
+    else:
+        return value
+
+
+class Cache(object):
+    """Content-addressed storage of computed files. Each entry is a directory 
+    named by hash of parameters, which contains files and `manifest.json` 
+    with metadata.
+
+    :param root:
+        Path to cache directory
+    """
+    manifest = "manifest.json"
+
+    def __init__(self, root: str):
+        self.root = root
+
+
+    @staticmethod
+    def key(*params) -> str:
+        """Hash of parameters
+
+        :return: Hex digest
+        """
+        raw = json.dumps(normalize(params), sort_keys = True, default = str)
+
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+
+    def get(self, key: str) -> dict:
+        """Loads metadata of entry
+
+        :return: Metadata or None if entry does not exist
+        """
+        manifestpath = os.path.join(self.path(key), self.manifest)
+
+        if not os.path.exists(manifestpath):
+            return None
+
+        with open(manifestpath, "r") as io:
+            return json.load(io)
+
+
+    def put(self, key: str, files: list, meta: dict):
+        """Stores files and metadata. Entry appears atomically, 
+        so concurrent readers never see a partial entry.
+
+        :param files:
+            List of paths to files
+        """
+        if os.path.exists(self.path(key)):
+            logger.debug(f"Cache entry { key } is already stored")
+
+            return
+
+        # Unique for every process and thread
+        os.makedirs(self.root, exist_ok = True)
+        tmppath = tempfile.mkdtemp(prefix = f".tmp-{ key }-", dir = self.root)
+
+        for filepath in files:
+            link(filepath, os.path.join(tmppath, os.path.basename(filepath)))
+
+        with open(os.path.join(tmppath, self.manifest), "w") as io:
+            json.dump(dict(meta, files = [ os.path.basename(f) for f in files ]), io, default = str)
+
+        try:
+            os.rename(tmppath, self.path(key))
+            logger.info(f"Cache entry { key } stored")
+
+        except OSError:
+            shutil.rmtree(tmppath, ignore_errors = True)
+
+            if not os.path.exists(self.path(key)):
+                raise
+
+            # Entry was stored by another process
+            logger.debug(f"Cache entry { key } is already stored")
+
+
+    def fetch(self, key: str, filename: str, dst: str):
+        """Places file of entry to destination"""
+        if os.path.exists(dst):
+            os.remove(dst)
+
+        link(os.path.join(self.path(key), filename), dst)
+
+
+def link(src: str, dst: str):
+    """Creates hard link or copies file if linking is not possible"""
+    try:
+        os.link(src, dst)
+
+    except OSError:
+        shutil.copyfile(src, dst)
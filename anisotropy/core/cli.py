@@ -139,6 +139,7 @@ def init(path):
 def update(force, params, path):
     from anisotropy import env
     from anisotropy.core.main import Anisotropy, Database
+    from peewee import chunked
 
     env.update(
         LOG = os.path.join(path, "logs"),
@@ -159,22 +160,21 @@ def update(force, params, path):
     click.echo("Configuring database ...")
     database.setup()
 
-    if database.isempty() or update:
-        paramsAll = model.loadFromScratch(env["CONFIG"])
+    # Cases are expanded and written by chunks, unchanged cases are not written
+    count, total = 0, 0
+    paramsAll = model.loadFromScratch(env["CONFIG"], args.get("type"), args.get("direction"), args.get("theta"))
 
-        if args.get("type"):
-            paramsAll = [ entry for entry in paramsAll if args["type"] == entry["structure"]["type"] ]
+    for chunk in chunked(paramsAll, 500):
+        changed = chunk if force else database.changedCases(chunk)
 
-        if args.get("direction"):
-            paramsAll = [ entry for entry in paramsAll if args["direction"] == entry["structure"]["direction"] ]
+        if changed:
+            database.updateMany(changed)
 
-        if args.get("theta"):
-            paramsAll = [ entry for entry in paramsAll if args["theta"] == entry["structure"]["theta"] ]
+        count += len(changed)
+        total += len(chunk)
 
-        for entry in paramsAll:
-            database.update(entry)
-
-        click.echo("{} entries was updated.".format(len(paramsAll)))
+    if count:
+        click.echo("{} entries was updated ({} unchanged).".format(count, total - count))
 
     else:
         click.echo("Database was not modified.")
@@ -198,6 +198,36 @@ def update(force, params, path):
     default = 1,
     help = "Count of parallel processes"
 )
+@click.option(
+    "--mesh-nprocs", "meshNprocs",
+    type = click.INT,
+    default = None,
+    help = "Count of parallel processes for mesh stage (default: nprocs)"
+)
+@click.option(
+    "--flow-nprocs", "flowNprocs",
+    type = click.INT,
+    default = None,
+    help = "Count of parallel processes for flow stage (default: nprocs)"
+)
+@click.option(
+    "-r", "--ranks", "ranks",
+    type = click.INT,
+    default = 1,
+    help = "Count of MPI ranks for flow computation of one case (case is decomposed if greater than 1)"
+)
+@click.option(
+    "--warm-start", "warmStart",
+    is_flag = True,
+    default = False,
+    help = "Map initial fields from the nearest computed case (same type and direction)"
+)
+@click.option(
+    "-t", "--timeout", "timeout",
+    type = click.FLOAT,
+    default = None,
+    help = "Time limit for one stage of a case in seconds (worker is respawned after it)"
+)
 @click.option(
     "-f", "--force", "force",
     is_flag = True,
@@ -216,10 +246,14 @@ def update(force, params, path):
     default = os.getcwd(),
     help = "Specify directory to use (instead of cwd)"
 )
-def compute(stage, nprocs, force, params, path):
+def compute(stage, nprocs, meshNprocs, flowNprocs, ranks, warmStart, timeout, force, params, path):
     from anisotropy import env
-    from anisotropy.core.main import Anisotropy, Database, logger
-    from anisotropy.core.utils import setupLogger, parallel
+    from anisotropy.core.main import (
+        Database, logger, initStage, caseDone,
+        computeMeshStage, computeFlowStage, computePostProcessingStage
+    )
+    from anisotropy.core.database import DatabaseServer, QueueLease, jobOwner
+    from anisotropy.core.utils import setupLogger, pipeline
 
     env.update(
         LOG = os.path.join(path, "logs"),
@@ -249,98 +283,267 @@ def compute(stage, nprocs, force, params, path):
     logger.info("Loading database ...")
     database.setup()
 
-    params = database.loadGeneral(
+    # Cases of unfinished queue are resumed, others are already done
+    params = database.pendingJobs(
+        stage,
         args.get("type"), 
         args.get("direction"), 
         args.get("theta")
     )
+
+    if params and not force:
+        logger.info(f"Resuming job queue ({ len(params) } cases) ...")
+
+    else:
+        params = database.loadGeneral(
+            args.get("type"), 
+            args.get("direction"), 
+            args.get("theta")
+        )
+        queued = set(database.createJobs([ p["structure"]["structure_id"] for p in params ], stage))
+        params = [ p for p in params if p["structure"]["structure_id"] in queued ]
+
+    owner = jobOwner()
     queueargs = []
     
     for p in params:
         s = p["structure"]
 
         queueargs.append((s["type"], s["direction"], s["theta"]))
+
+    # Done cases are prefetched at once and finished here, so workers do not load them
+    cases = database.loadMany(queueargs)
+
+    if not force:
+        done = set([ n for n, case in enumerate(cases) if caseDone(case, stage) ])
+
+        if done:
+            logger.info(f"Skipping { len(done) } done cases ...")
+            database.finishJobs([ params[n]["structure"]["structure_id"] for n in done ], "Skipped")
+            queueargs = [ qarg for n, qarg in enumerate(queueargs) if n not in done ]
     
     ###
-    #   Wrap function
+    #   Run
     ##
-    def computeCase(type, direction, theta):
-        case = Anisotropy()
-        case.db = database
-        case.load(type, direction, theta)
-        case.evalParams()
-        case.update()
+    stages = []
+    # Decided by options as given, counts of stages are derived below
+    sequential = nprocs == 1 and not meshNprocs and not flowNprocs
 
-        logger.info(f"Case: type = { type }, direction = { direction }, theta = { theta }")
-        logger.info(f"Stage mode: { stage }")
+    if stage in ["mesh", "all"]:
+        stages.append((computeMeshStage, meshNprocs or nprocs))
 
-        if stage in ["mesh", "all"]:
-            case.load(type, direction, theta)
+    if stage in ["flow", "all"]:
+        flowNprocs = flowNprocs or nprocs
 
-            if not case.params["meshresult"]["meshStatus"] == "Done" or force:
-                logger.info("Current stage: mesh")
-                out, err, returncode = case.computeMesh(path)
+        # Cores of the node are shared by concurrent cases
+        if flowNprocs * ranks > os.cpu_count():
+            flowNprocs = max(1, os.cpu_count() // ranks)
+            logger.warning(f"Flow stage is limited to { flowNprocs } cases with { ranks } ranks each")
 
-                if out: logger.info(out)
-                if err: logger.error(err)
-                if returncode:
-                    logger.error("Mesh computation failed. Skipping flow computation ...")
+        stages.append((computeFlowStage, flowNprocs))
 
-                    return
+    if stage in ["postProcessing", "all"]:
+        stages.append((computePostProcessingStage, 1))
 
-            else:
-                logger.info("Mesh exists. Skipping ...")
+    logger.info(f"Stage mode: { stage }")
 
-        if stage in ["flow", "all"]:
-            case.load(type, direction, theta)
+    if sequential:
+        for qarg in queueargs:
+            for cmd, _ in stages:
+                if not cmd(*qarg, path = path, force = force, mode = stage, owner = owner, ranks = ranks, warmStart = warmStart):
+                    break
 
-            if not case.params["flowresult"]["flowStatus"] == "Done" or force:
-                logger.info("Current stage: flow")
-                out, err, returncode = case.computeFlow(path)
+    else:
+        # Only the coordinator writes to database, workers send requests to its server
+        # Cases waiting between stages keep leases of their jobs
+        with DatabaseServer(database, cases) as server, QueueLease(database, owner):
+            # Mesh and flow stages are executed by separate pools of processes,
+            # so next case is meshing while current case is solving
+            finished = pipeline(
+                stages, queueargs, 
+                params = dict(path = path, force = force, mode = stage, owner = owner, ranks = ranks, warmStart = warmStart),
+                timeout = timeout,
+                initializer = initStage,
+                initargs = (path, server.address, server.authkey)
+            )
+
+            for n, (pos, res) in enumerate(finished):
+                logger.info("Case {} finished with {} ({}/{})".format(
+                    queueargs[pos], "success" if res else "failure", n + 1, len(queueargs)
+                ))
 
-                if out: logger.info(out)
-                if err: logger.error(err)
-                if returncode:
-                    logger.error("Flow computation failed.")
+    if os.path.exists(pidpath):
+        logger.info("Removing pid ...")
+        os.remove(pidpath)
 
-                    return
+    logger.info("Computation done.")
 
-            else:
-                logger.info("Flow exists. Skipping ...")
 
-        if stage in ["postProcessing", "all"]:
-            case.load(type, direction, theta)
+@anisotropy.command(
+    help = "Collect flow rates and compute permeability of all computed cases."
+)
+@click.option(
+    "-p", "--params", "params", 
+    metavar = "key=value", 
+    multiple = True, 
+    cls = KeyValueOption,
+    help = "Select by control parameters (type, direction, theta)"
+)
+@click.option(
+    "-P", "--path", "path",
+    default = os.getcwd(),
+    help = "Specify directory to use (instead of cwd)"
+)
+def postprocess(params, path):
+    from anisotropy import env
+    from anisotropy.core.main import Database, collectFlowSeries, computePermeability
 
-            if case.params["meshresult"]["meshStatus"] == "Done":
-                logger.info("Current stage: mesh postProcessing")
-                case.porosity()
+    env.update(
+        LOG = os.path.join(path, "logs"),
+        BUILD = os.path.join(path, "build"),
+        CONFIG = os.path.join(path, "anisotropy.toml"),
+        db_path = path
+    )
 
-            else:
-                logger.warning("Cannot compute mesh post processing values.")
-            
-            if case.params["flowresult"]["flowStatus"] == "Done":
-                logger.info("Current stage: flow postProcessing")
-                case.flowRate()
+    args = dict()
 
-            else:
-                logger.warning("Cannot compute flow post processing values.")
+    for param in params:
+        args.update(param)
 
+    database = Database(env["db_name"], env["db_path"]) 
+    database.setup()
 
-    ###
-    #   Run
-    ##
-    if nprocs == 1:
-        for pos, qarg in enumerate(queueargs):
-            computeCase(*qarg)
+    count = collectFlowSeries(database, path, args.get("type"), args.get("direction"), args.get("theta"))
+    click.echo(f"Flow rates of { count } cases were collected.")
 
-    else:
-        parallel(nprocs, queueargs, computeCase)
+    count = computePermeability(database, args.get("type"), args.get("direction"), args.get("theta"))
+    click.echo(f"Permeability of { count } cases was computed.")
 
-    if os.path.exists(pidpath):
-        logger.info("Removing pid ...")
-        os.remove(pidpath)
 
-    logger.info("Computation done.")
+@anisotropy.command(
+    help = "Export results to Parquet dataset partitioned by structure type (appends only changed cases)."
+)
+@click.option(
+    "-P", "--path", "path",
+    default = os.getcwd(),
+    help = "Specify directory to use (instead of cwd)"
+)
+@click.option(
+    "-o", "--output", "output",
+    metavar = "PATH",
+    help = "Dataset directory (default: <path>/export)"
+)
+@click.option(
+    "--full", "full",
+    is_flag = True,
+    help = "Rewrite the whole dataset."
+)
+def export(path, output, full):
+    from anisotropy import env
+    from anisotropy.core.database import Database
+    from anisotropy.core.export import exportCases
+
+    env.update(
+        LOG = os.path.join(path, "logs"),
+        BUILD = os.path.join(path, "build"),
+        CONFIG = os.path.join(path, "anisotropy.toml"),
+        db_path = path
+    )
+
+    database = Database(env["db_name"], env["db_path"]) 
+    database.setup()
+
+    output = output or os.path.join(path, "export")
+
+    try:
+        count = exportCases(database, output, full = full)
+
+    except ImportError as e:
+        click.echo(e)
+
+        return
+
+    click.echo(f"{ count } cases were exported to { output }.")
+
+
+@anisotropy.command(
+    help = "Show progress of computation: counts per stage and status, throughput, durations and ETA."
+)
+@click.option(
+    "-P", "--path", "path",
+    default = os.getcwd(),
+    help = "Specify directory to use (instead of cwd)"
+)
+@click.option(
+    "-w", "--window", "window",
+    type = click.FLOAT,
+    default = 60,
+    help = "Sliding window for throughput in minutes (default: 60)"
+)
+@click.option(
+    "--watch", "watch",
+    type = click.FLOAT,
+    help = "Refresh every N seconds"
+)
+def status(path, window, watch):
+    import time
+    from datetime import timedelta
+    from anisotropy import env
+    from anisotropy.core.database import Database
+
+    env.update(
+        LOG = os.path.join(path, "logs"),
+        BUILD = os.path.join(path, "build"),
+        CONFIG = os.path.join(path, "anisotropy.toml"),
+        db_path = path
+    )
+
+    database = Database(env["db_name"], env["db_path"]) 
+    database.setup()
+
+    def duration(seconds) -> str:
+        return str(timedelta(seconds = round(seconds))) if seconds is not None else "-"
+
+    def counts(src: dict) -> str:
+        return ", ".join([ f"{ k } = { v }" for k, v in sorted(src.items(), key = lambda item: str(item[0])) ]) or "-"
+
+    pidpath = os.path.join(path, "anisotropy.pid")
+
+    while True:
+        res = database.status(window * 60)
+        pid = None
+
+        if os.path.exists(pidpath):
+            with open(pidpath, "r") as io:
+                pid = io.read().strip()
+
+        lines = [
+            f"Running (pid { pid })" if pid else "Not running",
+            f"Cases: { res['cases'] }",
+            f"Mesh: { counts(res['mesh']) }",
+            f"Flow: { counts(res['flow']) }"
+        ]
+
+        for stage, statuses in res["jobs"].items():
+            lines.append(f"Jobs ({ stage }): { counts(statuses) }")
+
+        for stage, stats in res["durations"].items():
+            lines.append(f"Time of { stage }: mean = { duration(stats['mean']) }, p95 = { duration(stats['p95']) } ({ stats['count'] } cases)")
+
+        lines.extend([
+            f"Throughput: { round(res['throughput'], 1) } cases/h (last { window } min)",
+            f"Remaining: { res['remaining'] }, ETA: { duration(res['eta']) }"
+        ])
+
+        if watch:
+            click.clear()
+
+        click.echo("\n".join(lines))
+
+        if not watch:
+            break
+
+        time.sleep(watch)
 
 
 @anisotropy.command(
@@ -421,7 +624,7 @@ def computemesh(root, type, direction, theta, path):
     metavar = "key=value", 
     multiple = True, 
     cls = KeyValueOption,
-    help = "Select by control parameters (type, direction, theta)"
+    help = "Select by fields (type, direction, theta or any field from '--list')"
 )
 @click.option(
     "-P", "--path", "path",
@@ -446,17 +649,40 @@ def computemesh(root, type, direction, theta, path):
     cls = CliListOption,
     help = "Select fields to use."
 )
+@click.option(
+    "--sort", "sort",
+    metavar = "f1,-f2,...",
+    cls = CliListOption,
+    help = "Sort by fields, '-' prefix for descending order (default: type,direction,theta)."
+)
+@click.option(
+    "--limit", "limit",
+    type = click.INT,
+    help = "Maximum count of rows."
+)
+@click.option(
+    "--offset", "offset",
+    type = click.INT,
+    default = 0,
+    help = "Skip first rows."
+)
+@click.option(
+    "--page-size", "pagesize",
+    type = click.INT,
+    default = 100,
+    help = "Count of rows printed at once."
+)
 @click.argument(
     "output",
     required = False,
     type = click.Choice(["cli", "plot"]),
     default = "cli"
 )
-def show(params, path, printlist, export, fields, output):
+def show(params, path, printlist, export, fields, sort, limit, offset, pagesize, output):
     from anisotropy import env
-    from anisotropy.core.database import Database, Structure
-    from pandas import DataFrame, Series
-    import matplotlib.pyplot as plt
+    from anisotropy.core.database import Database
+    from pandas import DataFrame
+    from peewee import chunked
 
     env.update(
         LOG = os.path.join(path, "logs"),
@@ -475,86 +701,95 @@ def show(params, path, printlist, export, fields, output):
     db = Database(env["db_name"], env["db_path"]) 
     db.setup()
 
-    searchargs = []
-
-    if args.get("type"):
-        searchargs.append(Structure.type == args["type"])
-
-    if args.get("direction"):
-        searchargs.append(Structure.direction == str(args["direction"]))
-
-    if args.get("theta"):
-        searchargs.append(Structure.theta == args["theta"])
-
-    result = db.search(searchargs)
-    result.sort(key = lambda src: f"{ src['type'] }{ src['direction'] }{ src['theta'] }")
-
-    df = DataFrame(result)
-    df_keys = [ key for key in df.keys() ]
+    available = db.caseFields()
     
     if printlist:
         click.echo("Avaliable fields for query:")
-        click.echo("\t{}".format("\n\t".join(df_keys)))
+        click.echo("\t{}".format("\n\t".join(available)))
 
         return
 
-    if not result:
-        click.echo("Empty result.")
+    fields = fields or [ available ]
+    
+    for field in [ *args.keys(), *sum(fields, []), *[ f.lstrip("-") for f in sort or [] ] ]:
+        if field not in available:
+            click.echo(f"Unknown field '{ field }'. Try to use '--list' flag to see all avaliable fields.")
 
-        return
+            return
 
-    tables = []
+    # Fields, filters, sorting and paging are done by database, 
+    # so only selected rows and columns are fetched
+    def select(fieldslist: list):
+        return db.cases(fieldslist, args, sort, limit, offset)
 
-    if fields:
-        for fieldslist in fields:
-            for field in fieldslist:
-                if field not in df_keys:
-                    click.echo(f"Unknown field '{ field }'. Try to use '--list' flag to see all avaliable fields.")
+    supported = ["csv", "jpg"]
+    filepath, ext = os.path.splitext(export or "")
+    ext = ext.replace(".", "")
 
-                    return
-        
-            tables.append(df[fieldslist])
-    else:
-        tables.append(df)
+    if export and ext not in supported:
+        click.echo(f"Unknown extension '{ ext }'.")
+
+        return
+
+    if output == "plot" or ext == "jpg":
+        import matplotlib.pyplot as plt
 
-    if output == "plot":
         fig, ax = plt.subplots(nrows = 1, ncols = 1)
 
-        for table in tables:
+        for fieldslist in fields:
+            table = DataFrame(select(fieldslist[ :2]), columns = fieldslist[ :2])
             table.plot(table.keys()[0], table.keys()[1], ax = ax, style = "o")
 
         plt.legend()
         plt.grid()
-    
-    if export:
-        supported = ["csv", "jpg"]
-        filepath, ext = os.path.splitext(export)
-        ext = ext.replace(".", "")
 
-        if ext not in supported:
-            click.echo(f"Unknown extension '{ ext }'.")
+        if ext == "jpg":
+            plt.savefig(export)
 
-            return
+        else:
+            plt.show()
+
+        return
+
+    def cell(value) -> str:
+        return "{:.10g}".format(value) if isinstance(value, float) else str(value)
 
+    empty = True
+
+    for n, fieldslist in enumerate(fields):
         if ext == "csv":
-            if len(tables) == 1:
-                tables[0].to_csv(export, sep = ";")
-            
-            else:
-                for n, table in enumerate(tables):
-                    table.to_csv("{}.{}.{}".format(filepath, n, ext), sep = ";")
-
-        elif ext == "jpg":
-            plt.savefig(export)
+            filename = export if len(fields) == 1 else "{}.{}.{}".format(filepath, n, ext)
 
-    else:
+        elif n > 0:
+            click.echo()
 
-        if output == "cli":
-            res = "\n\n".join([ table.to_string() for table in tables ])
-            click.echo(res)
+        # Widths are fixed by fields before the first page, so columns of all pages are aligned
+        widths = [ 
+            len(str(offset + limit)) if limit else 6, 
+            *[ max(len(field), 16) for field in fieldslist ] 
+        ]
 
-        elif output == "plot":
-            plt.show()
+        def line(values: list) -> str:
+            return "  ".join([ cell(value).rjust(width) for value, width in zip(values, widths) ])
+
+        for page, rows in enumerate(chunked(select(fieldslist), pagesize)):
+            empty = False
+
+            if ext == "csv":
+                table = DataFrame(rows, columns = fieldslist)
+                table.index += offset + page * pagesize
+                table.to_csv(filename, sep = ";", mode = "w" if page == 0 else "a", header = page == 0)
+
+                continue
+
+            if page == 0:
+                click.echo(line([ "", *fieldslist ]))
+
+            for m, row in enumerate(rows):
+                click.echo(line([ offset + page * pagesize + m, *[ row[field] for field in fieldslist ] ]))
+
+    if empty:
+        click.echo("Empty result.")
 
     
 ###
@@ -3,36 +3,124 @@
 # License: GNU GPL version 3, see the file "LICENSE" for details.
 
 import os
+import time
+import socket
 import logging
+import threading
+import random
+import functools
+from math import ceil
 from copy import deepcopy
+from multiprocessing.connection import Listener, Client, AuthenticationError, wait
 
 from anisotropy import env
 from anisotropy.core.utils import setupLogger
 from anisotropy.core.models import (
-    db, JOIN, 
+    db, JOIN, ArrayField, ListField, parseList,
     Structure, 
     Mesh, SubMesh, MeshResult, 
-    Flow, FlowApproximation, FlowResult
+    Flow, FlowApproximation, FlowResult,
+    Job
 )
-from peewee import OperationalError
+from peewee import OperationalError, IntegrityError, AutoField, ForeignKeyField, Table, Value, fn, chunked
+from playhouse.migrate import SqliteMigrator, migrate
 
 logger = logging.getLogger(env["logger_name"])
 #setupLogger(logger, logging.INFO, env["LOG"])
 
-# NOTE: Temporary solution for multiprocessing mode when database is locked
-def tryUntilDone(func):
+def caseKey(type: str, direction: list, theta: float) -> str:
+    """Canonical identifier of case. Direction is normalized and theta is 
+    rounded to `env['db_theta_digits']`, so float drift like 0.07000000000000001 
+    and representations like [1, 0, 0] and [1.0, 0.0, 0.0] give the same key.
+
+    NOTE: Theta is not quantised to the step of configuration, because keys of 
+    stored cases would change with the step. Steps finer than the digits are 
+    rejected by :meth:`anisotropy.core.main.Anisotropy.loadFromScratch`.
+    """
+    digits = env["db_theta_digits"]
+    direction = ",".join([ "{:g}".format(float(v) + 0.0) for v in direction ])
+
+    return "{}/{}/{:.{}f}".format(type, direction, round(float(theta), digits) + 0.0, digits)
+
+
+def structureFilter(query, type: str = None, direction: list = None, theta: float = None):
+    """Applies control parameters to query of Structure"""
+    if type and direction and theta:
+        return query.where(Structure.key == caseKey(type, direction, theta))
+
+    if type:
+        query = query.where(Structure.type == type)
+
+    if direction:
+        query = query.where(Structure.direction == Value([ float(v) for v in direction ], unpack = False))
+
+    if theta:
+        half = 0.5 * 10 ** -env["db_theta_digits"]
+        query = query.where(Structure.theta.between(theta - half, theta + half))
+
+    return query
+
+
+def jobOwner(pid: int = None) -> str:
+    """Identifier of job owner (host and pid of coordinator process)"""
+    return f"{ socket.gethostname() }:{ pid or os.getpid() }"
+
+
+def ownerAlive(owner: str) -> bool:
+    """Checks if the process of job owner is running. 
+    Owners of other hosts can not be checked and are considered alive.
+    """
+    host, _, pid = (owner or "").rpartition(":")
+
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+
+    try:
+        os.kill(int(pid), 0)
+
+    except ProcessLookupError:
+        return False
+
+    except PermissionError:
+        pass
+
+    return True
+
+
+class DatabaseLockedError(OperationalError):
+    """Database is still locked after all retries"""
+    pass
+
+
+def retryOnLock(func, retries: int = None, delay: float = 0.05, maxDelay: float = 5):
+    """Retries function if database is locked by another connection. 
+    Delay grows exponentially with random jitter, so concurrent writers 
+    do not retry at the same moment.
+
+    :param retries:
+        Count of retries (default: env['db_retries'])
+
+    :raise DatabaseLockedError:
+        If retries are exhausted
+    """
+    @functools.wraps(func)
     def inner(*args, **kwargs):
-        done = False 
+        count = env["db_retries"] if retries is None else retries
 
-        while not done:
+        for attempt in range(count + 1):
             try:
-                ret = func(*args, **kwargs)
-                done = True
+                return func(*args, **kwargs)
 
             except OperationalError as e:
-                logger.error(e)
+                if not any(msg in str(e) for msg in ["locked", "busy"]):
+                    raise
+
+                if attempt == count:
+                    raise DatabaseLockedError(f"{ func.__name__ }: { e } (after { count } retries)") from e
 
-        return ret
+                wait = min(maxDelay, delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.debug(f"{ func.__name__ }: { e }. Retrying in { round(wait, 2) } s ...")
+                time.sleep(wait)
 
     return inner
 
@@ -44,22 +132,163 @@ class Database(object):
         self.__db = db
 
 
+    # Databases which schema is already checked by current process
+    _checked = set()
+
     def setup(self):
         os.makedirs(self.filepath, exist_ok = True)
 
         fullpath = os.path.join(self.filepath, "{}.db".format(self.name))
-        self.__db.init(fullpath)
 
-        if not os.path.exists(fullpath):
-            self.__db.create_tables([
-                Structure, 
-                Mesh,
-                SubMesh,
-                MeshResult,
-                Flow,
-                FlowApproximation,
-                FlowResult
-            ])
+        # Repeated setup of the same database keeps the connection
+        if self.__db.database == fullpath and fullpath in Database._checked:
+            return
+
+        # Readers are not blocked by writer in WAL mode, 
+        # writers are waiting for the lock instead of failing immediately
+        self.__db.init(
+            fullpath,
+            pragmas = { 
+                "foreign_keys": 1, 
+                "journal_mode": "wal", 
+                "synchronous": "normal",
+                "busy_timeout": int(env["db_timeout"] * 1000)
+            },
+            timeout = env["db_timeout"]
+        )
+
+        models = [
+            Structure, 
+            Mesh,
+            SubMesh,
+            MeshResult,
+            Flow,
+            FlowApproximation,
+            FlowResult,
+            Job
+        ]
+
+        # NOTE: Tables are created only if not exist, so new tables appear in old databases too.
+        # New columns are added to old tables before indexes are created on them
+        self._migrate(models)
+        self.__db.create_tables(models)
+        self._migrateIndexes(models)
+        self._upgrade()
+        self._createCaseView()
+        self._createRevisionTriggers()
+
+        Database._checked.add(fullpath)
+
+
+    # Version of data layout, stored in 'PRAGMA user_version'
+    schemaVersion = 3
+
+    def _upgrade(self):
+        """Converts data of old databases (columns are already added by :meth:`_migrate`)"""
+        version = self.__db.execute_sql("PRAGMA user_version").fetchone()[0]
+
+        if version >= self.schemaVersion:
+            return
+
+        with self.__db.atomic():
+            if version < 1:
+                # Canonical keys of cases
+                rows = []
+                used = set()
+
+                for structure in Structure.select(
+                        Structure.structure_id, Structure.type, Structure.direction, Structure.theta
+                    ).order_by(Structure.structure_id):
+                    key = caseKey(structure.type, structure.direction, structure.theta)
+
+                    if key in used:
+                        logger.warning(f"Duplicate case { key } (structure_id = { structure.structure_id }) is left without key")
+
+                        continue
+
+                    used.add(key)
+                    structure.key = key
+                    rows.append(structure)
+
+                if rows:
+                    logger.info(f"Writing keys of { len(rows) } cases ...")
+                    Structure.bulk_update(rows, fields = [ Structure.key ], batch_size = 100)
+
+            if version < 2:
+                # Lists were written with `str`, now numbers are packed and strings are JSON
+                for model, field in [
+                    (Structure, Structure.direction), 
+                    (Flow, Flow.scale), 
+                    (Mesh, Mesh.facesToIgnore)
+                ]:
+                    pk = model._meta.primary_key
+                    cursor = self.__db.execute_sql(
+                        f'SELECT "{ pk.column_name }", "{ field.column_name }" FROM "{ model._meta.table_name }" '
+                        f"WHERE typeof(\"{ field.column_name }\") = 'text'"
+                    )
+                    # NOTE: None was written as 'None'
+                    rows = [ 
+                        model(**{ pk.name: id, field.name: parseList(value) if value != "None" else None }) 
+                            for id, value in cursor 
+                    ]
+
+                    if rows:
+                        logger.info(f"Converting { len(rows) } values of { model._meta.table_name }.{ field.column_name } ...")
+                        model.bulk_update(rows, fields = [ field ], batch_size = 100)
+
+            if version < 3:
+                # Revisions of cases written before triggers, so they are exported as changed
+                self.__db.execute_sql(
+                    'UPDATE "structure" SET "revision" = '
+                    '(SELECT IFNULL(MAX("revision"), 0) FROM "structure") + "structure_id" '
+                    'WHERE "revision" IS NULL'
+                )
+
+            self.__db.execute_sql(f"PRAGMA user_version = { self.schemaVersion }")
+
+
+    def _migrate(self, models: list):
+        """Adds columns of new model fields to tables of old databases"""
+        migrator = SqliteMigrator(self.__db)
+        operations = []
+
+        for model in models:
+            table = model._meta.table_name
+
+            if not self.__db.table_exists(table):
+                continue
+
+            columns = [ column.name for column in self.__db.get_columns(table) ]
+
+            for field in model._meta.sorted_fields:
+                if field.column_name not in columns:
+                    logger.info(f"Adding column { table }.{ field.column_name } ...")
+                    operations.append(migrator.add_column(table, field.column_name, field))
+
+        if operations:
+            with self.__db.atomic():
+                migrate(*operations)
+
+
+    def _migrateIndexes(self, models: list):
+        """Makes indexes of old databases unique if required by models"""
+        for model in models:
+            table = model._meta.table_name
+            existing = { index.name: index.unique for index in self.__db.get_indexes(table) }
+
+            for index in model._meta.fields_to_index():
+                if index._name not in existing or existing[index._name] == index._unique:
+                    continue
+
+                logger.info(f"Recreating index { index._name } ...")
+
+                try:
+                    with self.__db.atomic():
+                        self.__db.execute_sql(f'DROP INDEX "{ index._name }"')
+                        model._schema.create_indexes(safe = True)
+
+                except IntegrityError as e:
+                    logger.error(f"Cannot create unique index { index._name }, duplicates should be removed: { e }")
 
 
     def isempty(self) -> bool:
@@ -73,56 +302,281 @@ class Database(object):
         return not query.exists()
 
 
+    # Tables of case parameters in order of joining
+    caseTables = [
+        ("structure", Structure),
+        ("mesh", Mesh),
+        ("submesh", SubMesh),
+        ("meshresult", MeshResult),
+        ("flow", Flow),
+        ("flowapproximation", FlowApproximation),
+        ("flowresult", FlowResult)
+    ]
+
+    # Values evaluated by computation instead of configuration
+    evaluated = {
+        "structure": [ "L", "r0", "radius", "fillets" ],
+        "mesh": [ "maxSize", "minSize", "chordalError" ],
+        "submesh": [ "maxSize", "minSize", "chordalError" ],
+        "meshresult": None,
+        "flowresult": None
+    }
+
     def load(self, structure_type: str, structure_direction: list, structure_theta: float) -> dict:
-        structureQuery = (
-            Structure
-            .select()
-            .where(
-                Structure.type == structure_type,
-                Structure.direction == str(structure_direction),
-                Structure.theta == structure_theta
+        """Loads parameters of case with one query (see :meth:`loadMany`)
+
+        :return:
+            Dict with parameters or empty dict if case is missed
+        """
+        params = self.loadMany([ (structure_type, structure_direction, structure_theta) ])[0]
+
+        if not params:
+            logger.error("Missed Structure table")
+
+        return params
+
+
+    def reload(self, structure_type: str, structure_direction: list, structure_theta: float) -> dict:
+        """Loads parameters of case written by another process (e.g. Salome). 
+        Same as :meth:`load`, but :class:`DatabaseServer` reads the case 
+        again instead of its cached copy.
+        """
+        return self.load(structure_type, structure_direction, structure_theta)
+
+
+    def loadMany(self, cases: list) -> list:
+        """Loads parameters of many cases. Every batch of cases is assembled 
+        from one query with outer joins of all tables.
+
+        :param cases:
+            List of control parameters (type, direction, theta)
+
+        :return:
+            List of dicts with parameters in order of cases (empty dict if case is missed)
+        """
+        keys = [ caseKey(*case) for case in cases ]
+        fields = [ field for _, model in self.caseTables for field in model._meta.sorted_fields ]
+        loaded = {}
+
+        # SQLite limits count of variables in one query
+        for batch in chunked(keys, 500):
+            query = (
+                Structure
+                .select(*fields)
+                .join(Mesh, JOIN.LEFT_OUTER, on = (Mesh.structure_id == Structure.structure_id))
+                .join(SubMesh, JOIN.LEFT_OUTER, on = (SubMesh.mesh_id == Mesh.mesh_id))
+                .join(MeshResult, JOIN.LEFT_OUTER, on = (MeshResult.mesh_id == Mesh.mesh_id))
+                .join(Flow, JOIN.LEFT_OUTER, on = (Flow.structure_id == Structure.structure_id))
+                .join(FlowApproximation, JOIN.LEFT_OUTER, on = (FlowApproximation.flow_id == Flow.flow_id))
+                .join(FlowResult, JOIN.LEFT_OUTER, on = (FlowResult.flow_id == Flow.flow_id))
+                .where(Structure.key.in_(batch))
+                .order_by(Structure.structure_id, SubMesh.submesh_id)
+                .tuples()
             )
+
+            # Row is a sequence of values of all tables, submeshes give several rows per case
+            for row in query:
+                pos = 0
+                values = {}
+
+                for name, model in self.caseTables:
+                    modelFields = model._meta.sorted_fields
+                    entry = dict(zip([ field.name for field in modelFields ], row[pos : pos + len(modelFields)]))
+                    pos += len(modelFields)
+
+                    # Primary key is NULL for missed rows of outer join
+                    if entry[model._meta.primary_key.name] is not None:
+                        values[name] = entry
+
+                params = loaded.setdefault(values["structure"]["key"], {})
+
+                for name, entry in values.items():
+                    if name == "submesh":
+                        params.setdefault("submesh", []).append(entry)
+
+                    else:
+                        params.setdefault(name, entry)
+
+        return [ loaded.get(key, {}) for key in keys ]
+
+
+    ###
+    #   Flat view of cases
+    ##
+    caseView = "cases"
+
+    def caseColumns(self) -> list:
+        """Columns of the flat view of cases: all tables except submeshes, 
+        without foreign keys and arrays. Names of repeated columns are prefixed 
+        with table name (e.g. 'flowapproximation_pressure').
+
+        :return:
+            List of (name, field)
+        """
+        columns = []
+        names = set()
+
+        for name, model in self.caseTables:
+            if model is SubMesh:
+                continue
+
+            for field in model._meta.sorted_fields:
+                if isinstance(field, (ForeignKeyField, ArrayField)):
+                    continue
+
+                column = field.column_name if field.column_name not in names else f"{ name }_{ field.column_name }"
+                names.add(column)
+                columns.append((column, field))
+
+        return columns
+
+
+    def _createCaseView(self):
+        """(Re)creates view with one row per case (see :meth:`caseColumns`)"""
+        columns = [ field.alias(column) for column, field in self.caseColumns() ]
+
+        query = (
+            Structure
+            .select(*columns)
+            .join(Mesh, JOIN.LEFT_OUTER, on = (Mesh.structure_id == Structure.structure_id))
+            .join(MeshResult, JOIN.LEFT_OUTER, on = (MeshResult.mesh_id == Mesh.mesh_id))
+            .join(Flow, JOIN.LEFT_OUTER, on = (Flow.structure_id == Structure.structure_id))
+            .join(FlowApproximation, JOIN.LEFT_OUTER, on = (FlowApproximation.flow_id == Flow.flow_id))
+            .join(FlowResult, JOIN.LEFT_OUTER, on = (FlowResult.flow_id == Flow.flow_id))
         )
-        
-        params = {}
+        sql, _ = query.sql()
+
+        self._replaceSchema("view", self.caseView, f'CREATE VIEW "{ self.caseView }" AS { sql }')
+
+
+    def _replaceSchema(self, type: str, name: str, sql: str):
+        """Recreates view or trigger if its definition is changed. 
+        Unchanged schema is not written, so setup does not wait for running writers.
+        """
+        current = self.__db.execute_sql(
+            "SELECT sql FROM sqlite_master WHERE type = ? AND name = ?", (type, name)
+        ).fetchone()
+
+        if current and current[0] == sql:
+            return
 
         with self.__db.atomic():
-            if structureQuery.exists():
-                params["structure"] = structureQuery.dicts().get()
+            self.__db.execute_sql(f'DROP { type.upper() } IF EXISTS "{ name }"')
+            self.__db.execute_sql(sql)
 
-                meshQuery = structureQuery.get().meshes
 
-                if meshQuery.exists():
-                    params["mesh"] = meshQuery.dicts().get()
+    def _createRevisionTriggers(self):
+        """(Re)creates triggers which set next revision to the case 
+        on every insert or update of its rows in any case table, so 
+        changed cases can be found whatever way they were written.
+        """
+        revision = (
+            'UPDATE "structure" SET "revision" = (SELECT IFNULL(MAX("revision"), 0) + 1 FROM "structure") '
+            'WHERE "structure_id" = {}'
+        )
+        structureID = {
+            Structure: 'NEW."structure_id"',
+            Mesh: 'NEW."structure_id"',
+            SubMesh: '(SELECT "structure_id" FROM "mesh" WHERE "mesh_id" = NEW."mesh_id")',
+            MeshResult: '(SELECT "structure_id" FROM "mesh" WHERE "mesh_id" = NEW."mesh_id")',
+            Flow: 'NEW."structure_id"',
+            FlowApproximation: '(SELECT "structure_id" FROM "flow" WHERE "flow_id" = NEW."flow_id")',
+            FlowResult: '(SELECT "structure_id" FROM "flow" WHERE "flow_id" = NEW."flow_id")'
+        }
+
+        for name, model in self.caseTables:
+            table = model._meta.table_name
+            # Revision itself is not a change
+            columns = ", ".join([ 
+                f'"{ field.column_name }"' for field in model._meta.sorted_fields 
+                    if field is not Structure.revision 
+            ])
 
-                    submeshQuery = meshQuery.get().submeshes
-                    
-                    if submeshQuery.exists():
-                        params["submesh"] = [ entry for entry in submeshQuery.dicts() ]
+            for event in [ "INSERT", f"UPDATE OF { columns }" ]:
+                trigger = f"{ table }_revision_{ event.split()[0].lower() }"
+                self._replaceSchema("trigger", trigger, 
+                    f'CREATE TRIGGER "{ trigger }" AFTER { event } ON "{ table }" '
+                    f'BEGIN { revision.format(structureID[model]) }; END'
+                )
 
-                    meshresultQuery = meshQuery.get().meshresults
 
-                    if meshresultQuery.exists():
-                        params["meshresult"] = meshresultQuery.dicts().get()
+    def caseFields(self) -> list:
+        """Names of columns of the flat view of cases"""
+        return [ column.name for column in self.__db.get_columns(self.caseView) ]
 
-                flowQuery = structureQuery.get().flows
 
-                if flowQuery.exists():
-                    params["flow"] = flowQuery.dicts().get()
+    def cases(self, fields: list = None, filters: dict = None, orderBy: list = None, 
+            limit: int = None, offset: int = None, since: int = None):
+        """Selects rows of the flat view of cases. Projection, filters, 
+        sorting and paging are done by SQL, rows are fetched lazily.
 
-                    flowapproximationQuery = flowQuery.get().flowapproximations
+        :param fields:
+            Names of columns, all columns if None
 
-                    if flowapproximationQuery.exists():
-                        params["flowapproximation"] = flowapproximationQuery.dicts().get()
+        :param filters:
+            Dict of column -> value (equality, type, direction and theta are matched like control parameters)
 
-                    flowresultsQuery = flowQuery.get().flowresults
+        :param orderBy:
+            Names of columns, prefix '-' for descending order (default: type, direction, theta)
 
-                    if flowresultsQuery.exists():
-                        params["flowresult"] = flowresultsQuery.dicts().get()
-            else:
-                logger.error("Missed Structure table")
+        :param since:
+            Select only cases changed after this revision
 
-        return params
+        :return:
+            Generator of dicts
+
+        :raise KeyError:
+            If unknown column is used
+        """
+        available = self.caseFields()
+        view = Table(self.caseView).bind(self.__db)
+
+        def column(name: str):
+            if name not in available:
+                raise KeyError(name)
+
+            return getattr(view.c, name)
+
+        filters = dict(filters or {})
+        orderBy = orderBy or [ "type", "direction", "theta" ]
+        query = view.select(*[ column(field) for field in (fields or available) ])
+
+        if filters.get("direction") is not None:
+            filters["direction"] = Structure.direction.db_value([ float(v) for v in filters["direction"] ])
+
+        if filters.get("theta") is not None:
+            theta = filters.pop("theta")
+            half = 0.5 * 10 ** -env["db_theta_digits"]
+            query = query.where(column("theta").between(theta - half, theta + half))
+
+        for name, value in filters.items():
+            query = query.where(column(name) == value)
+
+        if since is not None:
+            query = query.where(column("revision") > since)
+
+        query = query.order_by(*[ 
+            column(name[1:]).desc() if name.startswith("-") else column(name).asc() 
+            for name in orderBy 
+        ])
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        if offset:
+            query = query.offset(offset)
+
+        # View has no converters of model fields
+        lists = [ 
+            (column, field) for column, field in self.caseColumns() 
+                if isinstance(field, ListField) and column in (fields or available)
+        ]
+
+        for row in query.dicts().iterator():
+            for column, field in lists:
+                row[column] = field.python_value(row[column])
+
+            yield row
 
 
     def loadGeneral(self, type: str = None, direction: list = None, theta: float = None) -> list:
@@ -133,14 +587,7 @@ class Database(object):
         )
         response = []
 
-        if type:
-            query = query.where(Structure.type == type)
-
-        if direction:
-            query = query.where(Structure.direction == str(direction))
-
-        if theta:
-            query = query.where(Structure.theta == theta)
+        query = structureFilter(query, type, direction, theta)
 
         for entry in query.dicts():
             response.append({ "structure": entry })
@@ -148,6 +595,108 @@ class Database(object):
         return response
 
 
+    def nearestFlow(self, type: str, direction: list, theta: float, maxDistance: float = None) -> dict:
+        """Finds the case with the same type and direction and nearest theta 
+        which flow is computed
+
+        :param maxDistance:
+            Maximal difference of theta
+        
+        :return:
+            Structure parameters or None
+        """
+        distance = fn.ABS(Structure.theta - theta)
+        query = (
+            Structure
+            .select()
+            .join(Flow, JOIN.INNER, on = (Flow.structure_id == Structure.structure_id))
+            .join(FlowResult, JOIN.INNER, on = (FlowResult.flow_id == Flow.flow_id))
+            .where(
+                Structure.type == type,
+                Structure.direction == Value([ float(v) for v in direction ], unpack = False),
+                Structure.key != caseKey(type, direction, theta),
+                FlowResult.flowStatus == "Done"
+            )
+            .order_by(distance)
+            .limit(1)
+        )
+
+        if maxDistance is not None:
+            query = query.where(distance <= maxDistance)
+
+        entry = query.dicts().first()
+
+        return entry
+
+
+    def finishedFlows(self, type: str = None, direction: list = None, theta: float = None) -> list:
+        """Selects cases which flow is computed in one query
+
+        :return:
+            List of dicts with structure parameters and `flowresult_id`
+        """
+        query = (
+            Structure
+            .select(Structure, FlowResult.flowresult_id)
+            .join(Flow, JOIN.INNER, on = (Flow.structure_id == Structure.structure_id))
+            .join(FlowResult, JOIN.INNER, on = (FlowResult.flow_id == Flow.flow_id))
+            .where(FlowResult.flowStatus == "Done")
+            .order_by(Structure.type, Structure.direction, Structure.theta)
+        )
+
+        query = structureFilter(query, type, direction, theta)
+
+        return [ entry for entry in query.dicts() ]
+
+
+    def flowParameters(self, type: str = None, direction: list = None, theta: float = None) -> list:
+        """Selects parameters of computed cases required by permeability 
+        (structure, flow, flow result and cell geometry) in one query
+
+        :return:
+            List of flat dicts
+        """
+        query = (
+            Structure
+            .select(
+                Structure.type, Structure.direction, Structure.theta, 
+                Structure.L, Structure.r0,
+                Flow.scale, Flow.pressure, Flow.transportProperties,
+                FlowResult.flowresult_id, FlowResult.flowRate,
+                MeshResult.volumeCell
+            )
+            .join(Flow, JOIN.INNER, on = (Flow.structure_id == Structure.structure_id))
+            .join(FlowResult, JOIN.INNER, on = (FlowResult.flow_id == Flow.flow_id))
+            .join(Mesh, JOIN.INNER, on = (Mesh.structure_id == Structure.structure_id))
+            .join(MeshResult, JOIN.INNER, on = (MeshResult.mesh_id == Mesh.mesh_id))
+            .where(FlowResult.flowStatus == "Done")
+            .order_by(Structure.type, Structure.direction, Structure.theta)
+        )
+
+        query = structureFilter(query, type, direction, theta)
+
+        return [ entry for entry in query.dicts() ]
+
+
+    def updateFlowResults(self, results: list, fields: list, batchSize: int = 100):
+        """Updates fields of many FlowResult rows in one transaction
+
+        :param results:
+            List of dicts with `flowresult_id` and values of fields
+
+        :param fields:
+            Names of FlowResult fields to update
+        """
+        rows = [ FlowResult(**result) for result in results ]
+
+        with self.__db.atomic():
+            FlowResult.bulk_update(
+                rows, 
+                fields = [ getattr(FlowResult, field) for field in fields ], 
+                batch_size = batchSize
+            )
+
+
     def update(self, params: dict):
         if not params:
             logger.error("Trying to update db from empty parameters")
@@ -166,27 +715,194 @@ class Database(object):
                 JOIN.INNER,
                 on = (Flow.structure_id == Structure.structure_id)
             )
-            .where(
-                Structure.type == params["structure"]["type"],
-                Structure.direction == str(params["structure"]["direction"]),
-                Structure.theta == params["structure"]["theta"]
-            )
+            .where(Structure.key == caseKey(
+                params["structure"]["type"], 
+                params["structure"]["direction"], 
+                params["structure"]["theta"]
+            ))
         )
         
-        structureID = tryUntilDone(self._updateStructure)(params.get("structure", {}), query)
+        structureID = retryOnLock(self._updateStructure)(params.get("structure", {}), query)
         
-        meshID = tryUntilDone(self._updateMesh)(params.get("mesh", {}), query, structureID)
+        meshID = retryOnLock(self._updateMesh)(params.get("mesh", {}), query, structureID)
 
         for submeshParams in params.get("submesh", []):
-            tryUntilDone(self._updateSubMesh)(submeshParams, query, meshID)
+            retryOnLock(self._updateSubMesh)(submeshParams, query, meshID)
 
-        tryUntilDone(self._updateMeshResult)(params.get("meshresult", {}), query, meshID)
+        retryOnLock(self._updateMeshResult)(params.get("meshresult", {}), query, meshID)
 
-        flowID = tryUntilDone(self._updateFlow)(params.get("flow", {}), query, structureID)
+        flowID = retryOnLock(self._updateFlow)(params.get("flow", {}), query, structureID)
 
-        tryUntilDone(self._updateFlowApproximation)(params.get("flowapproximation", {}), query, flowID)
+        retryOnLock(self._updateFlowApproximation)(params.get("flowapproximation", {}), query, flowID)
 
-        tryUntilDone(self._updateFlowResult)(params.get("flowresult", {}), query, flowID)
+        retryOnLock(self._updateFlowResult)(params.get("flowresult", {}), query, flowID)
+
+
+    def updateMany(self, paramsAll: list):
+        """Inserts or updates parameters of many cases in one transaction.
+        Every table is upserted with a few `INSERT ... ON CONFLICT` queries,
+        values missed in parameters are kept.
+
+        :param paramsAll:
+            List of dicts with parameters like in :meth:`update`
+        """
+        if not paramsAll:
+            logger.error("Trying to update db from empty parameters")
+            return
+
+        retryOnLock(self._updateMany)(paramsAll)
+
+
+    def changedCases(self, paramsAll: list) -> list:
+        """Selects cases which are missed in database or differ from it 
+        in any given value. Values missed in parameters, results and 
+        evaluated values (see :attr:`evaluated`) are not compared.
+
+        :param paramsAll:
+            List of dicts with parameters like in :meth:`update`
+
+        :return:
+            List of new or changed cases
+        """
+        def configured(params: dict) -> dict:
+            src = {}
+
+            for name, value in params.items():
+                ignore = self.evaluated.get(name, [])
+
+                # Whole table is evaluated
+                if ignore is None:
+                    continue
+
+                strip = lambda entry: { k: v for k, v in entry.items() if k not in ignore }
+                src[name] = [ strip(entry) for entry in value ] if isinstance(value, list) else strip(value)
+
+            return src
+
+        def contains(current, src) -> bool:
+            if isinstance(src, dict):
+                return isinstance(current, dict) and all([ 
+                    key in current and contains(current[key], value) for key, value in src.items() 
+                ])
+
+            elif isinstance(src, list) and src and isinstance(src[0], dict):
+                # Submeshes are matched by name
+                named = { entry.get("name"): entry for entry in current or [] }
+
+                return all([ contains(named.get(entry.get("name")), entry) for entry in src ])
+
+            else:
+                return current == src
+
+        stored = self.loadMany([ 
+            (s["type"], s["direction"], s["theta"]) for s in [ params["structure"] for params in paramsAll ] 
+        ])
+
+        return [ 
+            params for params, current in zip(paramsAll, stored) 
+                if not current or not contains(current, configured(params)) 
+        ]
+
+
+    def _updateMany(self, paramsAll: list):
+        def clean(model, src: dict, **kwargs) -> dict:
+            # Identifiers are taken from database
+            row = { 
+                k: v for k, v in src.items() 
+                if not k in kwargs and not isinstance(model._meta.fields.get(k), (AutoField, ForeignKeyField)) 
+            }
+            row.update(kwargs)
+
+            return row
+
+        def lookup(keyField, idField, values: list) -> list:
+            # Only rows of current cases are selected
+            found = {}
+
+            for batch in chunked(set(values), 500):
+                found.update(idField.model.select(keyField, idField).where(keyField.in_(batch)).tuples())
+
+            return [ found[value] for value in values ]
+
+        keys = [ 
+            caseKey(params["structure"]["type"], params["structure"]["direction"], params["structure"]["theta"]) 
+            for params in paramsAll 
+        ]
+
+        with self.__db.atomic():
+            rows = []
+
+            for params, key in zip(paramsAll, keys):
+                structure = clean(Structure, params["structure"], key = key)
+                structure["direction"] = [ float(v) for v in structure["direction"] ]
+                rows.append(structure)
+
+            self._upsert(Structure, rows, ["key"])
+
+            structureIDs = lookup(Structure.key, Structure.structure_id, keys)
+
+            # Mesh
+            self._upsert(Mesh, [ 
+                clean(Mesh, params.get("mesh", {}), structure_id = sid) 
+                for params, sid in zip(paramsAll, structureIDs) 
+            ], ["structure_id"])
+
+            meshIDs = lookup(Mesh.structure_id, Mesh.mesh_id, structureIDs)
+
+            self._upsert(SubMesh, [ 
+                clean(SubMesh, submesh, mesh_id = mid) 
+                for params, mid in zip(paramsAll, meshIDs) for submesh in params.get("submesh", []) 
+            ], ["mesh_id", "name"])
+
+            self._upsert(MeshResult, [ 
+                clean(MeshResult, params.get("meshresult", {}), mesh_id = mid) 
+                for params, mid in zip(paramsAll, meshIDs) 
+            ], ["mesh_id"])
+
+            # Flow
+            self._upsert(Flow, [ 
+                clean(Flow, params.get("flow", {}), structure_id = sid) 
+                for params, sid in zip(paramsAll, structureIDs) 
+            ], ["structure_id"])
+
+            flowIDs = lookup(Flow.structure_id, Flow.flow_id, structureIDs)
+
+            self._upsert(FlowApproximation, [ 
+                clean(FlowApproximation, params.get("flowapproximation", {}), flow_id = fid) 
+                for params, fid in zip(paramsAll, flowIDs) 
+            ], ["flow_id"])
+
+            self._upsert(FlowResult, [ 
+                clean(FlowResult, params.get("flowresult", {}), flow_id = fid) 
+                for params, fid in zip(paramsAll, flowIDs) 
+            ], ["flow_id"])
+
+
+    def _upsert(self, model, rows: list, conflict: list):
+        """Inserts rows or updates their given fields on conflict of unique `conflict` fields"""
+        groups = {}
+
+        # Rows with the same fields are inserted by one query
+        for row in rows:
+            groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+
+        for fields, group in groups.items():
+            preserve = [ getattr(model, field) for field in fields if field not in conflict ]
+
+            # SQLite limits count of variables in one query
+            for batch in chunked(group, max(1, 999 // len(fields))):
+                query = model.insert_many(batch)
+
+                if preserve:
+                    query = query.on_conflict(
+                        conflict_target = [ getattr(model, field) for field in conflict ],
+                        preserve = preserve
+                    )
+
+                else:
+                    query = query.on_conflict_ignore()
+
+                query.execute()
 
 
     def search(self, args: list):
@@ -240,8 +956,298 @@ class Database(object):
         return result
 
 
+    ###
+    #   Job queue
+    ##
+    def releaseJobs(self) -> int:
+        """Returns running jobs of dead local owners (e.g. crashed coordinator) 
+        to the queue, so they are picked up without waiting for the lease
+
+        :return:
+            Count of released jobs
+        """
+        owners = [ 
+            owner for owner, in Job.select(Job.owner).where(Job.status == "Running").distinct().tuples() 
+                if not ownerAlive(owner) 
+        ]
+
+        if not owners:
+            return 0
+
+        query = (
+            Job.update(status = "Queued", owner = None, leaseExpires = None)
+            .where(Job.status == "Running", Job.owner.in_(owners))
+        )
+        count = query.execute()
+        logger.info(f"Released { count } jobs of dead owners: { ', '.join(owners) }")
+
+        return count
+
+
+    def createJobs(self, structureIDs: list, stage: str) -> list:
+        """Replaces current job queue with a new one. Running jobs with 
+        valid leases belong to another coordinator and are kept.
+
+        :param structureIDs:
+            List of structure ids to compute
+
+        :param stage:
+            Computation stage mode
+
+        :return:
+            List of structure ids of created jobs
+        """
+        self.releaseJobs()
+        now = time.time()
+
+        with self.__db.atomic():
+            running = (Job.status == "Running") & Job.leaseExpires.is_null(False) & (Job.leaseExpires >= now)
+            Job.delete().where(~running).execute()
+            busy = set([ sid for sid, in Job.select(Job.structure_id).where(running).tuples() ])
+
+            if busy:
+                logger.warning(f"{ len(busy) } cases are computed by another coordinator and are not queued")
+
+            structureIDs = [ structureID for structureID in structureIDs if structureID not in busy ]
+            rows = [ 
+                dict(structure_id = structureID, stage = stage, created = now) 
+                    for structureID in structureIDs 
+            ]
+
+            # NOTE: Sqlite has a limit of variables per query
+            for n in range(0, len(rows), 100):
+                Job.insert_many(rows[n : n + 100]).execute()
+
+        return structureIDs
+
+
+    def pendingJobs(self, stage: str, type: str = None, direction: list = None, theta: float = None) -> list:
+        """Selects jobs of current queue that are not started, which leases are 
+        expired or which owners are dead (see :meth:`releaseJobs`)
+
+        :return:
+            List of dicts with structure parameters like in :meth:`loadGeneral`
+        """
+        self.releaseJobs()
+
+        query = (
+            Structure
+            .select()
+            .join(Job, JOIN.INNER, on = (Job.structure_id == Structure.structure_id))
+            .where(
+                Job.stage == stage,
+                (Job.status == "Queued") | ((Job.status == "Running") & (Job.leaseExpires < time.time()))
+            )
+            .order_by(Structure.type, Structure.direction, Structure.theta)
+        )
+
+        query = structureFilter(query, type, direction, theta)
+
+        return [ { "structure": entry } for entry in query.dicts() ]
+
+
+    def claimJob(self, structureID: int, owner: str, lease: float) -> bool:
+        """Takes a job if it is not started, already owned by `owner` or its lease is expired
+
+        :return:
+            True if job is claimed
+        """
+        now = time.time()
+        query = (
+            Job.update(
+                status = "Running",
+                owner = owner,
+                leaseExpires = now + lease,
+                attempts = Job.attempts + 1
+            )
+            .where(
+                Job.structure_id == structureID,
+                (Job.status == "Queued") | (
+                    (Job.status == "Running") & ((Job.owner == owner) | (Job.leaseExpires < now))
+                )
+            )
+        )
+
+        return query.execute() > 0
+
+
+    def renewJob(self, structureID: int, owner: str, lease: float) -> bool:
+        """Extends lease of the owned job
+
+        :return:
+            True if lease is renewed
+        """
+        query = (
+            Job.update(leaseExpires = time.time() + lease)
+            .where(
+                Job.structure_id == structureID,
+                Job.owner == owner,
+                Job.status == "Running"
+            )
+        )
+
+        return query.execute() > 0
+
+
+    def renewJobs(self, owner: str, lease: float) -> int:
+        """Extends leases of all running jobs of owner
+
+        :return:
+            Count of renewed jobs
+        """
+        query = (
+            Job.update(leaseExpires = time.time() + lease)
+            .where(
+                Job.owner == owner,
+                Job.status == "Running"
+            )
+        )
+
+        return query.execute()
+
+
+    def finishJob(self, structureID: int, owner: str, status: str):
+        """Marks the owned job as finished ('Done' or 'Failed')"""
+        query = (
+            Job.update(
+                status = status,
+                leaseExpires = None,
+                finished = time.time()
+            )
+            .where(
+                Job.structure_id == structureID,
+                Job.owner == owner
+            )
+        )
+        query.execute()
+
+
+    def finishJobs(self, structureIDs: list, status: str):
+        """Marks jobs as finished regardless of owner (used for cases skipped by coordinator)"""
+        now = time.time()
+
+        with self.__db.atomic():
+            for batch in chunked(structureIDs, 500):
+                query = (
+                    Job.update(
+                        status = status,
+                        leaseExpires = None,
+                        finished = now
+                    )
+                    .where(Job.structure_id.in_(batch))
+                )
+                query.execute()
+
+
+    ###
+    #   Progress
+    ##
+    def _durations(self, column) -> dict:
+        """Mean and 95th percentile of non-null values of column"""
+        mean, count = (
+            column.model
+            .select(fn.AVG(column), fn.COUNT(column))
+            .where(column.is_null(False))
+            .scalar(as_tuple = True)
+        )
+        p95 = None
+
+        if count:
+            # Nearest-rank percentile without fetching the whole column
+            p95 = (
+                column.model
+                .select(column)
+                .where(column.is_null(False))
+                .order_by(column)
+                .limit(1)
+                .offset(ceil(0.95 * count) - 1)
+                .scalar()
+            )
+
+        return dict(count = count, mean = mean, p95 = p95)
+
+
+    def status(self, window: float = 3600) -> dict:
+        """Progress of computation. Only reads the database 
+        in one transaction, so running writers are not waited.
+
+        :param window:
+            Time in seconds of sliding window for throughput
+
+        :return:
+            Dict with keys:
+
+            - `cases`: count of cases
+            - `mesh`, `flow`: counts of cases per status
+            - `jobs`: counts of jobs per stage mode and status ('Skipped' for cases done before)
+            - `throughput`: cases per hour finished in the window
+            - `durations`: count, mean and p95 of calculation time per stage
+            - `remaining`: count of queued and running jobs
+            - `eta`: estimated time in seconds to finish the queue or None
+        """
+        now = time.time()
+
+        with self.__db.atomic():
+            cases = Structure.select().count()
+            mesh = dict(
+                MeshResult.select(MeshResult.meshStatus, fn.COUNT(MeshResult.meshresult_id))
+                .group_by(MeshResult.meshStatus)
+                .tuples()
+            )
+            flow = dict(
+                FlowResult.select(FlowResult.flowStatus, fn.COUNT(FlowResult.flowresult_id))
+                .group_by(FlowResult.flowStatus)
+                .tuples()
+            )
+            jobs = {}
+
+            for stage, status, count in (
+                    Job.select(Job.stage, Job.status, fn.COUNT(Job.job_id))
+                    .group_by(Job.stage, Job.status)
+                    .tuples()
+                ):
+                jobs.setdefault(stage, {})[status] = count
+
+            # Jobs skipped by coordinator ('Skipped') are not computed, so they are not counted
+            count = (
+                Job.select()
+                .where(Job.status == "Done", Job.finished >= now - window)
+                .count()
+            )
+            started = Job.select(fn.MIN(Job.created)).scalar()
+            durations = {
+                "mesh": self._durations(MeshResult.meshCalculationTime),
+                "flow": self._durations(FlowResult.flowCalculationTime)
+            }
+
+        remaining = sum([ 
+            count for stage in jobs.values() for status, count in stage.items() 
+                if status in ["Queued", "Running"] 
+        ])
+        # Rate is measured over the window or from creation of the queue if it is younger
+        elapsed = min(window, now - started) if started else 0
+        rate = count / elapsed if count and elapsed > 0 else None
+
+        return dict(
+            cases = cases,
+            mesh = mesh,
+            flow = flow,
+            jobs = jobs,
+            throughput = rate * 3600 if rate else 0,
+            durations = durations,
+            remaining = remaining,
+            eta = remaining / rate if rate else (0 if not remaining else None)
+        )
+
+
+    def close(self):
+        if not self.__db.is_closed():
+            self.__db.close()
+
+
     def _updateStructure(self, src: dict, queryMain) -> int:
         raw = deepcopy(src)
+        raw["key"] = caseKey(raw["type"], raw["direction"], raw["theta"])
 
         with self.__db.atomic():
             if not queryMain.exists():
@@ -253,11 +1259,7 @@ class Database(object):
 
                 query = (
                     Structure.update(**raw)
-                    .where(
-                        Structure.type == req["type"],
-                        Structure.direction == str(req["direction"]),
-                        Structure.theta == req["theta"]
-                    )
+                    .where(Structure.structure_id == tabID)
                 )
                 query.execute()
 
@@ -403,3 +1405,412 @@ class Database(object):
                     )
                 )
                 query.execute()
+
+
+class JobLease(object):
+    """Claims a job from the queue and renews its lease in background
+    while the job is running. Used as a context manager:
+
+    .. code-block:: python
+
+        with JobLease(database, structureID, owner) as job:
+            if job.claimed:
+                ...
+                job.finish("Done")
+
+    Job is marked as 'Failed' if an exception is raised inside the block.
+    """
+    def __init__(self, database: Database, structureID: int, owner: str, lease: float = None):
+        self.database = database
+        self.structureID = structureID
+        self.owner = owner
+        self.lease = lease or env["job_lease"]
+        self.claimed = False
+
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def _heartbeat(self):
+        while not self.__stop.wait(self.lease / 3):
+            try:
+                renewed = retryOnLock(self.database.renewJob)(self.structureID, self.owner, self.lease)
+
+            except DatabaseLockedError as e:
+                # Lease is still valid until the next heartbeat
+                logger.warning(e)
+
+                continue
+
+            if not renewed:
+                logger.warning(f"Lost lease of job for structure { self.structureID }")
+
+                break
+
+        # Thread owns a separate connection
+        self.database.close()
+
+    def finish(self, status: str):
+        retryOnLock(self.database.finishJob)(self.structureID, self.owner, status)
+
+    def __enter__(self):
+        self.claimed = retryOnLock(self.database.claimJob)(self.structureID, self.owner, self.lease)
+
+        if self.claimed:
+            self.__thread = threading.Thread(target = self._heartbeat, daemon = True)
+            self.__thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.__thread:
+            self.__stop.set()
+            self.__thread.join()
+
+        if exc_type and self.claimed:
+            self.finish("Failed")
+
+
+class QueueLease(object):
+    """Renews leases of all running jobs of the owner in background. 
+    Used by the coordinator, so a case waiting in the queue between 
+    stages keeps its job until the next stage claims it:
+
+    .. code-block:: python
+
+        with QueueLease(database, owner):
+            ...
+    """
+    def __init__(self, database: Database, owner: str, lease: float = None):
+        self.database = database
+        self.owner = owner
+        self.lease = lease or env["job_lease"]
+
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def _heartbeat(self):
+        while not self.__stop.wait(self.lease / 3):
+            try:
+                retryOnLock(self.database.renewJobs)(self.owner, self.lease)
+
+            except DatabaseLockedError as e:
+                logger.warning(e)
+
+        # Thread owns a separate connection
+        self.database.close()
+
+    def __enter__(self):
+        self.__thread = threading.Thread(target = self._heartbeat, daemon = True)
+        self.__thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__stop.set()
+        self.__thread.join()
+
+
+###
+#   Single writer
+##
+class DatabaseServer(object):
+    """Owns the database connection for worker processes. Workers connect 
+    with :class:`DatabaseClient`, updates of case parameters are queued 
+    and written in batches with :meth:`Database.updateMany`, loads are 
+    answered from the cache of cases (:meth:`Database.reload` reads the case 
+    again after other processes wrote it). Pending updates are written before 
+    any job request, so a job is never finished before results of its case: 
+    failed updates are kept pending and job requests of their cases are 
+    refused until the updates are written.
+    Runs in a thread of the coordinator process:
+
+    .. code-block:: python
+
+        with DatabaseServer(database, cases) as server:
+            # pass server.address and server.authkey to workers
+            ...
+
+    :param database:
+        Database, should be set up
+
+    :param cases:
+        Loaded parameters of cases to fill the cache
+
+    :param batchSize:
+        Count of cases written in one transaction
+
+    :param interval:
+        Maximal time in seconds between receiving and writing of update
+    """
+    methods = [ "load", "reload", "update", "nearestFlow", "claimJob", "renewJob", "finishJob" ]
+
+    def __init__(self, database: Database, cases: list = None, batchSize: int = 100, interval: float = 1):
+        self.database = database
+        self.batchSize = batchSize
+        self.interval = interval
+        self.cache = {}
+        self.pending = {}
+
+        for params in cases or []:
+            if params:
+                self.cache[self._key(params)] = params
+
+        self.authkey = os.urandom(16)
+        self.listener = None
+        self.connections = []
+
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__threads = []
+
+    @staticmethod
+    def _key(params: dict) -> str:
+        s = params["structure"]
+
+        return caseKey(s["type"], s["direction"], s["theta"])
+
+    @property
+    def address(self) -> str:
+        return self.listener.address
+
+    def start(self):
+        self.listener = Listener(family = "AF_UNIX", authkey = self.authkey)
+        self.__threads = [
+            threading.Thread(target = self._accept, name = "DatabaseServer-accept", daemon = True),
+            threading.Thread(target = self._serve, name = "DatabaseServer", daemon = True)
+        ]
+
+        for thread in self.__threads:
+            thread.start()
+
+    def stop(self):
+        """Writes pending updates and closes connections"""
+        self.__stop.set()
+        # Wakes up the accepting thread
+        try:
+            Client(self.address, authkey = self.authkey).close()
+
+        except OSError:
+            pass
+
+        for thread in self.__threads:
+            thread.join()
+
+        self.listener.close()
+
+        for conn in self.connections:
+            conn.close()
+
+    def _accept(self):
+        while not self.__stop.is_set():
+            try:
+                conn = self.listener.accept()
+
+            except (OSError, AuthenticationError) as e:
+                if not self.__stop.is_set():
+                    logger.warning(f"Database client is not accepted: { e }")
+
+                continue
+
+            with self.__lock:
+                self.connections.append(conn)
+
+    def _receive(self, timeout: float) -> int:
+        """Handles requests of ready connections
+
+        :return:
+            Count of handled requests
+        """
+        with self.__lock:
+            connections = list(self.connections)
+
+        if not connections:
+            self.__stop.wait(timeout)
+
+            return 0
+
+        count = 0
+
+        for conn in wait(connections, timeout = timeout):
+            try:
+                method, args, kwargs, reply = conn.recv()
+
+            except (EOFError, OSError):
+                with self.__lock:
+                    self.connections.remove(conn)
+
+                conn.close()
+
+                continue
+
+            try:
+                result = self._handle(method, args, kwargs)
+
+            except Exception as e:
+                logger.exception(f"Database request { method } failed")
+                result = e
+
+            if reply:
+                conn.send(result)
+
+            count += 1
+
+        return count
+
+    def _serve(self):
+        deadline = None
+
+        while not self.__stop.is_set():
+            # New connections are picked up on timeout
+            self._receive(0.1)
+
+            if self.pending and deadline is None:
+                deadline = time.monotonic() + self.interval
+
+            if deadline is not None and time.monotonic() >= deadline:
+                # Failed updates are retried after the next interval
+                self.flush()
+                deadline = None
+
+        # Updates are not waited by workers, so they can be still unread
+        while self._receive(0):
+            pass
+
+        if not self.flush():
+            logger.error(f"Updates of { len(self.pending) } cases are lost")
+
+        # Connection belongs to this thread
+        self.database.close()
+
+    def _handle(self, method: str, args: tuple, kwargs: dict):
+        if method not in self.methods:
+            raise ValueError(f"Unknown method '{ method }'")
+
+        if method in [ "load", "reload" ]:
+            key = caseKey(*args)
+
+            if key in self.pending and not self.flush() and method == "reload":
+                # Unwritten update would overwrite values written by another process
+                raise OperationalError(f"Updates of case { key } are not written")
+
+            if method == "reload" or key not in self.cache:
+                self.cache[key] = self.database.load(*args)
+
+            return self.cache[key]
+
+        elif method == "update":
+            params = args[0]
+            key = self._key(params)
+            self.cache[key] = params
+            self.pending[key] = params
+
+            if len(self.pending) >= self.batchSize:
+                self.flush()
+
+        else:
+            if not self.flush() and method != "nearestFlow":
+                # Job of case with unwritten results should not be claimed or finished
+                structureID = args[0] if args else kwargs.get("structureID")
+                pending = [ params["structure"].get("structure_id") for params in self.pending.values() ]
+
+                if structureID in pending:
+                    raise OperationalError(f"Updates of case (structure_id = { structureID }) are not written")
+
+            return retryOnLock(getattr(self.database, method))(*args, **kwargs)
+
+    def flush(self) -> bool:
+        """Writes pending updates in one transaction and refreshes ids of cases in the cache.
+        Updates are kept pending if writing failed.
+
+        :return:
+            True if there are no pending updates
+        """
+        if not self.pending:
+            return True
+
+        paramsAll = list(self.pending.values())
+
+        try:
+            self.database.updateMany(paramsAll)
+
+        except Exception:
+            logger.exception(f"Writing of { len(paramsAll) } cases failed")
+
+            return False
+
+        self.pending = {}
+        cases = [ (s["type"], s["direction"], s["theta"]) for s in [ p["structure"] for p in paramsAll ] ]
+
+        for params in self.database.loadMany(cases):
+            if params:
+                self.cache[self._key(params)] = params
+
+        return True
+
+    def __enter__(self):
+        self.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class DatabaseClient(object):
+    """Replaces :class:`Database` in worker processes, requests are sent 
+    to :class:`DatabaseServer`. Updates are not waited.
+
+    :param address:
+        Address of server
+
+    :param authkey:
+        Authentication key of server
+    """
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self.conn = None
+
+        # Heartbeat of job lease uses the same connection
+        self.__lock = threading.Lock()
+
+    def _request(self, method: str, *args, reply: bool = True, **kwargs):
+        with self.__lock:
+            if self.conn is None:
+                self.conn = Client(self.address, authkey = self.authkey)
+
+            self.conn.send((method, args, kwargs, reply))
+            result = self.conn.recv() if reply else None
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+    def setup(self):
+        pass
+
+    def load(self, structure_type: str, structure_direction: list, structure_theta: float) -> dict:
+        return self._request("load", structure_type, structure_direction, structure_theta)
+
+    def reload(self, structure_type: str, structure_direction: list, structure_theta: float) -> dict:
+        return self._request("reload", structure_type, structure_direction, structure_theta)
+
+    def update(self, params: dict):
+        self._request("update", params, reply = False)
+
+    def nearestFlow(self, *args, **kwargs) -> dict:
+        return self._request("nearestFlow", *args, **kwargs)
+
+    def claimJob(self, structureID: int, owner: str, lease: float) -> bool:
+        return self._request("claimJob", structureID, owner, lease)
+
+    def renewJob(self, structureID: int, owner: str, lease: float) -> bool:
+        return self._request("renewJob", structureID, owner, lease)
+
+    def finishJob(self, structureID: int, owner: str, status: str):
+        return self._request("finishJob", structureID, owner, status)
+
+    def close(self):
+        # Connection is shared by threads of worker
+        pass
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# This file is part of anisotropy.
+# License: GNU GPL version 3, see the file "LICENSE" for details.
+
+import os
+import json
+import shutil
+import logging
+
+from anisotropy import env
+from anisotropy.core.models import (
+    AutoField, IntegerField, FloatField, TimeField, BooleanField, ListField
+)
+
+logger = logging.getLogger(env["logger_name"])
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    import pyarrow.dataset
+
+except ImportError:
+    logger.debug("pyarrow is not installed. Export of results won't be available.")
+
+
+###
+#   Columnar export of results
+##
+STATE = "_state.json"
+PARTITION = "type"
+
+
+def arrowSchema(columns: list):
+    """Arrow schema for columns of the flat view of cases.
+    Partition column is not stored in files.
+
+    :param columns:
+        List of (name, field), see :meth:`anisotropy.core.database.Database.caseColumns`
+    """
+    fields = []
+
+    for name, field in columns:
+        if name == PARTITION:
+            continue
+
+        if isinstance(field, (AutoField, IntegerField)):
+            dtype = pyarrow.int64()
+
+        elif isinstance(field, (FloatField, TimeField)):
+            dtype = pyarrow.float64()
+
+        elif isinstance(field, BooleanField):
+            dtype = pyarrow.bool_()
+
+        elif isinstance(field, ListField):
+            dtype = pyarrow.list_(pyarrow.float64())
+
+        else:
+            # Text and JSON fields are stored as written to database
+            dtype = pyarrow.string()
+
+        fields.append(pyarrow.field(name, dtype))
+
+    return pyarrow.schema(fields)
+
+
+def readState(path: str) -> dict:
+    """Reads state of the last export, empty dict if dataset was not exported yet"""
+    statepath = os.path.join(path, STATE)
+
+    if not os.path.exists(statepath):
+        return {}
+
+    with open(statepath, "r") as io:
+        return json.load(io)
+
+
+def writeState(path: str, state: dict):
+    statepath = os.path.join(path, STATE)
+
+    with open(f"{ statepath }.tmp", "w") as io:
+        json.dump(state, io)
+
+    os.replace(f"{ statepath }.tmp", statepath)
+
+
+def exportCases(database, path: str, full: bool = False, batchSize: int = 1000) -> int:
+    """Writes the flat view of cases to Parquet dataset partitioned by
+    structure type (`<path>/type=<type>/part-<revision>.parquet`, named 
+    after the greatest revision in file, so names are never reused).
+    Only cases changed since the last export are appended, so a case can
+    be found in several files, the row with the greatest revision is actual
+    (see :func:`readExport`).
+
+    :param database:
+        Database to export, should be set up
+
+    :param path:
+        Path to dataset directory
+
+    :param full:
+        Rewrite the whole dataset
+
+    :return:
+        Count of exported rows
+    """
+    if not globals().get("pyarrow"):
+        raise ImportError("pyarrow is required for export, install it with 'pip install anisotropy[export]'")
+
+    if full and os.path.exists(path):
+        for entry in os.listdir(path):
+            if entry.startswith(f"{ PARTITION }="):
+                shutil.rmtree(os.path.join(path, entry))
+
+    os.makedirs(path, exist_ok = True)
+
+    state = {} if full else readState(path)
+    since = state.get("revision")
+    columns = database.caseColumns()
+    schema = arrowSchema(columns)
+    booleans = [ name for name, field in columns if isinstance(field, BooleanField) ]
+
+    count = 0
+    revision = since or 0
+    current = None
+    writer = None
+    # Path of partition file in progress and the greatest revision in it
+    partial, last = None, 0
+
+    def close():
+        writer.close()
+        # Dot files are ignored by readers until renamed
+        os.replace(partial, os.path.join(os.path.dirname(partial), "part-{:010d}.parquet".format(last)))
+
+    def flush(rows: list):
+        data = { name: [ row[name] for row in rows ] for name in schema.names }
+
+        # SQLite stores booleans as integers
+        for name in booleans:
+            data[name] = [ bool(value) if value is not None else None for value in data[name] ]
+
+        writer.write_table(pyarrow.Table.from_pydict(data, schema = schema))
+
+    # Single query keeps rows consistent while cases are updated by workers
+    rows = []
+
+    for row in database.cases(
+            [ name for name, _ in columns ],
+            orderBy = [ PARTITION, "revision" ],
+            since = since
+        ):
+        if row[PARTITION] != current:
+            if rows:
+                flush(rows)
+                rows = []
+
+            if writer:
+                close()
+
+            current = row[PARTITION]
+            partition = os.path.join(path, f"{ PARTITION }={ current }")
+            os.makedirs(partition, exist_ok = True)
+            partial, last = os.path.join(partition, ".part.parquet.tmp"), 0
+            writer = pyarrow.parquet.ParquetWriter(partial, schema)
+
+        rows.append(row)
+        count += 1
+        last = max(last, row["revision"] or 0)
+        revision = max(revision, last)
+
+        if len(rows) >= batchSize:
+            flush(rows)
+            rows = []
+
+    if rows:
+        flush(rows)
+
+    if writer:
+        close()
+
+    # State is written after data, so interrupted export is repeated
+    writeState(path, { "revision": revision })
+    logger.info(f"Exported { count } cases to { path }")
+
+    return count
+
+
+def readExport(path: str, columns: list = None):
+    """Reads exported dataset keeping only the last revision of every case
+
+    :param columns:
+        Names of columns to read, all if None (key, revision and type are always read)
+
+    :return:
+        pandas.DataFrame
+    """
+    if columns is not None:
+        columns = list({ *columns, "key", "revision", PARTITION })
+
+    dataset = pyarrow.dataset.dataset(path, format = "parquet", partitioning = "hive")
+    df = dataset.to_table(columns = columns).to_pandas()
+
+    return (
+        df.sort_values("revision")
+        .drop_duplicates("key", keep = "last")
+        .sort_values([ PARTITION, "key" ])
+        .reset_index(drop = True)
+    )
@@ -9,15 +9,19 @@ import shutil
 import logging
 from copy import deepcopy
 from math import sqrt
+import functools
+from types import FunctionType
 
 import toml
+import numpy
 
 from anisotropy import (
     __version__, env,
     openfoam
 )
 from anisotropy.core.utils import setupLogger, Timer
-from anisotropy.core.database import Database
+from anisotropy.core.database import Database, DatabaseClient, JobLease
+from anisotropy.core.cache import Cache
 from anisotropy import salomepl
 import anisotropy.salomepl.utils
 import anisotropy.salomepl.geometry
@@ -42,13 +46,17 @@ class Anisotropy(object):
         self.params = []
 
 
-    def load(self, structure_type: str, structure_direction: list, structure_theta: float):
+    def load(self, structure_type: str, structure_direction: list, structure_theta: float, fresh: bool = False):
         """Shortcut for `Database.setup` and `Database.load`. 
 
         See :class:`anisotropy.core.database.Database` for more details.
+
+        :param fresh:
+            Case was written by another process, use `Database.reload`
         """
         self.db.setup()
-        self.params = self.db.load(structure_type, structure_direction, structure_theta)
+        load = self.db.reload if fresh else self.db.load
+        self.params = load(structure_type, structure_direction, structure_theta)
 
     def update(self, params: dict = None):
         """Shortcut for `Database.setup` and `Database.update`. 
@@ -83,11 +91,24 @@ class Anisotropy(object):
         return "\n".join([ f"{ k }: { v }" for k, v in versions.items() ])
 
     
-    def loadFromScratch(self, configpath: str = None) -> list:
-        """Loads parameters from configuration file and expands special values
+    def loadFromScratch(self, configpath: str = None, type: str = None, direction: list = None, theta: float = None):
+        """Loads parameters from configuration file and expands special values.
+        Cases are generated lazily and filters are applied before expansion.
+        Sub-dicts are shared between generated cases (e.g. `submesh` by all 
+        cases of structure, `flow` by cases of direction), so they should 
+        be copied before modification.
+
+        :param type:
+            Generate only cases of structure type
+
+        :param direction:
+            Generate only cases of direction
+
+        :param theta:
+            Generate only cases of theta
 
         :return: 
-            List of dicts with parameters
+            Generator of dicts with parameters
         """
         config = configpath or self.env["CONFIG"]
 
@@ -99,12 +120,22 @@ class Anisotropy(object):
             logger.info(f"Configuration file: { config }")
 
         buf = toml.load(config).get("structures")
-        paramsAll = []
-
+        digits = self.env["db_theta_digits"]
 
         for entry in buf:
+            if type and entry["structure"]["type"] != type:
+                continue
+
             #   Shortcuts
             _theta = entry["structure"]["theta"]
+
+            # Neighbour cases should not share the key (see anisotropy.core.database.caseKey)
+            if _theta[2] < 10 ** -digits:
+                raise ValueError(
+                    f"Step of theta { _theta[2] } ({ entry['structure']['type'] }) is finer than "
+                    f"db_theta_digits = { digits }"
+                )
+
             thetaMin = int(_theta[0] / _theta[2])
             thetaMax = int(_theta[1] / _theta[2]) + 1
             thetaList = list(
@@ -117,42 +148,46 @@ class Anisotropy(object):
                 map(lambda n: _thickness[0] + n * (_thickness[1] - _thickness[0]) / (count - 1), range(0, count))
             )
 
-            for direction in entry["structure"]["directions"]:
-                for n, theta in enumerate(thetaList):
-                    mesh = deepcopy(entry["mesh"])
-                    mesh["thickness"] = thicknessList[n]
+            for _direction in entry["structure"]["directions"]:
+                _direction = [ float(num) for num in _direction ]
+
+                if direction and _direction != [ float(num) for num in direction ]:
+                    continue
+
+                # Velocities depend on direction only
+                flow = deepcopy(entry["flow"])
+                flowapproximation = deepcopy(entry["flowapproximation"])
 
-                    entryNew = {
+                # Shared defaults with overrides of structure
+                flow["convergence"] = { **self.env["flow_convergence"], **flow.get("convergence", {}) }
+                flow["writePolicy"] = { **self.env["flow_writepolicy"], **flow.get("writePolicy", {}) }
+
+                # For `type = fixedValue` only
+                for src in [ flow, flowapproximation ]:
+                    _velocity = src["velocity"]["boundaryField"]["inlet"]["value"]
+                    src["velocity"]["boundaryField"]["inlet"]["value"] = [ 
+                        val * _velocity for val in _direction 
+                    ]
+
+                for n, _theta in enumerate(thetaList):
+                    if theta and round(_theta, digits) != round(theta, digits):
+                        continue
+
+                    yield {
                         "structure": dict(
                             type = entry["structure"]["type"],
-                            theta = theta,
-                            direction = [ float(num) for num in direction ],
+                            theta = _theta,
+                            direction = _direction,
                             filletsEnabled = entry["structure"]["filletsEnabled"]
                         ),
-                        "mesh": mesh,
-                        "submesh": deepcopy(entry["submesh"]),
+                        "mesh": dict(entry["mesh"], thickness = thicknessList[n]),
+                        "submesh": entry["submesh"],
                         "meshresult": dict(),
-                        "flow": deepcopy(entry["flow"]),
-                        "flowapproximation": deepcopy(entry["flowapproximation"]),
+                        "flow": flow,
+                        "flowapproximation": flowapproximation,
                         "flowresult": dict(),
                     }
 
-                    # For `type = fixedValue` only
-                    _velocity = entryNew["flowapproximation"]["velocity"]["boundaryField"]["inlet"]["value"]
-                    entryNew["flowapproximation"]["velocity"]["boundaryField"]["inlet"]["value"] = [ 
-                        val * _velocity for val in entryNew["structure"]["direction"] 
-                    ]
-
-                    _velocity = entryNew["flow"]["velocity"]["boundaryField"]["inlet"]["value"]
-                    entryNew["flow"]["velocity"]["boundaryField"]["inlet"]["value"] = [ 
-                        val * _velocity for val in entryNew["structure"]["direction"] 
-                    ]
-
-                    
-                    paramsAll.append(entryNew)
-
-        return paramsAll
-
     
     def evalParams(self):
         """Evals specific geometry(structure) parameters"""
@@ -209,13 +244,16 @@ class Anisotropy(object):
             fillets = fillets 
         )
 
-    def getCasePath(self, path: str = None) -> str:
+    def getCasePath(self, path: str = None, structure: dict = None) -> str:
         """Constructs case path from control parameters
+
+        :param structure:
+            Structure parameters of another case (default: current case)
         
         :return: Absolute path to case
         :rtype: str
         """
-        structure = self.params.get("structure")
+        structure = structure or self.params.get("structure")
 
         if not structure:
             logger.error("Trying to use empty parameters")
@@ -235,8 +273,58 @@ class Anisotropy(object):
         )
 
 
-    def computeMesh(self, path):
-        """Computes a mesh on shape via Salome
+    def getCachePath(self, name: str, path: str = None) -> str:
+        """Constructs path to cache storage
+
+        :param name:
+            Name of cache (mesh, geometry, ..)
+
+        :return: Absolute path to cache
+        :rtype: str
+        """
+        if path:
+            path = os.path.join(path, "build")
+    
+        else:
+            path = self.env["BUILD"]
+
+        return os.path.join(path, "cache", name)
+
+
+    def geometryCacheKey(self) -> str:
+        """Hash of structure parameters that affects on shape
+
+        :return: Hex digest
+        :rtype: str
+        """
+        structure = { 
+            k: self.params["structure"].get(k) 
+                for k in ["type", "direction", "theta", "r0", "L", "radius", "filletsEnabled", "fillets"] 
+        }
+
+        return Cache.key(structure)
+
+
+    def meshCacheKey(self) -> str:
+        """Hash of parameters that affects on mesh: structure, mesh and submeshes. 
+        Values that are evaluated while meshing (maxSize, minSize, chordalError) are excluded.
+
+        :return: Hex digest
+        :rtype: str
+        """
+        ignore = [ "structure_id", "mesh_id", "submesh_id", *Database.evaluated["mesh"] ]
+        mesh = { k: v for k, v in self.params["mesh"].items() if k not in ignore }
+        submesh = sorted([ 
+            { k: v for k, v in entry.items() if k not in ignore } 
+                for entry in self.params.get("submesh", [])
+        ], key = lambda entry: entry["name"])
+
+        return Cache.key(self.geometryCacheKey(), mesh, submesh)
+
+
+    def computeMesh(self, path, useCache: bool = True):
+        """Computes a mesh on shape via Salome. Mesh is loaded from cache 
+        if the same structure and mesh parameters were already meshed.
 
         :return: Process output, error messages and returncode
         :rtype: tuple(str, str, int)
@@ -252,9 +340,35 @@ class Anisotropy(object):
         ]
         manager = salomepl.utils.SalomeManager()
         casepath = self.getCasePath(path)
+        unvpath = os.path.join(casepath, "mesh.unv")
+
+        cache = Cache(self.getCachePath("mesh", path))
+        cachekey = self.meshCacheKey()
+        cached = cache.get(cachekey) if useCache else None
+
+        if cached:
+            logger.info(f"Loading mesh from cache { cachekey } ...")
+            os.makedirs(casepath, exist_ok = True)
+            cache.fetch(cachekey, "mesh.unv", unvpath)
+
+            self.params["mesh"].update(cached["mesh"])
+
+            for submesh in self.params.get("submesh", []):
+                submesh.update(cached["submesh"].get(submesh["name"], {}))
+
+            self.params["meshresult"].update(cached["meshresult"], meshStatus = "Done")
+            self.update()
+
+            return "", "", 0
+
+        # Old mesh can be shared with cache, so new mesh should not overwrite it
+        if os.path.exists(unvpath):
+            os.remove(unvpath)
 
         self.params["meshresult"]["meshStatus"] = "Computing"
         self.update()
+        # Salome writes to database itself, so the update above should be written before
+        self.load(p["type"], p["direction"], p["theta"], fresh = True)
         timer = Timer()
 
         out, err, returncode = manager.execute(
@@ -264,7 +378,7 @@ class Anisotropy(object):
             root = self.env["ROOT"],
             logpath = casepath
         )
-        self.load(p["type"], p["direction"], p["theta"])
+        self.load(p["type"], p["direction"], p["theta"], fresh = True)
 
         if not returncode:
             self.params["meshresult"].update(
@@ -279,6 +393,34 @@ class Anisotropy(object):
 
         self.update()
 
+        if not returncode and os.path.exists(unvpath):
+            # Values are written by Salome and reloaded above
+            evaluated = [ "maxSize", "minSize", "chordalError" ]
+            manifest = dict(
+                mesh = { k: self.params["mesh"].get(k) for k in evaluated },
+                submesh = { 
+                    entry["name"]: { k: entry.get(k) for k in evaluated } 
+                        for entry in self.params.get("submesh", []) 
+                },
+                meshresult = { 
+                    k: v for k, v in self.params["meshresult"].items() 
+                        if k not in ["meshresult_id", "mesh_id", "meshStatus"] 
+                }
+            )
+            required = [ 
+                *[ ("mesh", k, v) for k, v in manifest["mesh"].items() ],
+                *[ (f"submesh.{ name }", k, v) for name, entry in manifest["submesh"].items() for k, v in entry.items() ],
+                *[ ("meshresult", k, manifest["meshresult"].get(k)) for k in [ "surfaceArea", "volume", "volumeCell", "elements" ] ]
+            ]
+            missed = [ f"{ table }.{ k }" for table, k, v in required if v is None ]
+
+            # Cache hits copy values to other cases, so incomplete results are not stored
+            if missed:
+                logger.warning("Mesh is not cached, missed values: {}".format(", ".join(missed)))
+
+            else:
+                cache.put(cachekey, [ unvpath ], manifest)
+
         return out, err, returncode
 
 
@@ -297,13 +439,40 @@ class Anisotropy(object):
         logger.info("Constructing shape ...")
 
         geompy = salomepl.geometry.getGeom()
-        structure = dict(
-            simple = Simple,
-            bodyCentered = BodyCentered,
-            faceCentered = FaceCentered
-        )[p["structure"]["type"]]
-        shapeGeometry = structure(**p["structure"])
-        shape, groups = shapeGeometry.build()
+        casePath = self.getCasePath(path)
+        os.makedirs(casePath, exist_ok = True)
+
+        cache = Cache(self.getCachePath("geometry", path))
+        cachekey = self.geometryCacheKey()
+        cached = cache.get(cachekey)
+
+        if cached:
+            logger.info(f"Loading shape from cache { cachekey } ...")
+            shape, groups = salomepl.geometry.importBREP(
+                os.path.join(cache.path(cachekey), "shape.brep"), 
+                cached["groups"],
+                name = p["structure"]["type"]
+            )
+            volumeCell = cached["volumeCell"]
+
+        else:
+            structure = dict(
+                simple = Simple,
+                bodyCentered = BodyCentered,
+                faceCentered = FaceCentered
+            )[p["structure"]["type"]]
+            shapeGeometry = structure(**p["structure"])
+            shape, groups = shapeGeometry.build()
+            volumeCell = shapeGeometry.volumeCell
+
+            # Old shape can be shared with cache, so new shape should not overwrite it
+            brepPath = os.path.join(casePath, "shape.brep")
+
+            if os.path.exists(brepPath):
+                os.remove(brepPath)
+
+            manifest = salomepl.geometry.exportBREP(shape, groups, brepPath)
+            cache.put(cachekey, [ brepPath ], dict(groups = manifest, volumeCell = volumeCell))
 
         [length, surfaceArea, volume] = geompy.BasicProperties(shape, theTolerance = 1e-06)
 
@@ -363,8 +532,6 @@ class Anisotropy(object):
             mesh.removePyramids()
             mesh.assignGroups()
 
-            casePath = self.getCasePath(path)
-            os.makedirs(casePath, exist_ok = True)
             logger.info("Exporting mesh ...")
             returncode, err = mesh.exportUNV(os.path.join(casePath, "mesh.unv"))
     
@@ -375,7 +542,7 @@ class Anisotropy(object):
             p["meshresult"].update(
                 surfaceArea = surfaceArea,
                 volume = volume,
-                volumeCell = shapeGeometry.volumeCell,
+                volumeCell = volumeCell,
                 **meshStats
             )
             self.update()
@@ -386,14 +553,21 @@ class Anisotropy(object):
             p["meshresult"].update(
                 surfaceArea = surfaceArea,
                 volume = volume,
-                volumeCell = shapeGeometry.volumeCell
+                volumeCell = volumeCell
             )
             self.update()
 
 
-    def computeFlow(self, path):
+    def computeFlow(self, path, nprocs: int = 1, warmStart: bool = False):
         """Computes a flow on mesh via OpenFOAM
 
+        :param nprocs:
+            Count of MPI ranks, case is decomposed if greater than 1
+
+        :param warmStart:
+            Initial fields are mapped from the nearest computed case 
+            (same type and direction) instead of potentialFoam
+
         :return: 
             Process output, error messages and returncode
         """
@@ -409,7 +583,6 @@ class Anisotropy(object):
         flow = self.params["flow"]
         flowapproximation = self.params["flowapproximation"]
 
-        # ISSUE: ideasUnvToFoam cannot import mesh with '-case' flag so 'os.chdir' for that
         casePath = self.getCasePath(path)
 
         if not os.path.exists(casePath):
@@ -419,92 +592,105 @@ class Anisotropy(object):
 
             return "", err, 1
 
-        os.chdir(casePath)
-        openfoam.foamClean()
+        openfoam.foamClean(case = casePath)
 
         for d in foamCase:
             shutil.copytree(
                 os.path.join(self.env["openfoam_template"], d), 
                 os.path.join(casePath, d)
             )
+
+        writePolicy = flow.get("writePolicy") or {}
+        openfoam.writePolicy(case = casePath, **writePolicy)
         
         ###
         #   Mesh manipulations
         ##
-        if not os.path.exists("mesh.unv"):
-            os.chdir(path or self.env["ROOT"])
-
+        if not os.path.exists(os.path.join(casePath, "mesh.unv")):
             err = f"Missed 'mesh.unv'"
             self.params["flowresult"]["flowStatus"] = "Failed"
             self.update()
 
             return "", err, 1
 
-        out, err, returncode = openfoam.ideasUnvToFoam("mesh.unv")
+        # Faces without group are walls
+        patches = openfoam.FoamFile(os.path.join(casePath, "system/createPatchDict"))["patches"]
 
-        if returncode:
-            os.chdir(path or self.env["ROOT"])
+        for patch in patches:
+            if patch["name"] == "defaultFaces":
+                patch["patchInfo"] = { "type": "wall", "inGroups": [ "wall" ] }
 
+        try:
+            stats = openfoam.unvToFoam(
+                os.path.join(casePath, "mesh.unv"), 
+                casePath, 
+                patches = patches, 
+                scale = flow["scale"],
+                binary = writePolicy.get("format") == "binary"
+            )
+
+        except Exception as e:
             self.params["flowresult"]["flowStatus"] = "Failed"
             self.update()
             
-            return out, err, returncode
-        
-        openfoam.createPatch(dictfile = "system/createPatchDict")
+            return "", f"{ e.__class__.__name__ }: { e }", 1
 
-        openfoam.foamDictionary(
-            "constant/polyMesh/boundary", 
-            "entry0.defaultFaces.type", 
-            "wall"
-        )
-        openfoam.foamDictionary(
-            "constant/polyMesh/boundary", 
-            "entry0.defaultFaces.inGroups", 
-            "1 (wall)"
-        )
+        logger.info(f"polyMesh: { stats }")
         
-        out, err, returncode = openfoam.checkMesh()
+        res = openfoam.checkMesh(case = casePath)
         
-        if out: logger.warning(out)
-        
-        openfoam.transformPoints(flow["scale"])
+        if res.out: logger.warning(res.out)
         
         ###
         #   Decomposition and initial approximation
-        #
-        #   NOTE: Temporary without decomposition
         ##
-        openfoam.foamDictionary(
-            "constant/transportProperties",
-            "nu",
-            str(flow["transportProperties"]["nu"])
-        )
+        with openfoam.FoamFile(os.path.join(casePath, "constant/transportProperties")) as transportProperties:
+            transportProperties["nu"] = flow["transportProperties"]["nu"]
 
-        # openfoam.decomposePar()
-
-        openfoam.renumberMesh()
+        openfoam.renumberMesh(case = casePath)
 
         pressureBF = flowapproximation["pressure"]["boundaryField"]
         velocityBF = flowapproximation["velocity"]["boundaryField"]
 
-        openfoam.foamDictionary(
-            "0/p", 
-            "boundaryField.inlet.value", 
-            openfoam.uniform(pressureBF["inlet"]["value"])
-        )
-        openfoam.foamDictionary(
-            "0/p", 
-            "boundaryField.outlet.value", 
-            openfoam.uniform(pressureBF["outlet"]["value"])
-        )
+        with openfoam.FoamFile(os.path.join(casePath, "0/p")) as pressure:
+            pressure.update({
+                "boundaryField.inlet.value": openfoam.uniform(pressureBF["inlet"]["value"]),
+                "boundaryField.outlet.value": openfoam.uniform(pressureBF["outlet"]["value"])
+            })
         
-        openfoam.foamDictionary(
-            "0/U", 
-            "boundaryField.inlet.value", 
-            openfoam.uniform(velocityBF["inlet"]["value"])
-        )
+        with openfoam.FoamFile(os.path.join(casePath, "0/U")) as velocity:
+            velocity["boundaryField.inlet.value"] = openfoam.uniform(velocityBF["inlet"]["value"])
+
+        # Final fields of the nearest case are the best initial approximation
+        mapped = False
+
+        if warmStart:
+            structure = self.params["structure"]
+            neighbour = self.db.nearestFlow(structure["type"], structure["direction"], structure["theta"])
+
+            if neighbour:
+                source = self.getCasePath(path, neighbour)
+                logger.info(f"Warm start from theta = { neighbour['theta'] }")
+                res = openfoam.mapFields(source, case = casePath)
+                mapped = not res.returncode
+
+                if not mapped:
+                    logger.warning(f"Cannot map fields from { source }: { res.err }")
+
+        useMPI = nprocs > 1
+
+        if useMPI:
+            openfoam.decomposeParDict(nprocs, case = casePath)
+            res = openfoam.decomposePar(case = casePath)
+
+            if res.returncode:
+                self.params["flowresult"]["flowStatus"] = "Failed"
+                self.update()
+
+                return res.out, res.err, res.returncode
         
-        openfoam.potentialFoam()
+        if not mapped:
+            openfoam.potentialFoam(case = casePath, useMPI = useMPI, nprocs = nprocs, timeout = self.env["potentialfoam_timeout"])
         
         ###
         #   Main computation
@@ -512,30 +698,41 @@ class Anisotropy(object):
         pressureBF = flow["pressure"]["boundaryField"]
         velocityBF = flow["velocity"]["boundaryField"]
 
-        openfoam.foamDictionary(
-            "0/U",
-            "boundaryField.inlet.type",
-            velocityBF["inlet"]["type"] 
-        )
-        openfoam.foamDictionary(
-            "0/U",
-            "boundaryField.inlet.value",
-            openfoam.uniform(velocityBF["inlet"]["value"])
-        )
-
-        #for n in range(os.cpu_count()):
-        #    openfoam.foamDictionary(
-        #        f"processor{n}/0/U", 
-        #        "boundaryField.inlet.type", 
-        #        velocityBF.inlet.type
-        #    )
-        #    openfoam.foamDictionary(
-        #        f"processor{n}/0/U", 
-        #        "boundaryField.inlet.value", 
-        #        openfoam.uniform(velocityBF.inlet.value[direction])
-        #    )
+        # Decomposed fields are used by parallel run
+        for d in (openfoam.processorDirs(casePath) if useMPI else [ casePath ]):
+            with openfoam.FoamFile(os.path.join(d, "0/U")) as velocity:
+                velocity.update({
+                    "boundaryField.inlet.type": velocityBF["inlet"]["type"],
+                    "boundaryField.inlet.value": openfoam.uniform(velocityBF["inlet"]["value"])
+                })
         
-        out, err, returncode = openfoam.simpleFoam()
+        # Solver is stopped earlier if flow rates are settled
+        convergence = flow.get("convergence") or {}
+
+        if convergence.get("enabled"):
+            monitor = openfoam.ConvergenceMonitor(
+                casePath,
+                patches = [ "inlet", "outlet" ],
+                tolerance = convergence.get("tolerance", 1e-3),
+                window = convergence.get("window", 100),
+                minIterations = convergence.get("minIterations", 0)
+            )
+
+            with monitor:
+                res = openfoam.simpleFoam(case = casePath, useMPI = useMPI, nprocs = nprocs, timeout = self.env["simplefoam_timeout"])
+
+            if monitor.converged:
+                res.out = f"simpleFoam:\n\tflow rates settled at iteration { monitor.iteration }"
+
+        else:
+            res = openfoam.simpleFoam(case = casePath, useMPI = useMPI, nprocs = nprocs, timeout = self.env["simplefoam_timeout"])
+
+        logger.info(res)
+        out, err, returncode = res.out, res.err, res.returncode
+
+        if not returncode and useMPI:
+            res = openfoam.reconstructPar(case = casePath, latestTime = True)
+            err, returncode = res.err, res.returncode
 
         if not returncode:
             self.params["flowresult"]["flowCalculationTime"] = timer.elapsed()
@@ -545,24 +742,23 @@ class Anisotropy(object):
             self.params["flowresult"]["flowStatus"] = "Failed"
 
         self.update()
-        os.chdir(path or self.env["ROOT"])
         
-        return out, str(err, "utf-8"), returncode
+        return out, err, returncode
 
 
     def flowRate(self):
+        """Reads the last flow rate of outlet from the end of file. 
+        Series of flow rates are collected by :func:`collectFlowSeries`.
+        """
         casePath = self.getCasePath()
-        foamPostProcessing = "postProcessing/flowRatePatch(name=outlet)/0/surfaceFieldValue.dat"
-        path = os.path.join(casePath, foamPostProcessing)
+        last = openfoam.lastValue(casePath, "flowRatePatch(name=outlet)")
 
-        if not os.path.exists(path):
-            logger.warning(f"Unable to compute flow rate. Missed { path }")
+        if last is None:
+            logger.warning(f"Unable to compute flow rate. Missed postProcessing of { casePath }")
 
             return
 
-        with open(path, "r") as io:
-            lastLine = io.readlines()[-1]
-            flowRate = float(lastLine.replace(" ", "").replace("\n", "").split("\t")[1])
+        _, flowRate = last
 
         self.params["flowresult"]["flowRate"] = flowRate
         self.update()
@@ -578,3 +774,310 @@ class Anisotropy(object):
         self.update()
 
         return fr["porosity"]
+
+
+###
+#   Computation stages
+#
+#   NOTE: Stage functions are defined at module level, so they can be passed 
+#   to worker processes with any start method.
+##
+# Connection to the database server of coordinator, set by `initStage`
+stageDatabase = None
+
+def initStage(path: str, address: str = None, authkey: bytes = None):
+    """Applies project paths to environment and logger. 
+    Used as initializer of worker processes.
+
+    :param address:
+        Address of :class:`anisotropy.core.database.DatabaseServer`, 
+        workers open the database file themselves if None
+
+    :param authkey:
+        Authentication key of server
+    """
+    global stageDatabase
+
+    env.update(
+        LOG = os.path.join(path, "logs"),
+        BUILD = os.path.join(path, "build"),
+        CONFIG = os.path.join(path, "anisotropy.toml"),
+        db_path = path
+    )
+    setupLogger(logger, logging.INFO, env["LOG"])
+
+    stageDatabase = DatabaseClient(address, authkey) if address else None
+
+
+def loadCase(type: str, direction: list, theta: float, path: str) -> Anisotropy:
+    """Loads case from database and evals its structure parameters"""
+    case = Anisotropy()
+    case.db = stageDatabase or Database(env["db_name"], path)
+    case.load(type, direction, theta)
+    case.evalParams()
+    case.update()
+
+    return case
+
+
+def caseDone(params: dict, stage: str) -> bool:
+    """Checks loaded parameters of case for results of stage ('mesh', 'flow', 'postProcessing' or 'all')"""
+    meshresult = params.get("meshresult") or {}
+    flowresult = params.get("flowresult") or {}
+    done = {
+        "mesh": meshresult.get("meshStatus") == "Done",
+        "flow": flowresult.get("flowStatus") == "Done",
+        "postProcessing": flowresult.get("flowRate") is not None and flowresult.get("porosity") is not None
+    }
+
+    return all(done.values()) if stage == "all" else done.get(stage, False)
+
+
+def stageJob(name: str):
+    """(Decorator) Loads case and runs stage function under the lease 
+    of the case job (see :class:`anisotropy.core.database.JobLease`). 
+    Job is finished if the stage failed or if it is the last stage of `mode`.
+    Extra keyword arguments are passed to the stage function.
+
+    :param name:
+        Stage name
+    """
+    def decorator(func: FunctionType):
+        @functools.wraps(func)
+        def inner(type: str, direction: list, theta: float, path: str, 
+                force: bool = False, mode: str = None, owner: str = None, **kwargs) -> bool:
+            case = loadCase(type, direction, theta, path)
+
+            logger.info(f"Case: type = { type }, direction = { direction }, theta = { theta }")
+
+            if not owner:
+                return func(case, path, force, **kwargs)
+
+            with JobLease(case.db, case.params["structure"]["structure_id"], owner) as job:
+                if not job.claimed:
+                    logger.info("Case is claimed by another worker. Skipping ...")
+
+                    return False
+
+                done = func(case, path, force, **kwargs)
+
+                if not done or name == "postProcessing" or name == mode:
+                    job.finish("Done" if done else "Failed")
+
+            return done
+
+        return inner
+
+    return decorator
+
+
+@stageJob("mesh")
+def computeMeshStage(case: Anisotropy, path: str, force: bool = False, **kwargs) -> bool:
+    """Computes a mesh for the case if it is not done yet
+
+    :return: True if the case is ready for the flow stage
+    """
+    logger.info("Current stage: mesh")
+
+    if not case.params["meshresult"]["meshStatus"] == "Done" or force:
+        out, err, returncode = case.computeMesh(path, useCache = not force)
+
+        if out: logger.info(out)
+        if err: logger.error(err)
+        if returncode:
+            logger.error("Mesh computation failed. Skipping flow computation ...")
+
+            return False
+
+    else:
+        logger.info("Mesh exists. Skipping ...")
+
+    return True
+
+
+@stageJob("flow")
+def computeFlowStage(case: Anisotropy, path: str, force: bool = False, ranks: int = 1, warmStart: bool = False, **kwargs) -> bool:
+    """Computes a flow for the case if it is not done yet
+
+    :param ranks:
+        Count of MPI ranks for the case
+
+    :param warmStart:
+        Start from fields of the nearest computed case
+
+    :return: True if the case is ready for the post processing stage
+    """
+    logger.info("Current stage: flow")
+
+    if not case.params["flowresult"]["flowStatus"] == "Done" or force:
+        out, err, returncode = case.computeFlow(path, nprocs = ranks, warmStart = warmStart)
+
+        if out: logger.info(out)
+        if err: logger.error(err)
+        if returncode:
+            logger.error("Flow computation failed.")
+
+            return False
+
+    else:
+        logger.info("Flow exists. Skipping ...")
+
+    return True
+
+
+@stageJob("postProcessing")
+def computePostProcessingStage(case: Anisotropy, path: str, force: bool = False, **kwargs) -> bool:
+    """Computes post processing values for the case"""
+    if case.params["meshresult"]["meshStatus"] == "Done":
+        logger.info("Current stage: mesh postProcessing")
+        case.porosity()
+
+    else:
+        logger.warning("Cannot compute mesh post processing values.")
+    
+    if case.params["flowresult"]["flowStatus"] == "Done":
+        logger.info("Current stage: flow postProcessing")
+        case.flowRate()
+
+    else:
+        logger.warning("Cannot compute flow post processing values.")
+
+    return True
+
+
+###
+#   Batch post processing
+##
+
+# Length of the pore cell along the flow direction in units of 'L' and 'r0'
+# (see the pore cells of anisotropy.samples)
+flowLengthCoefficients = {
+    "simple": { 
+        "[1.0, 0.0, 0.0]": (sqrt(2), 0), 
+        "[0.0, 0.0, 1.0]": (1, 0), 
+        "[1.0, 1.0, 1.0]": (sqrt(3), 0) 
+    },
+    "bodyCentered": { 
+        "[1.0, 0.0, 0.0]": (sqrt(2), 0), 
+        "[0.0, 0.0, 1.0]": (1, 0), 
+        "[1.0, 1.0, 1.0]": (sqrt(3), 0) 
+    },
+    "faceCentered": { 
+        "[1.0, 0.0, 0.0]": (0, 2), 
+        "[0.0, 0.0, 1.0]": (1, 0), 
+        "[1.0, 1.0, 1.0]": (sqrt(3), 0) 
+    }
+}
+
+def flowLength(types: list, directions: list, L: numpy.ndarray, r0: numpy.ndarray) -> numpy.ndarray:
+    """Lengths of pore cells along the flow direction (NaN for unknown types or directions)"""
+    coeffs = numpy.array([ 
+        flowLengthCoefficients.get(t, {}).get(str([ float(v) for v in d ]), (numpy.nan, numpy.nan)) 
+        for t, d in zip(types, directions) 
+    ]).reshape(-1, 2)
+
+    return coeffs[:, 0] * L + coeffs[:, 1] * r0
+
+
+def computePermeability(database: Database, type: str = None, direction: list = None, theta: float = None) -> int:
+    """Computes Darcy permeability of all computed cases with one query 
+    and stores it with one transaction. Porosity is computed by 
+    :meth:`Anisotropy.porosity` in the post processing stage and is not changed.
+
+    Permeability is computed with kinematic pressure of OpenFOAM:
+    k = nu Q L / (A dp), where the pore cell has length L along the flow 
+    and cross section A = volumeCell / L in the scaled units.
+
+    :return:
+        Count of updated cases
+    """
+    rows = database.flowParameters(type, direction, theta)
+
+    if not rows:
+        return 0
+
+    def column(getter) -> numpy.ndarray:
+        values = []
+
+        for row in rows:
+            try:
+                values.append(float(getter(row)))
+
+            except (TypeError, KeyError, ValueError):
+                values.append(numpy.nan)
+
+        return numpy.array(values, dtype = numpy.float64)
+
+    flowRate = numpy.abs(column(lambda row: row["flowRate"]))
+    nu = column(lambda row: row["transportProperties"]["nu"])
+    dp = column(lambda row: 
+        row["pressure"]["boundaryField"]["inlet"]["value"] - row["pressure"]["boundaryField"]["outlet"]["value"]
+    )
+    scale = column(lambda row: row["scale"][0])
+    volumeCell = column(lambda row: row["volumeCell"])
+    length = flowLength(
+        [ row["type"] for row in rows ], 
+        [ row["direction"] for row in rows ], 
+        column(lambda row: row["L"]), 
+        column(lambda row: row["r0"])
+    )
+
+    # Geometry is built in model units, mesh is scaled by `scale` for the flow
+    length = length * scale
+    area = volumeCell * scale ** 3 / length
+
+    with numpy.errstate(divide = "ignore", invalid = "ignore"):
+        permeability = nu * flowRate * length / (area * dp)
+
+    results = []
+
+    for row, k in zip(rows, permeability):
+        if not numpy.isfinite(k):
+            logger.warning("Cannot compute permeability for type = {}, direction = {}, theta = {}".format(
+                row["type"], row["direction"], row["theta"]
+            ))
+
+            continue
+
+        results.append(dict(
+            flowresult_id = row["flowresult_id"],
+            permeability = float(k)
+        ))
+
+    database.updateFlowResults(results, [ "permeability" ])
+
+    return len(results)
+
+
+def collectFlowSeries(database: Database, path: str, type: str = None, direction: list = None, theta: float = None) -> int:
+    """Reads flow rates of inlet and outlet for all computed cases 
+    and stores them with one transaction
+
+    :return:
+        Count of updated cases
+    """
+    cases = database.finishedFlows(type, direction, theta)
+    model = Anisotropy()
+    casePaths = [ model.getCasePath(path, structure) for structure in cases ]
+    names = [ "flowRatePatch(name=inlet)", "flowRatePatch(name=outlet)" ]
+    series = openfoam.loadSeries(casePaths, names)
+    results = []
+
+    for n, case in enumerate(cases):
+        inlet, outlet = series[names[0]][n], series[names[1]][n]
+
+        if not len(outlet):
+            logger.warning(f"Missed postProcessing of { casePaths[n] }")
+
+            continue
+
+        results.append(dict(
+            flowresult_id = case["flowresult_id"],
+            flowRate = float(outlet[-1, 1]),
+            inletSeries = inlet[:, 1],
+            outletSeries = outlet[:, 1]
+        ))
+
+    database.updateFlowResults(results, [ "flowRate", "inletSeries", "outletSeries" ])
+
+    return len(results)
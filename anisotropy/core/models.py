@@ -8,14 +8,15 @@ from peewee import (
     AutoField, ForeignKeyField, 
     TextField, FloatField, 
     IntegerField, BooleanField, 
-    TimeField
+    TimeField, BlobField
 )
 import json
+import numpy
 
 db = SqliteDatabase(
     None,
     pragmas = { "foreign_keys": 1 },
-    field_types = { "list": "text" }
+    field_types = { "list": "blob" }
 )
 
 class BaseModel(Model):
@@ -23,23 +24,40 @@ class BaseModel(Model):
         database = db
 
 
+def parseList(value: str) -> list:
+    """Parses list written with `str` (old format of :class:`ListField`)"""
+    pval = []
+
+    if not value[1 : -1].strip():
+        return pval
+
+    for entry in value[1 : -1].split(","):
+        try:
+            pval.append(float(entry))
+
+        except:
+            pval.append(entry.strip().replace("'", ""))
+
+    return pval
+
+
 class ListField(Field):
+    """Stores list of numbers as packed float64 bytes, 
+    so equal vectors are equal in database and can be indexed
+    """
     field_type = "list"
 
     def db_value(self, value):
-        return str(value)
+        if value is not None:
+            return numpy.asarray(value, dtype = "<f8").tobytes()
 
     def python_value(self, value):
-        pval = []
+        if isinstance(value, bytes):
+            return numpy.frombuffer(value, dtype = "<f8").tolist()
 
-        for entry in value[1 : -1].split(","):
-            try:
-                pval.append(float(entry))
-
-            except:
-                pval.append(entry.strip().replace("'", ""))
-
-        return pval
+        elif value is not None:
+            # Not converted yet (see anisotropy.core.database.Database._upgrade)
+            return parseList(value)
 
 
 class JSONField(TextField):
@@ -51,6 +69,17 @@ class JSONField(TextField):
             return json.loads(value)
 
 
+class ArrayField(BlobField):
+    """Stores 1D numeric array as float32 bytes"""
+    def db_value(self, value):
+        if value is not None:
+            return super().db_value(numpy.asarray(value, dtype = "<f4").tobytes())
+
+    def python_value(self, value):
+        if value is not None:
+            return numpy.frombuffer(value, dtype = "<f4")
+
+
 class Structure(BaseModel):
     structure_id = AutoField()
 
@@ -66,10 +95,22 @@ class Structure(BaseModel):
     fillets = FloatField(null = True)
     #path = TextField()
 
+    # Canonical identifier of case (see anisotropy.core.database.caseKey)
+    key = TextField(null = True, unique = True)
+
+    # Increased on every change of the case, set by database triggers (see anisotropy.core.database)
+    revision = IntegerField(null = True, index = True)
+
+    class Meta:
+        indexes = (
+            # Selection of cases by direction
+            (("type", "direction"), False),
+        )
+
 
 class Mesh(BaseModel):
     mesh_id = AutoField()
-    structure_id = ForeignKeyField(Structure, backref = "meshes")
+    structure_id = ForeignKeyField(Structure, backref = "meshes", unique = True)
 
     maxSize = FloatField(null = True) 
     minSize = FloatField(null = True) 
@@ -94,7 +135,7 @@ class Mesh(BaseModel):
     numberOfLayers = IntegerField(null = True)
     stretchFactor = FloatField(null = True)
     isFacesToIgnore = BooleanField(null = True)
-    facesToIgnore = ListField(null = True)
+    facesToIgnore = JSONField(null = True)
     #faces = []
     extrusionMethod = TextField(null = True)
 
@@ -122,10 +163,15 @@ class SubMesh(BaseModel):
     fuseEdges = BooleanField(null = True)
     checkChartBoundary = BooleanField(null = True)
 
+    class Meta:
+        indexes = (
+            (("mesh_id", "name"), True),
+        )
+
 
 class MeshResult(BaseModel):
     meshresult_id = AutoField()
-    mesh_id = ForeignKeyField(Mesh, backref = "meshresults")
+    mesh_id = ForeignKeyField(Mesh, backref = "meshresults", unique = True)
     
     surfaceArea = FloatField(null = True)
     volume = FloatField(null = True)
@@ -145,17 +191,19 @@ class MeshResult(BaseModel):
 
 class Flow(BaseModel):
     flow_id = AutoField()
-    structure_id = ForeignKeyField(Structure, backref = "flows")
+    structure_id = ForeignKeyField(Structure, backref = "flows", unique = True)
 
     scale = ListField(null = True)
     pressure = JSONField(null = True)
     velocity = JSONField(null = True)
     transportProperties = JSONField(null = True)
+    convergence = JSONField(null = True)
+    writePolicy = JSONField(null = True)
 
    
 class FlowApproximation(BaseModel):
     flow_approximation_id = AutoField()
-    flow_id = ForeignKeyField(Flow, backref = "flowapproximations")
+    flow_id = ForeignKeyField(Flow, backref = "flowapproximations", unique = True)
 
     pressure = JSONField(null = True)
     velocity = JSONField(null = True)
@@ -164,11 +212,29 @@ class FlowApproximation(BaseModel):
 
 class FlowResult(BaseModel):
     flowresult_id = AutoField()
-    flow_id = ForeignKeyField(Flow, backref = "flowresults")
+    flow_id = ForeignKeyField(Flow, backref = "flowresults", unique = True)
 
     flowRate = FloatField(null = True)
     porosity = FloatField(null = True)
     permeability = FloatField(null = True)
 
+    # Flow rates of patches for every written iteration
+    inletSeries = ArrayField(null = True)
+    outletSeries = ArrayField(null = True)
+
     flowStatus = TextField(null = True, default = "Idle")
     flowCalculationTime = TimeField(null = True)
+
+
+class Job(BaseModel):
+    job_id = AutoField()
+    structure_id = ForeignKeyField(Structure, backref = "jobs")
+
+    stage = TextField()
+    status = TextField(default = "Queued")
+    owner = TextField(null = True)
+    leaseExpires = FloatField(null = True)
+    attempts = IntegerField(default = 0)
+
+    created = FloatField(null = True)
+    finished = FloatField(null = True)
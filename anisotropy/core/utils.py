@@ -4,13 +4,19 @@
 
 import logging
 
-from multiprocessing import Queue, Process, cpu_count
+from multiprocessing import get_context
+from queue import Empty as QueueEmpty
+from collections import deque
+import importlib
 import socket
 import copy
 import time
+import signal
 from types import FunctionType
 import os
 
+logger = logging.getLogger("anisotropy")
+
 class CustomFormatter(logging.Formatter):
     def _getFormat(self, level: int):
         grey = "\x1b[38;21m"
@@ -213,68 +219,354 @@ class Timer(object):
         return time.monotonic() - self.start
 
 
-def queue(cmd, qin, qout, *args):
-    
+class Task(object):
+    """Spawn-safe task descriptor. Function is stored by its module and 
+    qualified name and is imported again inside worker process, so tasks 
+    can be used with any multiprocessing start method.
+
+    :param func:
+        Module-level function
+    """
+    def __init__(self, func: FunctionType, *args, **kwargs):
+        if "<locals>" in func.__qualname__:
+            raise ValueError(f"Task function '{ func.__qualname__ }' must be defined at module level")
+
+        self.module = func.__module__
+        self.name = func.__qualname__
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self):
+        func = importlib.import_module(self.module)
+
+        for attr in self.name.split("."):
+            func = getattr(func, attr)
+
+        return func(*self.args, **self.kwargs)
+
+    def __repr__(self):
+        return f"Task({ self.module }.{ self.name }, args = { self.args }, kwargs = { self.kwargs })"
+
+
+def _terminate(signum, frame):
+    # Unwinds the task, so applications kill their process groups.
+    # Repeated signal should not interrupt the cleanup
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    raise SystemExit(128 + signum)
+
+
+def worker(slot, qin, qout, initializer, initargs):
+    # Worker leads own process group, so its children are stopped with it (see ProcessPool._stop)
+    os.setpgrp()
+    signal.signal(signal.SIGTERM, _terminate)
+
+    if initializer:
+        initializer(*initargs)
+
     while True:
-        # Get item from the queue
-        pos, var = qin.get()
+        # Get item from the worker queue
+        pos, task = qin.get()
         
         # Exit point 
         if pos is None:
             break
 
-        # Execute command
-        res = cmd(*var, *args)
+        # Execute task
+        try:
+            res = task()
 
-        # Put results to the queue
-        qout.put((pos, res))
+        except Exception:
+            logger.exception(f"Task { task } failed")
+            res = None
+
+        # Put results to the common queue
+        qout.put((slot, pos, res))
 
     return
 
 
-def parallel(np, var, cmd):
+class ProcessPool(object):
+    """Pool of processes that streams results of tasks as soon as they 
+    finished. Worker that crashed or exceeded the task timeout is replaced 
+    with a new one and its task is resubmitted (if retries are left) or 
+    reported with `None` result.
 
-    varcount = len(var)
+    :param nprocs:
+        Count of worker processes
 
-    processes = []
-    nprocs = np if np <= cpu_count() else cpu_count()
-    
-    qin = Queue(1)
-    qout = Queue()
-    
-    # Create processes
-    for n in range(nprocs):
-        pargs = [cmd, qin, qout]
+    :param timeout:
+        Limit of execution time for one task in seconds
 
-        p = Process(target = queue, args = tuple(pargs))
+    :param retries:
+        Count of resubmissions for a task of crashed or hung worker
 
-        processes.append(p)
-    
-    # Start processes
-    for p in processes:
-        p.daemon = True
-        p.start()
+    :param method:
+        Multiprocessing start method ('fork', 'spawn', 'forkserver')
 
-    # Fill queue
-    for n in range(varcount):
-        qin.put((n, var[n]))
+    :param initializer:
+        Module-level function called in each new worker with `initargs`
+    """
+    def __init__(self, nprocs: int, timeout: float = None, retries: int = 0, method: str = None, 
+            initializer: FunctionType = None, initargs: tuple = (), name: str = "Worker"):
+        self.nprocs = nprocs
+        self.timeout = timeout
+        self.retries = retries
+        self.initializer = initializer
+        self.initargs = initargs
+        self.name = name
+
+        self.context = get_context(method)
+        self.qout = self.context.Queue()
+        self.workers = [ None for _ in range(nprocs) ]
+        self.pending = deque()
+        self.tasks = {}
+        self.attempts = {}
+        self.started = time.monotonic()
+        # Finished tasks are removed, so positions are counted separately
+        self.counter = 0
+
+    def _spawn(self, slot: int):
+        qin = self.context.Queue()
+        process = self.context.Process(
+            target = worker, 
+            args = (slot, qin, self.qout, self.initializer, self.initargs),
+            name = f"{ self.name }-{ slot }",
+            daemon = True
+        )
+        process.start()
 
-    for _ in range(nprocs):
-        qin.put((None, None))
-    
-    # Get results
-    results = [[] for n in range(varcount)]
+        busy = self.workers[slot]["busy"] if self.workers[slot] else 0
 
-    for n in range(varcount):
-        index, res = qout.get()
-        
-        results[index] = res
-    
-    # Wait until each processor has finished
-    for p in processes:
-        p.join()
+        self.workers[slot] = dict(
+            process = process, 
+            qin = qin, 
+            pos = None, 
+            start = None, 
+            busy = busy
+        )
+
+    def _dispatch(self):
+        for slot, w in enumerate(self.workers):
+            if not self.pending:
+                break
+
+            if w is None:
+                self._spawn(slot)
+                w = self.workers[slot]
+
+            if w["pos"] is None:
+                pos = self.pending.popleft()
+                w["pos"], w["start"] = pos, time.monotonic()
+                w["qin"].put((pos, self.tasks[pos]))
+
+    def _stop(self, slot: int, grace: float = 15):
+        """Terminates worker with its process group. Children of the group 
+        that are still alive after grace period are killed.
+        """
+        process = self.workers[slot]["process"]
+
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+
+        except ProcessLookupError:
+            # Group is not created yet or is already stopped
+            process.terminate()
+
+        process.join(grace)
+
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+
+        except ProcessLookupError:
+            pass
+
+        process.join()
+
+    def _release(self, slot: int):
+        w = self.workers[slot]
+        w["busy"] += time.monotonic() - w["start"]
+        w["pos"], w["start"] = None, None
+
+    def _check(self) -> list:
+        failed = []
+
+        for slot, w in enumerate(self.workers):
+            if w is None or w["pos"] is None:
+                continue
+
+            crashed = not w["process"].is_alive()
+            hung = self.timeout and time.monotonic() - w["start"] > self.timeout
+
+            if crashed or hung:
+                pos = w["pos"]
+                logger.error("{}: task {} {}. Respawning worker ...".format(
+                    w["process"].name, pos, "crashed" if crashed else "timed out"
+                ))
+                
+                # Children of crashed worker can be still alive
+                self._stop(slot)
+                self._release(slot)
+                self._spawn(slot)
+
+                if self.attempts[pos] < self.retries:
+                    self.attempts[pos] += 1
+                    self.pending.appendleft(pos)
 
-    return results
+                else:
+                    failed.append((pos, None))
+
+        return failed
+
+    def submit(self, task: Task, pos: int = None) -> int:
+        """Adds task to the queue
+
+        :return:
+            Position of task
+        """
+        if pos is None:
+            pos = self.counter
+            self.counter += 1
+
+        self.tasks[pos] = task
+        self.attempts[pos] = 0
+        self.pending.append(pos)
+        self._dispatch()
+
+        return pos
+
+    def active(self) -> int:
+        """Count of queued and running tasks"""
+        running = sum([ 1 for w in self.workers if w and w["pos"] is not None ])
+
+        return len(self.pending) + running
+
+    def poll(self, timeout: float = None) -> list:
+        """Waits for finished tasks
+
+        :return:
+            List of tuples (pos, result)
+        """
+        finished = []
+
+        try:
+            finished.append(self.qout.get(timeout = timeout))
+
+            while True:
+                finished.append(self.qout.get_nowait())
+
+        except QueueEmpty:
+            pass
+
+        results = []
+
+        for slot, pos, res in finished:
+            # Skip results of already replaced workers
+            if self.workers[slot]["pos"] == pos:
+                self._release(slot)
+                results.append((pos, res))
+
+        results.extend(self._check())
+
+        for pos, _ in results:
+            self.tasks.pop(pos, None)
+
+        self._dispatch()
+
+        return results
+
+    def results(self, interval: float = 1):
+        """Yields tuples (pos, result) as tasks finished, until queue is empty"""
+        while self.active():
+            yield from self.poll(interval)
+
+    def utilisation(self) -> dict:
+        """Fractions of pool lifetime that each worker spent running tasks"""
+        elapsed = time.monotonic() - self.started
+        usage = {}
+
+        for slot, w in enumerate(self.workers):
+            busy = 0
+
+            if w:
+                busy = w["busy"] + (time.monotonic() - w["start"] if w["start"] else 0)
+
+            usage[f"{ self.name }-{ slot }"] = busy / elapsed if elapsed else 0
+
+        return usage
+
+    def close(self):
+        """Stops all workers"""
+        for w in self.workers:
+            if w and w["pos"] is None:
+                w["qin"].put((None, None))
+
+        for slot, w in enumerate(self.workers):
+            if w:
+                if w["pos"] is None:
+                    w["process"].join()
+
+                else:
+                    self._stop(slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def pipeline(stages: list, var: list, params: dict = None, interval: float = 0.1, **kwargs):
+    """Runs a chain of stages over arguments. Every stage owns a separate 
+    pool of processes, so the item can be passed to the next stage while 
+    the previous one is processing the following item.
+
+    :param stages:
+        List of tuples (cmd, np) where `cmd` is a module-level stage function 
+        and `np` is a count of processes for the stage. 
+        Item is passed to the next stage only if `cmd` returns True.
+
+    :param var:
+        List of argument tuples
+
+    :param params:
+        Keyword arguments passed to each stage function
+
+    :param kwargs:
+        Keyword arguments for :class:`ProcessPool`
+
+    :return:
+        Generator of tuples (pos, result) from the last executed stage for each item
+    """
+    name = kwargs.pop("name", "Worker")
+    params = params or {}
+    pools = [ 
+        ProcessPool(np, name = f"{ name }-{ cmd.__name__ }", **kwargs) 
+            for cmd, np in stages 
+    ]
+
+    try:
+        for pos, args in enumerate(var):
+            pools[0].submit(Task(stages[0][0], *args, **params), pos)
+
+        while any([ pool.active() for pool in pools ]):
+            for n, pool in enumerate(pools):
+                if not pool.active():
+                    continue
+
+                for pos, res in pool.poll(interval):
+                    if res and n + 1 < len(stages):
+                        pools[n + 1].submit(Task(stages[n + 1][0], *var[pos], **params), pos)
+
+                    else:
+                        yield pos, res
+
+    finally:
+        for pool in pools:
+            logger.info("Utilisation: {}".format(
+                ", ".join([ f"{ k } = { v:.0%}" for k, v in pool.utilisation().items() ])
+            ))
+            pool.close()
 
     
 def portIsFree(address, port):
@@ -3,16 +3,23 @@
 # License: GNU GPL version 3, see the file "LICENSE" for details.
 
 
-from .meshConversion import ideasUnvToFoam
+from .meshConversion import ideasUnvToFoam, readUNV, unvToFoam, MeshConversionError
 from .meshManipulation import createPatch, transformPoints, checkMesh, renumberMesh
 from .miscellaneous import foamDictionary
-from .parallelProcessing import decomposePar
+from .foamFile import FoamFile, FoamFileError
+from .preProcessing import mapFields
+from .monitor import ConvergenceMonitor
+from .parallelProcessing import decomposeParDict, decomposePar, reconstructPar, processorDirs
 from .solvers import potentialFoam, simpleFoam
-from .utils import version, foamClean, uniform
+from .postProcessing import functionObjectFiles, lastValue, readSeries, loadSeries
+from .utils import version, foamClean, uniform, writePolicy
 
 __all__ = [
     # meshConversion
     "ideasUnvToFoam",
+    "readUNV",
+    "unvToFoam",
+    "MeshConversionError",
 
     # meshManipulation
     "createPatch",
@@ -23,15 +30,35 @@ __all__ = [
     # miscellaneous
     "foamDictionary",
 
+    # foamFile
+    "FoamFile",
+    "FoamFileError",
+
+    # preProcessing
+    "mapFields",
+
+    # monitor
+    "ConvergenceMonitor",
+
     # parallelProcessing
+    "decomposeParDict",
     "decomposePar",
+    "reconstructPar",
+    "processorDirs",
 
     # solvers
     "potentialFoam",
     "simpleFoam",
 
+    # postProcessing
+    "functionObjectFiles",
+    "lastValue",
+    "readSeries",
+    "loadSeries",
+
     # utils
     "version",
     "foamClean",
-    "uniform"
+    "uniform",
+    "writePolicy"
 ]
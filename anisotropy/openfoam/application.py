@@ -3,49 +3,213 @@
 # License: GNU GPL version 3, see the file "LICENSE" for details.
 
 import os, sys
+import time
+import signal
 import subprocess
 
 import logging
 logger = logging.getLogger()
 
-def application(name: str, *args: str, case: str = None, stderr: bool = True, useMPI: bool = False) -> int:
-    
+
+class FileTail(object):
+    """Reads complete lines appended to a file since the last call"""
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+
+    def lines(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+
+        with open(self.path, "rb") as io:
+            io.seek(self.offset)
+            data = io.read()
+
+        # Last line can be incomplete while process is writing
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+
+        return data[:end].decode(errors = "replace").splitlines()
+
+
+def lastLines(path: str, count: int = 20, blocksize: int = 4096) -> list:
+    """Reads last lines of file without reading the whole file"""
+    with open(path, "rb") as io:
+        io.seek(0, os.SEEK_END)
+        pos = io.tell()
+        data = b""
+
+        while pos > 0 and data.count(b"\n") <= count:
+            step = min(blocksize, pos)
+            pos -= step
+            io.seek(pos)
+            data = io.read(step) + data
+
+    return data.decode(errors = "replace").splitlines()[-count:]
+
+
+class ApplicationResult(object):
+    """Result of OpenFOAM application
+
+    :param returncode:
+        Exit code, negative signal number if process was killed
+
+    :param elapsed:
+        Wall time in seconds
+
+    :param maxrss:
+        Peak resident set size in kilobytes
+
+    :param logpath:
+        Path to log file with stdout and stderr
+
+    :param tail:
+        Last lines of log
+    """
+    def __init__(self, name: str, returncode: int, elapsed: float, maxrss: int, logpath: str,
+            tail: list = None, timedOut: bool = False):
+        self.name = name
+        self.returncode = returncode
+        self.elapsed = elapsed
+        self.maxrss = maxrss
+        self.logpath = logpath
+        self.tail = tail or []
+        self.timedOut = timedOut
+
+        # Summary of output, can be set by wrappers
+        self.out = ""
+
+    @property
+    def err(self) -> str:
+        """Error message for failed process"""
+        if not self.returncode:
+            return ""
+
+        reason = "timeout" if self.timedOut else f"returncode { self.returncode }"
+
+        return "{} failed ({}):\n\t{}".format(self.name, reason, "\n\t".join(self.tail))
+
+    def __repr__(self):
+        return "<ApplicationResult {} returncode = {}, elapsed = {:.1f} s, maxrss = {} KB>".format(
+            self.name, self.returncode, self.elapsed, self.maxrss
+        )
+
+
+def _kill(pid: int, grace: float = 10):
+    """Terminates process group, kills it after grace period"""
+    try:
+        os.killpg(pid, signal.SIGTERM)
+        deadline = time.monotonic() + grace
+
+        while time.monotonic() < deadline:
+            if os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT):
+                return
+
+            time.sleep(0.1)
+
+        os.killpg(pid, signal.SIGKILL)
+
+    except ProcessLookupError:
+        pass
+
+
+def application(name: str, *args: str, case: str = None, stderr: bool = True, useMPI: bool = False,
+        nprocs: int = None, timeout: float = None, callback = None, interval: float = 1) -> ApplicationResult:
+    """Runs OpenFOAM application inside the case directory.
+    Relative paths in arguments are resolved against the case,
+    the working directory of the current process is never changed.
+    Output is written by the process directly to `<case>/<name>.log`.
+
+    :param case:
+        Path to case directory, current directory if None
+
+    :param stderr:
+        Write stderr to the log too (discarded otherwise)
+
+    :param nprocs:
+        Count of MPI ranks if `useMPI`, all cores if None
+
+    :param timeout:
+        Time limit in seconds, the whole process group is killed after it
+
+    :param callback:
+        Function called with every new line of the log while process is running
+
+    :param interval:
+        Time between checks of timeout and log in seconds
+
+    :return:
+        Structured result
+    """
     cmd = []
 
     if useMPI:
-        nprocs = os.cpu_count()
+        nprocs = nprocs or os.cpu_count()
         cmd.extend(["mpirun", "-np", str(nprocs), "--oversubscribe"])
-    
-    cmd.append(name)
 
-    if case:
-        cmd.extend(["-case", case])
+    cmd.append(name)
 
     if args:
         cmd.extend([*args])
-        
+
     logger.info("{}: {}".format(name, [*args]))
-    logpath = os.path.join(case if case else "", "{}.log".format(name))
-   
-    with subprocess.Popen(cmd, 
-        stdout = subprocess.PIPE, 
-        stderr = subprocess.PIPE) as p, \
-        open(logpath, "wb") as logfile:
-        
-        for line in p.stdout:
-            #sys.stdout.buffer.write(line) 
-            logfile.write(line)
+    cwd = os.path.abspath(case or os.getcwd())
+    logpath = os.path.join(cwd, "{}.log".format(name))
+    timedOut = False
+    start = time.monotonic()
+
+    with open(logpath, "wb") as logfile:
+        p = subprocess.Popen(cmd,
+            cwd = cwd,
+            stdin = subprocess.DEVNULL,
+            stdout = logfile,
+            stderr = subprocess.STDOUT if stderr else subprocess.DEVNULL,
+            # Own process group for killing mpirun with its ranks
+            start_new_session = True
+        )
+
+    tail = FileTail(logpath) if callback else None
+
+    try:
+        if not timeout and not callback:
+            _, status, rusage = os.wait4(p.pid, 0)
+
+        else:
+            while True:
+                pid, status, rusage = os.wait4(p.pid, os.WNOHANG)
+
+                if tail:
+                    for line in tail.lines():
+                        callback(line)
+
+                if pid:
+                    break
+
+                if timeout and time.monotonic() - start > timeout:
+                    logger.error(f"{ name }: time limit { timeout } s is reached. Killing ...")
+                    timedOut = True
+                    _kill(p.pid)
+                    _, status, rusage = os.wait4(p.pid, 0)
 
-        #for line in p.stderr:
-        #    logfile.write(line)
+                    break
 
-        out, err = p.communicate()
-        logfile.write(err)
+                time.sleep(interval)
 
-        #if err and stderr:
-        #    logger.error("""{}:
-        #    {}""".format(name, str(err, "utf-8")))
+    except BaseException:
+        _kill(p.pid)
+        p.wait()
 
-    return out, err, p.returncode
+        raise
 
+    # Process is already waited, so Popen should not wait it again
+    p.returncode = os.waitstatus_to_exitcode(status)
 
+    return ApplicationResult(
+        name,
+        p.returncode,
+        time.monotonic() - start,
+        rusage.ru_maxrss,
+        logpath,
+        tail = lastLines(logpath),
+        timedOut = timedOut
+    )
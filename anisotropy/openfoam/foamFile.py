@@ -0,0 +1,777 @@
+# -*- coding: utf-8 -*-
+# This file is part of anisotropy.
+# License: GNU GPL version 3, see the file "LICENSE" for details.
+
+"""In-process reader and writer of OpenFOAM dictionary files.
+
+File is kept as a text and every edit replaces only the span of changed
+entry, so untouched content (formatting, comments, large field lists)
+is written back byte-to-byte.
+"""
+
+import os
+import re
+import gzip
+
+import numpy
+
+__all__ = ["FoamFile", "FoamFileError", "foamValue"]
+
+
+class FoamFileError(Exception):
+    pass
+
+
+_space = re.compile(r"(?:\s+|//[^\n]*|/\*.*?\*/)+", re.S)
+_string = re.compile(r'"(?:\\.|[^"\\])*"', re.S)
+_code = re.compile(r"#\{.*?#\}", re.S)
+_integer = re.compile(r"[0-9]+$")
+_number = re.compile(r"[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?$")
+_listType = re.compile(r"List<(\w+)>$")
+_listEnd = {
+    # List of primitives ends with the first closing bracket
+    False: re.compile(r"\)"),
+    # List of tuples ends with two closing brackets in a row
+    True: re.compile(r"\)\s*\)")
+}
+_components = {
+    "label": 1,
+    "scalar": 1,
+    "vector": 3,
+    "sphericalTensor": 1,
+    "symmTensor": 6,
+    "tensor": 9
+}
+_delimiters = set(" \t\r\n\f\v{};\"")
+
+
+class Word(str):
+    """Unquoted token"""
+    pass
+
+
+class String(str):
+    """Quoted token (stored without quotes)"""
+    pass
+
+
+class Dictionary(object):
+    """Parsed dictionary block
+
+    :param open:
+        Position of '{' (None for top level)
+
+    :param close:
+        Position of '}' (end of text for top level)
+    """
+    def __init__(self, open: int = None):
+        self.open = open
+        self.close = None
+        self.entries = []
+
+    def find(self, keyword: str):
+        for entry in self.entries:
+            if entry.keyword == keyword:
+                return entry
+
+        return None
+
+
+class Entry(object):
+    """Parsed entry `keyword value;` or `keyword { ... }`"""
+    def __init__(self, keyword: str, start: int):
+        self.keyword = keyword
+        self.start = start
+        self.end = None
+        self.dict = None
+        self.value = []
+        self.valueStart = None
+        self.valueEnd = None
+
+
+class List(object):
+    """Parsed list `( ... )`"""
+    def __init__(self, start: int):
+        self.start = start
+        self.end = None
+        self.items = []
+
+
+class Field(object):
+    """Span of a large list of primitives, that is not tokenized"""
+    def __init__(self, start: int, end: int, type: str, size: int, binary: bool):
+        self.start = start
+        self.end = end
+        self.type = type
+        self.size = size
+        self.binary = binary
+
+
+class Parser(object):
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.binary = False
+        self.labelSize = 4
+        self.scalarSize = 8
+
+    def error(self, message: str):
+        line = self.text.count("\n", 0, self.pos) + 1
+
+        raise FoamFileError(f"{ message } (line { line })")
+
+    def skip(self):
+        match = _space.match(self.text, self.pos)
+
+        if match:
+            self.pos = match.end()
+
+    def peek(self) -> str:
+        self.skip()
+
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def word(self) -> Word:
+        start = self.pos
+        depth = 0
+        text = self.text
+
+        while self.pos < len(text):
+            char = text[self.pos]
+
+            if char in _delimiters:
+                break
+
+            elif char == "(":
+                # Sized list: `N(...)`
+                if depth == 0 and self.pos > start and text[start : self.pos].isdigit():
+                    break
+
+                depth += 1
+
+            elif char == ")":
+                if depth == 0:
+                    break
+
+                depth -= 1
+
+            elif char in "[]" and depth == 0:
+                break
+
+            self.pos += 1
+
+        if self.pos == start:
+            self.error(f"Unexpected character '{ text[self.pos] }'")
+
+        return Word(text[start : self.pos])
+
+    def item(self, items: list):
+        char = self.peek()
+
+        if char == '"':
+            match = _string.match(self.text, self.pos)
+
+            if not match:
+                self.error("Unterminated string")
+
+            self.pos = match.end()
+
+            return String(match.group()[1 : -1])
+
+        elif char == "(":
+            return self.list(items)
+
+        elif char == "[":
+            start = self.pos
+            end = self.text.find("]", start)
+
+            if end == -1:
+                self.error("Unterminated dimensions")
+
+            self.pos = end + 1
+
+            return Word(self.text[start : self.pos])
+
+        elif char == "{":
+            return self.dictionary()
+
+        elif char == "#" and self.text.startswith("#{", self.pos):
+            match = _code.match(self.text, self.pos)
+
+            if not match:
+                self.error("Unterminated code block")
+
+            self.pos = match.end()
+
+            return Word(match.group())
+
+        else:
+            return self.word()
+
+    def field(self, items: list):
+        """Tries to skip list of primitives `List<type> N ( ... )` without tokenization"""
+        if len(items) < 2 or not isinstance(items[-1], Word) or not isinstance(items[-2], Word):
+            return None
+
+        typeMatch = _listType.match(items[-2])
+
+        if not typeMatch or not _integer.match(items[-1]) or typeMatch.group(1) not in _components:
+            return None
+
+        type, size = typeMatch.group(1), int(items[-1])
+        start = self.pos
+        components = _components[type]
+
+        if self.binary:
+            itemsize = self.labelSize if type == "label" else self.scalarSize
+            end = start + 1 + size * components * itemsize
+
+            if self.text[end : end + 1] != ")":
+                self.error("Broken binary list")
+
+        else:
+            match = _listEnd[components > 1].search(self.text, start + 1)
+
+            if not match:
+                self.error("Unterminated list")
+
+            end = match.end() - 1
+
+        self.pos = end + 1
+
+        return Field(start, self.pos, type, size, self.binary)
+
+    def list(self, items: list = None):
+        field = self.field(items or [])
+
+        if field:
+            return field
+
+        lst = List(self.pos)
+        self.pos += 1
+
+        while True:
+            char = self.peek()
+
+            if char == ")":
+                self.pos += 1
+                lst.end = self.pos
+
+                return lst
+
+            elif not char:
+                self.error("Unterminated list")
+
+            lst.items.append(self.item(lst.items))
+
+    def dictionary(self, top: bool = False) -> Dictionary:
+        dictionary = Dictionary(None if top else self.pos)
+
+        if not top:
+            self.pos += 1
+
+        anonymous = 0
+
+        while True:
+            char = self.peek()
+
+            if char == "}" and not top:
+                dictionary.close = self.pos
+                self.pos += 1
+
+                return dictionary
+
+            elif not char:
+                if not top:
+                    self.error("Unterminated dictionary")
+
+                dictionary.close = self.pos
+
+                return dictionary
+
+            elif char == ";":
+                self.pos += 1
+
+                continue
+
+            start = self.pos
+
+            if char in "([":
+                # Anonymous entry (e.g. list of patches in polyMesh/boundary)
+                entry = Entry(f"entry{ anonymous }", start)
+                anonymous += 1
+
+            else:
+                keyword = self.item([])
+
+                if isinstance(keyword, (List, Dictionary)):
+                    self.error("Unexpected block")
+
+                # Top level list with size: `N ( ... )`
+                if top and _integer.match(keyword) and self.peek() == "(":
+                    self.pos = start
+                    entry = Entry(f"entry{ anonymous }", start)
+                    anonymous += 1
+
+                else:
+                    entry = Entry(str(keyword), start)
+
+            dictionary.entries.append(entry)
+
+            if self.peek() == "{":
+                entry.dict = self.dictionary()
+                entry.end = self.pos
+
+                continue
+
+            entry.valueStart = self.pos
+            entry.valueEnd = self.pos
+            directive = entry.keyword.startswith("#")
+
+            while True:
+                char = self.peek()
+
+                if char == ";":
+                    entry.end = self.pos + 1
+                    self.pos += 1
+
+                    break
+
+                elif not char or char == "}":
+                    entry.end = entry.valueEnd
+
+                    break
+
+                entry.value.append(self.item(entry.value))
+                entry.valueEnd = self.pos
+
+                # Directives (#include "file") and anonymous lists have no semicolon
+                if directive or (entry.keyword.startswith("entry") and isinstance(entry.value[-1], List)):
+                    if self.peek() != ";":
+                        entry.end = entry.valueEnd
+
+                        break
+
+            if entry.keyword == "format" and entry.value:
+                self.binary = entry.value[0] == "binary"
+
+            elif entry.keyword == "arch" and entry.value:
+                arch = str(entry.value[0])
+                labelMatch = re.search(r"label=(\d+)", arch)
+                scalarMatch = re.search(r"scalar=(\d+)", arch)
+
+                if labelMatch:
+                    self.labelSize = int(labelMatch.group(1)) // 8
+
+                if scalarMatch:
+                    self.scalarSize = int(scalarMatch.group(1)) // 8
+
+    def parse(self) -> Dictionary:
+        return self.dictionary(top = True)
+
+
+def foamValue(value, indent: str = "") -> str:
+    """Converts python value to OpenFOAM notation
+
+    :return: String with value
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    elif isinstance(value, (int, float)):
+        return str(value)
+
+    elif isinstance(value, (list, tuple)):
+        return "({})".format(" ".join([ foamValue(v, indent) for v in value ]))
+
+    elif isinstance(value, dict):
+        inner = indent + " " * 4
+        lines = [ "{" ]
+
+        for k, v in value.items():
+            if isinstance(v, dict):
+                lines.append(f"{ inner }{ k }\n{ inner }{ foamValue(v, inner) }")
+
+            else:
+                lines.append(f"{ inner }{ k } { foamValue(v, inner) };")
+
+        lines.append(f"{ indent }}}")
+
+        return "\n".join(lines)
+
+    elif value is None:
+        return ""
+
+    else:
+        return str(value)
+
+
+class FoamFile(object):
+    """OpenFOAM dictionary file (also compressed with gzip).
+    Entries are addressed with dot-separated paths like in `foamDictionary`:
+
+    .. code-block:: python
+
+        with FoamFile("0/U") as foamfile:
+            foamfile["boundaryField.inlet.type"] = "fixedValue"
+            foamfile["boundaryField.inlet.value"] = "uniform (0 0 1)"
+
+        nu = FoamFile("constant/transportProperties")["nu"]
+
+    Changes are written once on :meth:`write` (or on exit from `with` block).
+
+    :param path:
+        Path to file
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.compressed = False
+
+        if not os.path.exists(path) and os.path.exists(path + ".gz"):
+            self.path = path + ".gz"
+
+        if self.path.endswith(".gz"):
+            self.compressed = True
+
+            with gzip.open(self.path, "rb") as io:
+                raw = io.read()
+
+        else:
+            with open(self.path, "rb") as io:
+                raw = io.read()
+
+        # NOTE: latin-1 maps bytes to chars one-to-one, so binary content stays untouched
+        self.text = raw.decode("latin-1")
+        self.modified = False
+        self._parse()
+
+    def _parse(self):
+        self.parser = Parser(self.text)
+        self.root = self.parser.parse()
+
+    def _split(self, path) -> list:
+        return path.split(".") if isinstance(path, str) else list(path)
+
+    def _container(self, node):
+        """Returns dictionary-like node: Dictionary or List of keyed dictionaries"""
+        if isinstance(node, Entry):
+            if node.dict:
+                return node.dict
+
+            elif len(node.value) == 1 and isinstance(node.value[0], List):
+                return node.value[0]
+
+            elif len(node.value) == 2 and isinstance(node.value[1], List):
+                # Sized list
+                return node.value[1]
+
+        return node
+
+    def _child(self, node, key: str):
+        node = self._container(node)
+
+        if isinstance(node, Dictionary):
+            return node.find(key)
+
+        elif isinstance(node, List):
+            for n, item in enumerate(node.items[:-1]):
+                if isinstance(item, Word) and item == key and isinstance(node.items[n + 1], Dictionary):
+                    return node.items[n + 1]
+
+        return None
+
+    def _find(self, path):
+        node = self.root
+
+        for key in self._split(path):
+            node = self._child(node, key)
+
+            if node is None:
+                return None
+
+        return node
+
+    def _convertItem(self, item):
+        if isinstance(item, String):
+            return str(item)
+
+        elif isinstance(item, Word):
+            if _integer.match(item.lstrip("-+")):
+                return int(item)
+
+            elif _number.match(item):
+                return float(item)
+
+            return str(item)
+
+        elif isinstance(item, List):
+            items = item.items
+
+            # List of keyed dictionaries
+            if items and len(items) % 2 == 0 and all([
+                isinstance(items[n], Word) and isinstance(items[n + 1], Dictionary)
+                    for n in range(0, len(items), 2)
+            ]):
+                return { str(items[n]): self._convertItem(items[n + 1]) for n in range(0, len(items), 2) }
+
+            return [ 
+                self._convertItem(i) for n, i in enumerate(items) 
+                    if not (
+                        isinstance(i, Word) and _integer.match(i) and 
+                        n + 1 < len(items) and isinstance(items[n + 1], (List, Field))
+                    )
+            ]
+
+        elif isinstance(item, Dictionary):
+            return { entry.keyword: self._convert(entry) for entry in item.entries }
+
+        elif isinstance(item, Field):
+            return self._convertField(item)
+
+    def _convertField(self, field: Field) -> numpy.ndarray:
+        components = _components[field.type]
+        content = self.text[field.start + 1 : field.end - 1]
+
+        if field.binary:
+            if field.type == "label":
+                dtype = "<i{}".format(self.parser.labelSize)
+
+            else:
+                dtype = "<f{}".format(self.parser.scalarSize)
+
+            array = numpy.frombuffer(content.encode("latin-1"), dtype = dtype)
+
+        else:
+            array = numpy.array(content.replace("(", " ").replace(")", " ").split(), dtype = float)
+
+        return array.reshape(-1, components) if components > 1 else array
+
+    def _convert(self, entry: Entry):
+        if entry.dict:
+            return self._convertItem(entry.dict)
+
+        items = entry.value
+        values = [ 
+            self._convertItem(item) for n, item in enumerate(items) 
+                # Skip size of list
+                if not (
+                    isinstance(item, Word) and _integer.match(item) and 
+                    n + 1 < len(items) and isinstance(items[n + 1], (List, Field))
+                )
+        ]
+
+        return values[0] if len(values) == 1 else values
+
+    def get(self, path, default = None):
+        """Returns value of entry converted to python types.
+        Dictionaries are converted to dicts, lists to lists, numbers to numbers,
+        large lists of primitives to :class:`numpy.ndarray`.
+
+        :param path:
+            Dot-separated string or list of keywords
+        """
+        node = self._find(path)
+
+        if node is None:
+            return default
+
+        if isinstance(node, Dictionary):
+            return self._convertItem(node)
+
+        return self._convert(node)
+
+    def raw(self, path) -> str:
+        """Returns original text of entry value"""
+        node = self._find(path)
+
+        if node is None:
+            return None
+
+        if isinstance(node, Dictionary):
+            return self.text[node.open : node.close + 1]
+
+        if node.dict:
+            return self.text[node.dict.open : node.dict.close + 1]
+
+        return self.text[node.valueStart : node.valueEnd]
+
+    def _indent(self, dictionary: Dictionary) -> str:
+        """Indentation of entries inside dictionary"""
+        if dictionary.entries:
+            position = dictionary.entries[0].start
+
+        elif dictionary.open is not None:
+            lineStart = self.text.rfind("\n", 0, dictionary.open) + 1
+            prefix = self.text[lineStart : dictionary.open]
+
+            return prefix[: len(prefix) - len(prefix.lstrip())] + " " * 4
+
+        else:
+            return ""
+
+        lineStart = self.text.rfind("\n", 0, position) + 1
+
+        return self.text[lineStart : position] if not self.text[lineStart : position].strip() else ""
+
+    def _replace(self, start: int, end: int, text: str):
+        self.text = self.text[:start] + text + self.text[end:]
+        self.modified = True
+        self._parse()
+
+    def _insert(self, dictionary: Dictionary, key: str, value):
+        indent = self._indent(dictionary)
+
+        if isinstance(value, dict):
+            text = f"{ indent }{ key }\n{ indent }{ foamValue(value, indent) }\n"
+
+        else:
+            text = f"{ indent }{ key } { foamValue(value, indent) };\n"
+
+        # Insert before the line with closing bracket
+        position = dictionary.close
+        lineStart = self.text.rfind("\n", 0, position) + 1
+
+        if not self.text[lineStart : position].strip():
+            position = lineStart
+
+        else:
+            text = "\n" + text
+
+        if dictionary.open is None and self.text and not self.text.endswith("\n"):
+            text = "\n" + text
+
+        self._replace(position, position, text)
+
+    def set(self, path, value):
+        """Sets value of entry. Missed entries (and parent dictionaries) are created.
+        Dicts are merged with existing dictionaries key by key.
+
+        :param path:
+            Dot-separated string or list of keywords
+
+        :param value:
+            Python value or string in OpenFOAM notation
+        """
+        keys = self._split(path)
+        parent = self.root
+
+        for n, key in enumerate(keys[:-1]):
+            child = self._child(parent, key)
+
+            # Missed or not a dictionary
+            if child is None or (isinstance(child, Entry) and self._container(child) is child):
+                container = self._container(parent)
+
+                if not isinstance(container, Dictionary):
+                    raise FoamFileError(f"Cannot create entry '{ key }' inside list")
+
+                nested = value
+
+                for k in reversed(keys[n + 1:]):
+                    nested = { k: nested }
+
+                if child is not None:
+                    self.remove(keys[: n + 1])
+                    container = self._container(self._find(keys[:n]))
+
+                self._insert(container, key, nested)
+
+                return
+
+            parent = child
+
+        key = keys[-1]
+        entry = self._child(parent, key)
+        container = self._container(parent)
+
+        if entry is None:
+            if not isinstance(container, Dictionary):
+                raise FoamFileError(f"Cannot create entry '{ key }' inside list")
+
+            self._insert(container, key, value)
+
+        elif isinstance(value, dict) and isinstance(self._container(entry), Dictionary):
+            for k, v in value.items():
+                self.set(keys + [k], v)
+
+        elif isinstance(entry, Entry) and not entry.dict and not isinstance(value, dict):
+            self._replace(entry.valueStart, entry.valueEnd, foamValue(value, self._indent(container)))
+
+        elif isinstance(entry, Entry):
+            # Type of entry is changed (value <-> dictionary)
+            indent = self._indent(container)
+
+            if isinstance(value, dict):
+                text = f"{ key }\n{ indent }{ foamValue(value, indent) }"
+
+            else:
+                text = f"{ key } { foamValue(value, indent) };"
+
+            self._replace(entry.start, entry.end, text)
+
+        else:
+            # Keyed dictionary inside list
+            self._replace(entry.open, entry.close + 1, foamValue(value, self._indent(container)))
+
+    def update(self, entries: dict):
+        """Sets several entries at once
+
+        :param entries:
+            Dict with paths as keys
+        """
+        for path, value in entries.items():
+            self.set(path, value)
+
+    def remove(self, path):
+        """Removes entry"""
+        node = self._find(path)
+
+        if isinstance(node, Entry):
+            lineStart = self.text.rfind("\n", 0, node.start) + 1
+            start = lineStart if not self.text[lineStart : node.start].strip() else node.start
+            end = node.end
+
+            if self.text[end : end + 1] == "\n":
+                end += 1
+
+            self._replace(start, end, "")
+
+    def __contains__(self, path) -> bool:
+        return self._find(path) is not None
+
+    def __getitem__(self, path):
+        if path not in self:
+            raise KeyError(path)
+
+        return self.get(path)
+
+    def __setitem__(self, path, value):
+        self.set(path, value)
+
+    def __delitem__(self, path):
+        self.remove(path)
+
+    def write(self, path: str = None):
+        """Writes file if it was modified (or to another path)"""
+        if not self.modified and not path:
+            return
+
+        path = path or self.path
+        raw = self.text.encode("latin-1")
+
+        if path.endswith(".gz"):
+            with gzip.open(path, "wb") as io:
+                io.write(raw)
+
+        else:
+            with open(path, "wb") as io:
+                io.write(raw)
+
+        self.modified = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not exc_type:
+            self.write()
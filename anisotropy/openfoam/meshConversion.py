@@ -2,8 +2,502 @@
 # This file is part of anisotropy.
 # License: GNU GPL version 3, see the file "LICENSE" for details.
 
+import os
+import re
+import logging
+
+import numpy
+
 from .application import application
 
-def ideasUnvToFoam(mesh: str, case: str = None) -> (str, int):
+logger = logging.getLogger("anisotropy")
+
+
+def ideasUnvToFoam(mesh: str, case: str = None):
     return application("ideasUnvToFoam", mesh, case = case, stderr = True)
 
+
+class MeshConversionError(Exception):
+    pass
+
+
+###
+#   I-DEAS universal file reader
+##
+_unvBeams = { 11, 21, 22, 23, 24, 25 }
+
+def readUNV(path: str) -> dict:
+    """Reads nodes (dataset 2411), elements (2412) and groups (2467, 2477, 2452, 2435) 
+    from I-DEAS universal file
+
+    :return:
+        Dict with `nodes` (labels), `points` (coordinates), 
+        `elements` (dict of (fe descriptor, count of nodes) -> (labels, connectivity by node labels)) 
+        and `groups` (dict of name -> element labels)
+    """
+    with open(path, "r") as io:
+        text = io.read()
+
+    chunks = re.split(r"^\s*-1[ \t]*$", text, flags = re.M)
+    result = dict(nodes = None, points = None, elements = {}, groups = {})
+
+    # Datasets are the odd chunks between delimiters
+    for chunk in chunks[1::2]:
+        lines = chunk.strip("\n").split("\n")
+        dataset = lines[0].strip()
+
+        if dataset == "2411":
+            records = lines[1:]
+            result["nodes"] = numpy.array([ line.split()[0] for line in records[0::2] ], dtype = numpy.int64)
+            result["points"] = numpy.array(
+                " ".join(records[1::2]).replace("D", "E").replace("d", "e").split(), 
+                dtype = numpy.float64
+            ).reshape(-1, 3)
+
+        elif dataset == "2412":
+            ints = numpy.array(" ".join(lines[1:]).split(), dtype = numpy.int64)
+            pos = 0
+
+            # Elements of the same type are written in a row, 
+            # so records are taken by blocks of equal size
+            while pos < len(ints):
+                fe, count = ints[pos + 1], ints[pos + 5]
+                stride = 6 + (3 if fe in _unvBeams else 0) + count
+                rows = (len(ints) - pos) // stride
+                block = ints[pos : pos + rows * stride].reshape(rows, stride)
+                same = (block[:, 1] == fe) & (block[:, 5] == count)
+                run = rows if same.all() else int(numpy.argmin(same))
+
+                if run == 0:
+                    raise MeshConversionError(f"Broken element record in '{ path }'")
+
+                block = block[:run]
+
+                if fe not in _unvBeams:
+                    key = (int(fe), int(count))
+                    labels, connectivity = result["elements"].get(key, (None, None))
+                    newLabels, newConnectivity = block[:, 0], block[:, stride - count:]
+
+                    if labels is not None:
+                        newLabels = numpy.concatenate([labels, newLabels])
+                        newConnectivity = numpy.concatenate([connectivity, newConnectivity])
+
+                    result["elements"][key] = (newLabels, newConnectivity)
+
+                pos += run * stride
+
+        elif dataset in ["2467", "2477", "2452", "2435"]:
+            n = 1
+
+            while n < len(lines):
+                header = lines[n].split()
+
+                if not header:
+                    n += 1
+                    continue
+
+                count = int(header[-1])
+                name = lines[n + 1].strip()
+                nlines = (count + 1) // 2
+                entities = numpy.array(
+                    " ".join(lines[n + 2 : n + 2 + nlines]).split(), dtype = numpy.int64
+                ).reshape(-1, 4)[:count]
+
+                # Entity type 8 is a finite element
+                result["groups"][name] = entities[entities[:, 0] == 8, 1]
+                n += 2 + nlines
+
+    if result["points"] is None:
+        raise MeshConversionError(f"Missed nodes dataset in '{ path }'")
+
+    return result
+
+
+###
+#   Volume elements topology 
+#
+#   NOTE: Orientation of faces is fixed later, so faces only should be valid polygons
+##
+_cellFaces = {
+    # tetrahedron
+    4: [[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]],
+    # pyramid
+    5: [[0, 3, 2, 1], [0, 1, 4], [1, 2, 4], [2, 3, 4], [3, 0, 4]],
+    # prism
+    6: [[0, 2, 1], [3, 4, 5], [0, 1, 4, 3], [1, 2, 5, 4], [2, 0, 3, 5]],
+    # hexahedron
+    8: [[0, 3, 2, 1], [4, 5, 6, 7], [0, 1, 5, 4], [1, 2, 6, 5], [2, 3, 7, 6], [3, 0, 4, 7]]
+}
+
+def _faceNormals(points: numpy.ndarray, faces: numpy.ndarray) -> (numpy.ndarray, numpy.ndarray):
+    """Area vectors and centres of triangles and quads (padded with -1)"""
+    quad = faces[:, 3] >= 0
+    a, b, c = points[faces[:, 0]], points[faces[:, 1]], points[faces[:, 2]]
+    d = numpy.where(quad[:, None], points[faces[:, 3]], c)
+
+    normals = numpy.cross(c - a, d - b) * 0.5
+    normals[~quad] = numpy.cross(b - a, c - a)[~quad] * 0.5
+    centres = numpy.where(quad[:, None], (a + b + c + d) / 4, (a + b + c) / 3)
+
+    return normals, centres
+
+
+def _flip(faces: numpy.ndarray, mask: numpy.ndarray):
+    """Reverses order of face nodes (first node is kept)"""
+    quad = faces[:, 3] >= 0
+    tri = mask & ~quad
+    faces[tri, 1], faces[tri, 2] = faces[tri, 2], faces[tri, 1].copy()
+    quad = mask & quad
+    faces[quad, 1], faces[quad, 3] = faces[quad, 3], faces[quad, 1].copy()
+
+
+def buildPolyMesh(unv: dict, patches: list = None, scale: list = None) -> dict:
+    """Constructs face-based mesh from UNV elements
+
+    :param patches:
+        List of patch definitions like in `createPatchDict`: 
+        dicts with `name`, `patchInfo` (`type`, `inGroups`) and `patches` (source group names).
+        Faces that are not in any group are placed to `defaultFaces`.
+
+    :param scale:
+        Scale factors for x, y, z
+
+    :return:
+        Dict with `points`, `faces`, `owner`, `neighbour` and `boundary` 
+        (list of dicts with `name`, `type`, `inGroups`, `nFaces`, `startFace`)
+    """
+    nodes, points = unv["nodes"], unv["points"]
+
+    if scale is not None:
+        points = points * numpy.array(scale, dtype = numpy.float64)
+
+    lookup = numpy.full(nodes.max() + 1, -1, dtype = numpy.int64)
+    lookup[nodes] = numpy.arange(len(nodes))
+
+    ###
+    #   Faces of cells
+    ##
+    faces, owners, cellCentres = [], [], []
+    ncells = 0
+
+    # FE descriptors of volume elements are starting from 111
+    for (fe, count), (labels, connectivity) in sorted(unv["elements"].items()):
+        if fe < 111 or count not in _cellFaces:
+            continue
+
+        cells = lookup[connectivity]
+        cellCentres.append(points[cells].mean(axis = 1))
+
+        for local in _cellFaces[count]:
+            face = numpy.full((len(cells), 4), -1, dtype = numpy.int64)
+            face[:, : len(local)] = cells[:, local]
+            faces.append(face)
+            owners.append(numpy.arange(ncells, ncells + len(cells)))
+
+        ncells += len(cells)
+
+    if not ncells:
+        raise MeshConversionError("Mesh has no volume elements")
+
+    faces = numpy.concatenate(faces)
+    owners = numpy.concatenate(owners)
+    cellCentres = numpy.concatenate(cellCentres)
+
+    # Faces point outside of their cells
+    normals, centres = _faceNormals(points, faces)
+    _flip(faces, numpy.einsum("ij,ij->i", normals, centres - cellCentres[owners]) < 0)
+
+    ###
+    #   Internal and boundary faces
+    ##
+    keys = numpy.sort(faces, axis = 1)
+    _, inverse, counts = numpy.unique(keys, axis = 0, return_inverse = True, return_counts = True)
+    inverse = inverse.ravel()
+
+    if counts.max() > 2:
+        raise MeshConversionError("Mesh is not manifold: face is shared by more than two cells")
+
+    order = numpy.argsort(inverse, kind = "stable")
+    starts = numpy.concatenate([[0], numpy.cumsum(counts)[:-1]])
+
+    internal = counts == 2
+    first, second = order[starts[internal]], order[starts[internal] + 1]
+    swap = owners[first] > owners[second]
+    own = numpy.where(swap, second, first)
+    nei = numpy.where(swap, first, second)
+
+    # Upper triangular order
+    upper = numpy.lexsort((owners[nei], owners[own]))
+    internalFaces = faces[own[upper]]
+    internalOwner = owners[own[upper]]
+    internalNeighbour = owners[nei[upper]]
+
+    boundary = order[starts[~internal]]
+
+    ###
+    #   Patches
+    ##
+    groupNames = []
+    groupKeys = []
+    groupIds = []
+    elementKeys = {}
+
+    for (fe, count), (labels, connectivity) in unv["elements"].items():
+        if fe < 111 and count in [3, 4]:
+            key = numpy.full((len(labels), 4), -1, dtype = numpy.int64)
+            key[:, : count] = lookup[connectivity]
+            elementKeys[(fe, count)] = (labels, numpy.sort(key, axis = 1))
+
+    for name, elements in unv["groups"].items():
+        for labels, key in elementKeys.values():
+            mask = numpy.isin(labels, elements)
+
+            if mask.any():
+                groupKeys.append(key[mask])
+                groupIds.append(numpy.full(mask.sum(), len(groupNames)))
+
+        groupNames.append(name)
+
+    boundaryPatch = numpy.full(len(boundary), -1, dtype = numpy.int64)
+
+    if groupKeys:
+        groupKeys = numpy.concatenate(groupKeys)
+        groupIds = numpy.concatenate(groupIds)
+        _, ids = numpy.unique(
+            numpy.concatenate([keys[boundary], groupKeys]), 
+            axis = 0, return_inverse = True
+        )
+        ids = ids.ravel()
+        patchOfId = numpy.full(ids.max() + 1, -1, dtype = numpy.int64)
+        patchOfId[ids[len(boundary):]] = groupIds
+        boundaryPatch = patchOfId[ids[: len(boundary)]]
+
+    # Source patches (groups) and faces without group
+    sources = { name: n for n, name in enumerate(groupNames) }
+    sources["defaultFaces"] = -1
+
+    # Target patches
+    targets = []
+    used = set()
+
+    for patch in (patches or []):
+        names = [ src for src in patch.get("patches", []) if src in sources ]
+        info = patch.get("patchInfo", {})
+        inGroups = info.get("inGroups", [])
+
+        targets.append(dict(
+            name = patch["name"],
+            type = info.get("type", "patch"),
+            inGroups = inGroups if isinstance(inGroups, list) else [ inGroups ],
+            sources = [ sources[src] for src in names ]
+        ))
+        used.update(names)
+
+    for name, n in sources.items():
+        if name not in used:
+            targets.append(dict(name = name, type = "patch", inGroups = [], sources = [ n ]))
+
+    boundaryFaces, boundaryOwner, boundaryList = [], [], []
+    startFace = len(internalFaces)
+
+    for target in targets:
+        mask = numpy.isin(boundaryPatch, target["sources"])
+        nFaces = int(mask.sum())
+
+        # Empty patches are removed like createPatch does
+        if not nFaces:
+            continue
+
+        boundaryFaces.append(faces[boundary[mask]])
+        boundaryOwner.append(owners[boundary[mask]])
+        boundaryList.append(dict(
+            name = target["name"],
+            type = target["type"],
+            inGroups = target["inGroups"],
+            nFaces = nFaces,
+            startFace = startFace
+        ))
+        startFace += nFaces
+
+    allFaces = numpy.concatenate([internalFaces] + boundaryFaces)
+    allOwner = numpy.concatenate([internalOwner] + boundaryOwner)
+
+    ###
+    #   Unused points are removed
+    ##
+    used = numpy.zeros(len(points), dtype = bool)
+    used[allFaces[allFaces >= 0]] = True
+    renumber = numpy.cumsum(used) - 1
+    allFaces = numpy.where(allFaces >= 0, renumber[allFaces], -1)
+
+    return dict(
+        points = points[used],
+        faces = allFaces,
+        owner = allOwner,
+        neighbour = internalNeighbour,
+        boundary = boundaryList,
+        nCells = ncells
+    )
+
+
+###
+#   polyMesh writer
+##
+_banner = """/*--------------------------------*- C++ -*----------------------------------*\\
+| =========                 |                                                 |
+| \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox           |
+|  \\\\    /   O peration     | Version:  v2012                                 |
+|   \\\\  /    A nd           | Website:  www.openfoam.com                      |
+|    \\\\/     M anipulation  |                                                 |
+\\*---------------------------------------------------------------------------*/
+"""
+_separator = "// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //\n\n"
+_footer = "\n\n// ************************************************************************* //\n"
+
+def _header(cls: str, obj: str, binary: bool, note: str = None) -> str:
+    lines = [
+        "FoamFile",
+        "{",
+        "    version     2.0;",
+        "    format      {};".format("binary" if binary else "ascii")
+    ]
+
+    if binary:
+        lines.append('    arch        "LSB;label=32;scalar=64";')
+
+    lines.append(f"    class       { cls };")
+
+    if note:
+        lines.append(f'    note        "{ note }";')
+
+    lines.extend([
+        '    location    "constant/polyMesh";',
+        f"    object      { obj };",
+        "}"
+    ])
+
+    return _banner + "\n".join(lines) + "\n" + _separator
+
+
+def _writeList(io, array: numpy.ndarray, binary: bool, fmt: str):
+    io.write(f"{ len(array) }\n(".encode())
+
+    if binary:
+        io.write(array.tobytes())
+
+    else:
+        io.write(b"\n")
+
+        if len(array):
+            numpy.savetxt(io, array, fmt = fmt)
+
+    io.write(b")")
+
+
+def writePolyMesh(mesh: dict, case: str, binary: bool = False):
+    """Writes mesh from :func:`buildPolyMesh` to `constant/polyMesh` of case"""
+    path = os.path.join(case, "constant", "polyMesh")
+    os.makedirs(path, exist_ok = True)
+
+    nPoints, nFaces = len(mesh["points"]), len(mesh["faces"])
+    note = "nPoints:{} nCells:{} nFaces:{} nInternalFaces:{}".format(
+        nPoints, mesh["nCells"], nFaces, len(mesh["neighbour"])
+    )
+    points = mesh["points"].astype("<f8")
+    owner = mesh["owner"].astype("<i4")
+    neighbour = mesh["neighbour"].astype("<i4")
+
+    with open(os.path.join(path, "points"), "wb") as io:
+        io.write(_header("vectorField", "points", binary).encode())
+        _writeList(io, points, binary, "(%.16g %.16g %.16g)")
+        io.write(_footer.encode())
+
+    faces = mesh["faces"]
+    sizes = (faces >= 0).sum(axis = 1)
+
+    with open(os.path.join(path, "faces"), "wb") as io:
+        if binary:
+            io.write(_header("faceCompactList", "faces", binary).encode())
+            offsets = numpy.concatenate([[0], numpy.cumsum(sizes)]).astype("<i4")
+            _writeList(io, offsets, binary, "%d")
+            io.write(b"\n\n")
+            _writeList(io, faces[faces >= 0].astype("<i4"), binary, "%d")
+
+        else:
+            io.write(_header("faceList", "faces", binary).encode())
+            lines = numpy.empty(nFaces, dtype = object)
+
+            for size, fmt in [(3, "3(%d %d %d)"), (4, "4(%d %d %d %d)")]:
+                mask = sizes == size
+                lines[mask] = [ fmt % tuple(face) for face in faces[mask, : size].tolist() ]
+
+            io.write(f"{ nFaces }\n(\n".encode())
+            io.write("\n".join(lines).encode())
+            io.write(b"\n)")
+
+        io.write(_footer.encode())
+
+    for name, array in [("owner", owner), ("neighbour", neighbour)]:
+        with open(os.path.join(path, name), "wb") as io:
+            io.write(_header("labelList", name, binary, note).encode())
+            _writeList(io, array, binary, "%d")
+            io.write(_footer.encode())
+
+    with open(os.path.join(path, "boundary"), "wb") as io:
+        lines = [ str(len(mesh["boundary"])), "(" ]
+
+        for patch in mesh["boundary"]:
+            lines.extend([
+                f"    { patch['name'] }",
+                "    {",
+                f"        type            { patch['type'] };"
+            ])
+
+            if patch["inGroups"]:
+                lines.append("        inGroups        {}({});".format(
+                    len(patch["inGroups"]), " ".join(patch["inGroups"])
+                ))
+
+            lines.extend([
+                f"        nFaces          { patch['nFaces'] };",
+                f"        startFace       { patch['startFace'] };",
+                "    }"
+            ])
+
+        lines.append(")")
+        io.write((_header("polyBoundaryMesh", "boundary", False) + "\n".join(lines) + _footer).encode())
+
+
+def unvToFoam(mesh: str, case: str, patches: list = None, scale: list = None, binary: bool = False) -> dict:
+    """Converts I-DEAS universal mesh to OpenFOAM polyMesh in one pass.
+    Replaces `ideasUnvToFoam`, `createPatch` and `transformPoints`.
+
+    :param mesh:
+        Path to UNV file
+
+    :param case:
+        Path to case directory
+
+    :param patches:
+        List of patch definitions (see :func:`buildPolyMesh`)
+
+    :param scale:
+        Scale factors for x, y, z
+
+    :param binary:
+        Write polyMesh in binary format
+
+    :return:
+        Mesh statistics
+    """
+    logger.info(f"unvToFoam: { mesh }")
+    polyMesh = buildPolyMesh(readUNV(mesh), patches = patches, scale = scale)
+    writePolyMesh(polyMesh, case, binary = binary)
+
+    return dict(
+        nPoints = len(polyMesh["points"]),
+        nCells = polyMesh["nCells"],
+        nFaces = len(polyMesh["faces"]),
+        nInternalFaces = len(polyMesh["neighbour"]),
+        patches = { patch["name"]: patch["nFaces"] for patch in polyMesh["boundary"] }
+    )
@@ -12,31 +12,30 @@ def createPatch(dictfile: str = None, case: str = None):
     if dictfile:
         args.extend(["-dict", dictfile])
 
-    application("createPatch", *args, case = case, stderr = True)
+    return application("createPatch", *args, case = case, stderr = True)
 
 
 def transformPoints(scale, case: str = None):
     _scale = f"({ scale[0] } { scale[1] } { scale[2] })"
 
-    application("transformPoints", "-scale", _scale, case = case, stderr = True)
+    return application("transformPoints", "-scale", _scale, case = case, stderr = True)
 
 
-def checkMesh(case: str = None) -> str:
-    _, err, returncode = application("checkMesh", "-allGeometry", "-allTopology", case = case, stderr = True)
-    out = ""
+def checkMesh(case: str = None):
+    res = application("checkMesh", "-allGeometry", "-allTopology", case = case, stderr = True)
 
-    with open("checkMesh.log", "r") as io:
+    with open(res.logpath, "r") as io:
         warnings = []
         for line in io:
             if re.search("\*\*\*", line):
                 warnings.append(line.replace("***", "").strip())
 
         if warnings:
-            out = "checkMesh:\n\t{}".format("\n\t".join(warnings))
+            res.out = "checkMesh:\n\t{}".format("\n\t".join(warnings))
 
-    return out, err, returncode
+    return res
 
 
 def renumberMesh(case: str = None):
-    application("renumberMesh", "-overwrite", useMPI = False, case = case, stderr = True)
+    return application("renumberMesh", "-overwrite", useMPI = False, case = case, stderr = True)
 
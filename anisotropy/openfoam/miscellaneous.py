@@ -10,5 +10,5 @@ def foamDictionary(filepath: str, entry: str, value: str = None, case: str = Non
     if value:
         args.extend(["-set", value])
 
-    application("foamDictionary", *args, case = case, stderr = False)
+    return application("foamDictionary", *args, case = case, stderr = False)
 
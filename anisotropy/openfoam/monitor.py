@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# This file is part of anisotropy.
+# License: GNU GPL version 3, see the file "LICENSE" for details.
+
+import os
+import threading
+import logging
+from collections import deque
+
+from .application import FileTail
+from .foamFile import FoamFile
+
+logger = logging.getLogger("anisotropy")
+
+
+def latestTimeDir(path: str) -> str:
+    """Returns the latest time subdirectory of postProcessing function object"""
+    times = []
+
+    if os.path.exists(path):
+        for d in os.listdir(path):
+            try:
+                times.append((float(d), d))
+
+            except ValueError:
+                pass
+
+    return os.path.join(path, max(times)[1]) if times else None
+
+
+class ConvergenceMonitor(threading.Thread):
+    """Watches solver log and flow rates of patches while solver is running.
+    Solver is stopped with `stopAt writeNow` (requires `runTimeModifiable`) 
+    when flow rates of all patches are settled and balanced.
+
+    :param case:
+        Path to case directory
+
+    :param patches:
+        Names of patches with `flowRatePatch(name=...)` function objects
+
+    :param tolerance:
+        Relative variation of flow rates allowed over `window`
+
+    :param window:
+        Count of last iterations to check
+
+    :param minIterations:
+        Solver is not stopped before this iteration
+
+    :param interval:
+        Time between checks in seconds
+
+    :param log:
+        Name of solver log file
+    """
+    def __init__(self, case: str, patches: list = None, tolerance: float = 1e-3, window: int = 100, 
+            minIterations: int = 0, interval: float = 5, log: str = "simpleFoam.log"):
+        threading.Thread.__init__(self, name = "ConvergenceMonitor", daemon = True)
+
+        self.case = case
+        self.patches = patches or [ "inlet", "outlet" ]
+        self.tolerance = tolerance
+        self.window = window
+        self.minIterations = minIterations
+        self.interval = interval
+
+        self.log = FileTail(os.path.join(case, log))
+        self.tails = {}
+        self.series = { patch: deque(maxlen = window) for patch in self.patches }
+
+        self.iteration = 0
+        self.converged = False
+        self.failed = False
+        self._done = threading.Event()
+
+    def _read(self):
+        for line in self.log.lines():
+            if line.startswith("Time = "):
+                self.iteration = float(line.split()[-1])
+
+            elif "FOAM FATAL" in line:
+                self.failed = True
+
+        for patch in self.patches:
+            path = latestTimeDir(os.path.join(self.case, "postProcessing", f"flowRatePatch(name={ patch })"))
+
+            if not path:
+                continue
+
+            filepath = max(
+                [ os.path.join(path, f) for f in os.listdir(path) if f.endswith(".dat") ],
+                key = os.path.getmtime,
+                default = None
+            )
+
+            if not filepath:
+                continue
+
+            if patch not in self.tails or not self.tails[patch].path == filepath:
+                self.tails[patch] = FileTail(filepath)
+
+            for line in self.tails[patch].lines():
+                if line.startswith("#") or not line.strip():
+                    continue
+
+                values = line.split()
+
+                try:
+                    self.series[patch].append(float(values[1]))
+
+                except (IndexError, ValueError):
+                    pass
+
+    def settled(self) -> bool:
+        """Checks flow rates for a plateau and balance of patches"""
+        if self.iteration < self.minIterations:
+            return False
+
+        means = []
+
+        for patch in self.patches:
+            values = self.series[patch]
+
+            if not len(values) == self.window:
+                return False
+
+            mean = sum(values) / len(values)
+
+            if mean == 0 or (max(values) - min(values)) > self.tolerance * abs(mean):
+                return False
+
+            means.append(abs(mean))
+
+        # Inflow equals outflow
+        return max(means) - min(means) <= self.tolerance * max(means)
+
+    def stopSolver(self):
+        with FoamFile(os.path.join(self.case, "system/controlDict")) as controlDict:
+            controlDict["stopAt"] = "writeNow"
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            try:
+                self._read()
+
+            except OSError as e:
+                logger.warning(f"ConvergenceMonitor: { e }")
+
+                continue
+
+            if self.failed:
+                break
+
+            if self.settled():
+                logger.info(f"Flow rates are settled at iteration { self.iteration }. Stopping solver ...")
+                self.stopSolver()
+                self.converged = True
+
+                break
+
+    def stop(self):
+        self._done.set()
+
+        if self.is_alive():
+            self.join()
+
+    def __enter__(self):
+        self.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
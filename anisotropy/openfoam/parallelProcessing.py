@@ -2,8 +2,39 @@
 # This file is part of anisotropy.
 # License: GNU GPL version 3, see the file "LICENSE" for details.
 
+import os
+
 from .application import application
+from .foamFile import FoamFile
+
+def decomposeParDict(nprocs: int, method: str = "scotch", case: str = None):
+    """Sets count of subdomains and decomposition method in `system/decomposeParDict`"""
+    with FoamFile(os.path.join(case or "", "system/decomposeParDict")) as dictionary:
+        dictionary.update({
+            "numberOfSubdomains": nprocs,
+            "method": method
+        })
+
+        # Coefficients of the 'simple' method are useless for others
+        if not method == "simple" and "coeffs" in dictionary:
+            del dictionary["coeffs"]
+
 
 def decomposePar(case: str = None):
-    application("decomposePar", case = case, stderr = True)
+    return application("decomposePar", "-force", case = case, stderr = True)
+
+
+def reconstructPar(case: str = None, latestTime: bool = True):
+    args = ["-latestTime"] if latestTime else []
+
+    return application("reconstructPar", *args, case = case, stderr = True)
+
+
+def processorDirs(case: str = None) -> list:
+    """Lists processor directories of decomposed case"""
+    path = case or os.getcwd()
 
+    return sorted(
+        [ os.path.join(path, d) for d in os.listdir(path) if d.startswith("processor") ],
+        key = lambda d: int(d.rsplit("processor", 1)[-1])
+    )
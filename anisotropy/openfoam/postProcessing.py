@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# This file is part of anisotropy.
+# License: GNU GPL version 3, see the file "LICENSE" for details.
+
+import os
+
+import numpy
+
+
+def functionObjectFiles(case: str, name: str, filename: str = None) -> list:
+    """Lists data files of function object in `postProcessing/<name>/<time>/`.
+    Restarted runs write to new time directories (or to `<file>_<time>.dat`),
+    so all files are returned in order of time.
+
+    :param name:
+        Name of function object, e.g. 'flowRatePatch(name=outlet)'
+
+    :param filename:
+        Name of data file, all '.dat' files if None
+    """
+    path = os.path.join(case, "postProcessing", name)
+    times = []
+
+    if not os.path.exists(path):
+        return []
+
+    for d in os.listdir(path):
+        try:
+            times.append((float(d), d))
+
+        except ValueError:
+            pass
+
+    files = []
+
+    for _, d in sorted(times):
+        dirpath = os.path.join(path, d)
+
+        for f in sorted(os.listdir(dirpath), key = lambda f: os.path.getmtime(os.path.join(dirpath, f))):
+            if (filename and f == filename) or (not filename and f.endswith(".dat")):
+                files.append(os.path.join(dirpath, f))
+
+    return files
+
+
+def lastValue(case: str, name: str, filename: str = None, column: int = 1, blocksize: int = 4096) -> (float, float):
+    """Reads the last record of function object output seeking from the end of file
+
+    :return:
+        Time and value of column or None
+    """
+    for path in reversed(functionObjectFiles(case, name, filename)):
+        with open(path, "rb") as io:
+            io.seek(0, os.SEEK_END)
+            pos = io.tell()
+            data = b""
+
+            while pos > 0:
+                step = min(blocksize, pos)
+                pos -= step
+                io.seek(pos)
+                data = io.read(step) + data
+                lines = data.split(b"\n")
+
+                # The first line can be partial until the beginning of file is reached
+                for line in reversed(lines if pos == 0 else lines[1:]):
+                    line = line.strip()
+
+                    if not line or line.startswith(b"#"):
+                        continue
+
+                    values = line.split()
+
+                    try:
+                        return float(values[0]), float(values[column])
+
+                    except (IndexError, ValueError):
+                        continue
+
+    return None
+
+
+def readSeries(case: str, name: str, filename: str = None, column: int = 1) -> numpy.ndarray:
+    """Reads the whole output of function object
+
+    :return:
+        Array with time and value columns, times are increasing
+    """
+    chunks = []
+
+    for path in functionObjectFiles(case, name, filename):
+        with open(path, "rb") as io:
+            lines = [ line for line in io.read().split(b"\n") if line.strip() and not line.lstrip().startswith(b"#") ]
+
+        if not lines:
+            continue
+
+        ncols = len(lines[0].split())
+        data = numpy.array(b" ".join(lines).split(), dtype = numpy.float64)
+        chunks.append(data[: len(data) // ncols * ncols].reshape(-1, ncols)[:, [0, column]])
+
+    if not chunks:
+        return numpy.empty((0, 2))
+
+    series = numpy.concatenate(chunks)
+
+    # Restarted run overwrites the tail of the previous one
+    keep = numpy.ones(len(series), dtype = bool)
+    keep[:-1] = series[:-1, 0] < numpy.minimum.accumulate(series[::-1, 0])[::-1][1:]
+
+    return series[keep]
+
+
+def loadSeries(cases: list, names: list, filename: str = None, column: int = 1) -> dict:
+    """Reads outputs of function objects for many cases in one pass
+
+    :param cases:
+        Paths to cases
+
+    :param names:
+        Names of function objects
+
+    :return:
+        Dict of name -> list of arrays (in order of cases)
+    """
+    series = { name: [] for name in names }
+
+    for case in cases:
+        for name in names:
+            series[name].append(readSeries(case, name, filename, column))
+
+    return series
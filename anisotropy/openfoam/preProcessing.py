@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# This file is part of anisotropy.
+# License: GNU GPL version 3, see the file "LICENSE" for details.
+
+import os
+
+from .application import application
+
+def mapFields(source: str, case: str = None, consistent: bool = True, sourceTime: str = "latestTime"):
+    """Maps fields of source case onto the mesh of case
+
+    :param source:
+        Path to source case (must be reconstructed)
+
+    :param consistent:
+        Geometry and boundary conditions of both cases are the same
+
+    :param sourceTime:
+        Time of source case, 'latestTime' or a number
+    """
+    args = [os.path.abspath(source), "-sourceTime", str(sourceTime)]
+
+    if consistent:
+        args.append("-consistent")
+
+    return application("mapFields", *args, case = case, stderr = True)
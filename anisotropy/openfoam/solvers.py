@@ -4,31 +4,28 @@
 
 from .application import application
 
-import re 
+import re
 
-def potentialFoam(case: str = None, useMPI: bool = False):
+def potentialFoam(case: str = None, useMPI: bool = False, nprocs: int = None, timeout: float = None):
     if useMPI:
-        out, err, returncode = application("potentialFoam", "-parallel", useMPI = True, case = case, stderr = True)
+        res = application("potentialFoam", "-parallel", useMPI = True, nprocs = nprocs, case = case, stderr = True, timeout = timeout)
 
     else:
-        out, err, returncode = application("potentialFoam", case = case, stderr = True)
+        res = application("potentialFoam", case = case, stderr = True, timeout = timeout)
 
-    return out, err, returncode
+    return res
 
 
-def simpleFoam(case: str = None, useMPI: bool = False):
+def simpleFoam(case: str = None, useMPI: bool = False, nprocs: int = None, timeout: float = None):
     if useMPI:
-        out, err, returncode = application("simpleFoam", "-parallel", useMPI = True, case = case, stderr = True)
+        res = application("simpleFoam", "-parallel", useMPI = True, nprocs = nprocs, case = case, stderr = True, timeout = timeout)
 
     else:
-        out, err, returncode = application("simpleFoam", case = case, stderr = True)
+        res = application("simpleFoam", case = case, stderr = True, timeout = timeout)
 
-    out = ""
-
-    with open("simpleFoam.log", "r") as io:
-        for line in io:
-            if re.search("solution converged", line):
-                out = "simpleFoam:\n\t{}".format(line.strip())
-
-    return out, err, returncode 
+    # Message is written at the end, so the whole log is not read
+    for line in res.tail:
+        if re.search("solution converged", line):
+            res.out = "simpleFoam:\n\t{}".format(line.strip())
 
+    return res
@@ -5,6 +5,7 @@
 import os
 import shutil
 from .application import application
+from .foamFile import FoamFile
 
 def version() -> str:
     return os.environ["WM_PROJECT_VERSION"]
@@ -27,7 +28,7 @@ def foamClean(case: str = None):
         if os.path.exists(os.path.join(path, d)):
             shutil.rmtree(os.path.join(path, d))
 
-    application("foamCleanTutorials", useMPI = False, case = case, stderr = True)
+    return application("foamCleanTutorials", useMPI = False, case = case, stderr = True)
 
 def uniform(value) -> str:
     if type(value) == list or type(value) == tuple:
@@ -38,3 +39,41 @@ def uniform(value) -> str:
 
     else:
         return ""
+
+
+def writePolicy(case: str = None, format: str = None, compression: bool = None, 
+        purgeWrite: int = None, writeInterval: int = None, writeAtEnd: bool = False):
+    """Sets output parameters of solver in `system/controlDict`.
+    Parameters with None value are not changed.
+
+    :param format:
+        'ascii' or 'binary'
+
+    :param compression:
+        Compress fields with gzip
+
+    :param purgeWrite:
+        Count of the last time directories to keep (0 keeps all)
+
+    :param writeInterval:
+        Count of iterations between writes
+
+    :param writeAtEnd:
+        Write fields only at the end of run (stopping by `stopAt writeNow` writes too)
+    """
+    with FoamFile(os.path.join(case or "", "system/controlDict")) as controlDict:
+        if format is not None:
+            controlDict["writeFormat"] = format
+
+        if compression is not None:
+            controlDict["writeCompression"] = "on" if compression else "off"
+
+        if purgeWrite is not None:
+            controlDict["purgeWrite"] = int(purgeWrite)
+
+        if writeAtEnd:
+            controlDict["writeControl"] = "timeStep"
+            controlDict["writeInterval"] = controlDict["endTime"]
+
+        elif writeInterval is not None:
+            controlDict["writeInterval"] = int(writeInterval)
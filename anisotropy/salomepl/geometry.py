@@ -23,3 +23,33 @@ def getGeom():
     return geompy
 
 
+def exportBREP(shape, groups: list, path: str) -> list:
+    """Exports shape to BREP file
+
+    :return:
+        Manifest of face groups (names and ids of subshapes), 
+        which is used to restore groups with :func:`importBREP`
+    """
+    geompy.ExportBREP(shape, path)
+
+    return [ 
+        dict(name = group.GetName(), ids = list(geompy.GetObjectIDs(group))) 
+            for group in groups 
+    ]
+
+
+def importBREP(path: str, manifest: list, name: str = None) -> tuple:
+    """Imports shape from BREP file and restores face groups
+
+    :return:
+        Shape and list of groups
+    """
+    shape = geompy.ImportBREP(path, theName = name)
+    groups = []
+
+    for entry in manifest:
+        group = geompy.CreateGroup(shape, geompy.ShapeType["FACE"], theName = entry["name"])
+        geompy.UnionIDs(group, entry["ids"])
+        groups.append(group)
+
+    return shape, groups
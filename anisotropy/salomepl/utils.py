@@ -100,6 +100,12 @@ class SalomeManager(object):
             out, err = lastproc.communicate()
             returncode = lastproc.returncode
 
+        except BaseException:
+            # Worker is stopped, servers of the session should not outlive it
+            self.kill()
+
+            raise
+
         if logpath:
             os.makedirs(logpath, exist_ok = True)
 
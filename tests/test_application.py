@@ -0,0 +1,89 @@
+import os
+import time
+import tempfile
+import unittest
+
+from anisotropy.openfoam.application import application
+
+
+def alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{ pid }/stat", "r") as io:
+            # Zombie is not reaped by init of container at once
+            return io.read().split(")")[-1].split()[0] != "Z"
+
+    except FileNotFoundError:
+        return False
+
+
+class TestApplication(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_timeout(self):
+        start = time.monotonic()
+        lines = []
+        result = application("sh", "-c", "sleep 30 & echo $! > sleep.pid; echo started; wait", case = self.path,
+            timeout = 1, callback = lines.append, interval = 0.1)
+
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertTrue(result.timedOut)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("timeout", result.err)
+        self.assertEqual(lines, [ "started" ])
+        self.assertEqual(result.logpath, os.path.join(self.path, "sh.log"))
+
+        # Grandchild is killed with the process group
+        with open(os.path.join(self.path, "sleep.pid"), "r") as io:
+            pid = int(io.read())
+
+        self.assertFalse(alive(pid))
+
+    def test_failure(self):
+        script = "; ".join([ f"echo line { n }" for n in range(30) ] + [ "echo error >&2", "exit 3" ])
+        result = application("sh", "-c", script, case = self.path)
+
+        self.assertEqual(result.returncode, 3)
+        self.assertFalse(result.timedOut)
+        self.assertGreater(result.maxrss, 0)
+        # Log keeps the whole output, tail only the last lines
+        self.assertEqual(len(result.tail), 20)
+        self.assertEqual(result.tail[-2: ], [ "line 29", "error" ])
+        self.assertTrue(result.err.startswith("sh failed (returncode 3)"))
+        self.assertIn("error", result.err)
+
+        with open(result.logpath, "r") as io:
+            self.assertEqual(len(io.read().splitlines()), 31)
+
+    def test_streaming(self):
+        logpath = os.path.join(self.path, "sh.log")
+        received = []
+
+        def callback(line: str):
+            # Line is in the log while process is still running
+            with open(logpath, "r") as io:
+                received.append((line, io.read().splitlines(), os.path.exists(os.path.join(self.path, "done"))))
+
+        script = "; ".join([ f"echo line { n }; sleep 0.2" for n in range(3) ] + [ "touch done" ])
+        result = application("sh", "-c", script, case = self.path, callback = callback, interval = 0.05)
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual([ line for line, _, _ in received ], [ f"line { n }" for n in range(3) ])
+
+        for line, log, done in received:
+            self.assertIn(line, log)
+            self.assertFalse(done)
+
+    def test_success(self):
+        result = application("true", case = self.path)
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.err, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from multiprocessing import Pool
+
+from anisotropy.core.cache import Cache
+
+
+def put(root: str, key: str, n: int):
+    filepath = os.path.join(root, f"mesh-{ n }.unv")
+
+    with open(filepath, "w") as io:
+        io.write(str(n))
+
+    cache = Cache(os.path.join(root, "cache"))
+    cache.put(key, [ filepath ], dict(n = n))
+
+    return cache.get(key)["n"]
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.cache = Cache(os.path.join(self.root, "cache"))
+        self.key = Cache.key(dict(type = "simple", theta = 0.07000000000000001))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_hit(self):
+        put(self.root, self.key, 1)
+        self.assertEqual(Cache.key(dict(type = "simple", theta = 0.07)), self.key)
+        self.assertEqual(self.cache.get(self.key), dict(n = 1, files = [ "mesh-1.unv" ]))
+
+        dst = os.path.join(self.root, "mesh.unv")
+        self.cache.fetch(self.key, "mesh-1.unv", dst)
+
+        with open(dst, "r") as io:
+            self.assertEqual(io.read(), "1")
+
+        # Entry is not replaced
+        put(self.root, self.key, 2)
+        self.assertEqual(self.cache.get(self.key)["n"], 1)
+
+    def test_concurrent_put(self):
+        with Pool(4) as pool:
+            stored = pool.starmap(put, [ (self.root, self.key, n) for n in range(8) ])
+
+        # Every process sees the same entry
+        self.assertEqual(len(set(stored)), 1)
+        self.assertEqual(os.listdir(self.cache.root), [ self.key ])
+        self.assertEqual(
+            sorted(os.listdir(self.cache.path(self.key))),
+            sorted([ Cache.manifest, f"mesh-{ stored[0] }.unv" ])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import gc
+import os
+import tempfile
+import warnings
+import unittest
+
+from click.testing import CliRunner
+
+from anisotropy import env
+from anisotropy.core.cli import anisotropy
+
+from .test_database import createDatabase
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+        self.env = dict(env)
+        self.runner = CliRunner()
+
+        createDatabase(self.path, [ ("simple", [1.0, 0.0, 0.0], n * 0.01) for n in range(1, 6) ]).close()
+
+    def tearDown(self):
+        env.clear()
+        env.update(self.env)
+        self.tmpdir.cleanup()
+
+    def test_status(self):
+        result = self.runner.invoke(anisotropy, [ "status", "-P", self.path ])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Not running", result.output)
+        self.assertIn("Cases: 5", result.output)
+
+        with open(os.path.join(self.path, "anisotropy.pid"), "w") as io:
+            io.write("12345\n")
+
+        # Pid file is closed after reading
+        with warnings.catch_warnings(record = True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            result = self.runner.invoke(anisotropy, [ "status", "-P", self.path ])
+            gc.collect()
+
+        self.assertIn("Running (pid 12345)", result.output)
+        self.assertEqual([ w for w in caught if issubclass(w.category, ResourceWarning) ], [])
+
+    def test_show_pages(self):
+        result = self.runner.invoke(anisotropy, [ 
+            "show", "-P", self.path, "--fields", "type,direction,theta", "--page-size", "2" 
+        ])
+        self.assertEqual(result.exit_code, 0, result.output)
+
+        lines = result.output.splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[0].split(), [ "type", "direction", "theta" ])
+
+        # Columns of all pages are aligned with the header
+        ends = [ lines[0].index("type") + 4, lines[0].index("direction") + 9, len(lines[0]) ]
+
+        for line in lines[1: ]:
+            self.assertEqual(len(line), len(lines[0]))
+            self.assertEqual([ line[end - 1] for end in ends ], [ "e", "]", line[-1] ])
+            self.assertTrue(line[ends[0]].isspace())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,432 @@
+import os
+import sys
+import sqlite3
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import toml
+from peewee import OperationalError
+
+from anisotropy import env
+from anisotropy.core.main import Anisotropy
+from anisotropy.core.database import Database, QueueLease, DatabaseLockedError, jobOwner, retryOnLock, caseKey
+
+
+def createDatabase(path: str, cases: list) -> Database:
+    database = Database("anisotropy", path)
+    database.setup()
+    database.updateMany([ 
+        {
+            "structure": dict(type = type, direction = direction, theta = theta),
+            "mesh": dict(facesToIgnore = ["inlet", "outlet"]),
+            "flow": dict(scale = [1e-5, 1e-5, 1e-5])
+        }
+        for type, direction, theta in cases
+    ])
+
+    return database
+
+
+class TestUpgrade(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+        self.dbpath = os.path.join(self.path, "anisotropy.db")
+
+        createDatabase(self.path, [ 
+            ("simple", [1.0, 0.0, 0.0], 0.01), 
+            ("simple", [0.0, 0.0, 1.0], 0.01),
+            ("simple", [0.0, 0.0, 1.0], 0.02)
+        ]).close()
+
+        # Lists in the old text format (written with `str`)
+        with sqlite3.connect(self.dbpath) as conn:
+            conn.execute("""UPDATE structure SET direction = '[' || 
+                CASE structure_id WHEN 1 THEN '1.0, 0.0, 0.0' ELSE '0.0, 0.0, 1.0' END || ']'""")
+            conn.execute("UPDATE flow SET scale = '[1e-05, 1e-05, 1e-05]'")
+            conn.execute("UPDATE mesh SET facesToIgnore = CASE mesh_id " 
+                "WHEN 1 THEN '[''inlet'', ''outlet'']' WHEN 2 THEN '[]' ELSE 'None' END")
+            conn.execute("UPDATE structure SET revision = NULL")
+            conn.execute("PRAGMA user_version = 1")
+
+        Database._checked.clear()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_lists(self):
+        database = Database("anisotropy", self.path)
+        database.setup()
+
+        with sqlite3.connect(self.dbpath) as conn:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], database.schemaVersion)
+            self.assertEqual(conn.execute("SELECT DISTINCT typeof(direction) FROM structure").fetchall(), [ ("blob", ) ])
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM structure WHERE revision IS NULL").fetchone()[0], 0)
+
+        params = database.load("simple", [1, 0, 0], 0.01)
+        self.assertEqual(params["structure"]["direction"], [1.0, 0.0, 0.0])
+        self.assertEqual(params["flow"]["scale"], [1e-5, 1e-5, 1e-5])
+        self.assertEqual(params["mesh"]["facesToIgnore"], ["inlet", "outlet"])
+
+        faces = [ database.load("simple", [0, 0, 1], theta)["mesh"]["facesToIgnore"] for theta in [0.01, 0.02] ]
+        self.assertEqual(faces, [ [], None ])
+
+    def test_direction_filter(self):
+        database = Database("anisotropy", self.path)
+        database.setup()
+
+        self.assertEqual(len(database.loadGeneral("simple", [0, 0, 1])), 2)
+        self.assertEqual(len(database.loadGeneral(None, [1.0, 0.0, 0.0])), 1)
+        self.assertEqual(len(list(database.cases([ "theta" ], { "direction": [0, 0, 1] }))), 2)
+
+
+class TestCases(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.database = createDatabase(self.tmpdir.name, [ 
+            *[ ("simple", [1.0, 0.0, 0.0], n * 0.01) for n in range(1, 6) ],
+            ("simple", [0.0, 0.0, 1.0], 0.01),
+            ("faceCentered", [1.0, 0.0, 0.0], 0.01)
+        ])
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_projection(self):
+        rows = list(self.database.cases([ "type", "theta" ], { "type": "faceCentered" }))
+
+        self.assertEqual(rows, [ { "type": "faceCentered", "theta": 0.01 } ])
+
+    def test_filters(self):
+        rows = list(self.database.cases([ "type", "direction" ], { "theta": 0.010000000001 }))
+        self.assertEqual(len(rows), 3)
+
+        rows = list(self.database.cases([ "theta" ], { "type": "simple", "direction": [1, 0, 0] }))
+        self.assertEqual([ row["theta"] for row in rows ], [ 0.01, 0.02, 0.03, 0.04, 0.05 ])
+
+    def test_paging(self):
+        rows = self.database.cases([ "theta" ], { "direction": [1, 0, 0], "type": "simple" }, [ "-theta" ], limit = 2, offset = 1)
+
+        self.assertEqual([ row["theta"] for row in rows ], [ 0.04, 0.03 ])
+
+    def test_unknown(self):
+        with self.assertRaises(KeyError):
+            list(self.database.cases([ "unknown" ]))
+
+
+class TestLoadMany(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cases = [ ("simple", [1.0, 0.0, 0.0], n * 0.01) for n in range(1, 4) ]
+        self.database = createDatabase(self.tmpdir.name, self.cases)
+
+        params = self.database.load(*self.cases[1])
+        params["submesh"] = [ dict(name = name, maxSize = 0.01) for name in [ "strips", "spheres" ] ]
+        self.database.updateMany([ params ])
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_order(self):
+        cases = [ self.cases[2], ("simple", [0.0, 0.0, 1.0], 0.01), self.cases[0], self.cases[1] ]
+        loaded = self.database.loadMany(cases)
+
+        self.assertEqual([ params.get("structure", {}).get("theta") for params in loaded ], [ 0.03, None, 0.01, 0.02 ])
+        # Missed case gives an empty dict
+        self.assertEqual(loaded[1], {})
+
+        for case, params in zip(cases, loaded):
+            if params:
+                self.assertEqual(params, self.database.load(*case))
+
+    def test_submeshes(self):
+        params = self.database.loadMany([ self.cases[1] ])[0]
+
+        # Submeshes are not repeated by outer joins with other tables
+        self.assertEqual([ submesh["name"] for submesh in params["submesh"] ], [ "strips", "spheres" ])
+        self.assertEqual(self.database.loadMany([]), [])
+
+
+class TestChangedCases(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cases = [ ("simple", [1.0, 0.0, 0.0], theta) for theta in [0.01, 0.02, 0.03] ]
+        self.database = createDatabase(self.tmpdir.name, self.cases)
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def params(self, theta: float, scale: float = 1e-5) -> dict:
+        return {
+            "structure": dict(type = "simple", direction = [1.0, 0.0, 0.0], theta = theta),
+            "mesh": dict(facesToIgnore = ["inlet", "outlet"]),
+            "flow": dict(scale = [scale, scale, scale])
+        }
+
+    def test_unchanged(self):
+        self.assertEqual(self.database.changedCases([ self.params(theta) for _, _, theta in self.cases ]), [])
+
+    def test_changed(self):
+        paramsAll = [ self.params(0.01), self.params(0.02, 1e-4), self.params(0.04) ]
+        changed = self.database.changedCases(paramsAll)
+
+        self.assertEqual(changed, paramsAll[1: ])
+
+        # Changed values are written to their own cases
+        self.database.updateMany(changed)
+        self.assertEqual(self.database.changedCases(paramsAll), [])
+        self.assertEqual(self.database.load("simple", [1, 0, 0], 0.01)["flow"]["scale"], [1e-5, 1e-5, 1e-5])
+
+    def test_evaluated(self):
+        params = self.params(0.01)
+        params["mesh"].update(maxSize = 0.5, minSize = 0.05)
+        params["meshresult"] = dict(volume = None)
+        self.database.updateMany([ params ])
+
+        # Values written by mesh computation
+        current = self.database.load("simple", [1, 0, 0], 0.01)
+        current["mesh"].update(maxSize = 0.123, minSize = 0.0123)
+        current["meshresult"].update(volume = 0.5)
+        self.database.update(current)
+
+        self.assertEqual(self.database.changedCases([ params ]), [])
+
+        params["mesh"]["fineness"] = 3
+        self.assertEqual(self.database.changedCases([ params ]), [ params ])
+
+
+class TestNearestFlow(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.database = createDatabase(self.tmpdir.name, [ 
+            *[ ("simple", [1.0, 0.0, 0.0], theta) for theta in [0.01, 0.02, 0.03, 0.05] ],
+            ("simple", [0.0, 0.0, 1.0], 0.04),
+            ("faceCentered", [1.0, 0.0, 0.0], 0.04)
+        ])
+
+        for type, direction, theta, status in [ 
+            ("simple", [1, 0, 0], 0.01, "Done"), 
+            ("simple", [1, 0, 0], 0.03, "Failed"),
+            ("simple", [1, 0, 0], 0.05, "Done"),
+            ("simple", [0, 0, 1], 0.04, "Done"),
+            ("faceCentered", [1, 0, 0], 0.04, "Done")
+        ]:
+            params = self.database.load(type, direction, theta)
+            params["flowresult"]["flowStatus"] = status
+            self.database.update(params)
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_nearest(self):
+        # Failed case and cases of other type or direction are not used
+        self.assertEqual(self.database.nearestFlow("simple", [1, 0, 0], 0.04)["theta"], 0.05)
+        self.assertEqual(self.database.nearestFlow("simple", [1, 0, 0], 0.02)["theta"], 0.01)
+
+        # Case itself is not used
+        self.assertEqual(self.database.nearestFlow("simple", [1, 0, 0], 0.05)["theta"], 0.01)
+
+    def test_maxDistance(self):
+        self.assertIsNone(self.database.nearestFlow("simple", [1, 0, 0], 0.03, maxDistance = 0.015))
+        self.assertIsNone(self.database.nearestFlow("bodyCentered", [1, 0, 0], 0.03))
+
+
+class TestQueueLease(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.database = createDatabase(self.tmpdir.name, [ ("simple", [1.0, 0.0, 0.0], 0.01) ])
+        self.database.createJobs([ 1 ], "all")
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_queued_between_stages(self):
+        # Mesh stage is done, case waits for the flow stage
+        self.assertTrue(self.database.claimJob(1, "coordinator", 0.3))
+
+        with QueueLease(self.database, "coordinator", 0.3):
+            time.sleep(0.5)
+            self.assertFalse(self.database.claimJob(1, "other", 0.3))
+
+        self.assertTrue(self.database.claimJob(1, "coordinator", 0.3))
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.database = createDatabase(self.tmpdir.name, [ ("simple", [1.0, 0.0, 0.0], theta) for theta in [0.01, 0.02] ])
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def pending(self) -> list:
+        return [ p["structure"]["structure_id"] for p in self.database.pendingJobs("all") ]
+
+    def test_running_kept(self):
+        self.database.createJobs([ 1, 2 ], "all")
+        self.assertTrue(self.database.claimJob(1, "remote:1", 60))
+
+        # Second coordinator does not take the case of the first one
+        self.assertEqual(self.database.createJobs([ 1, 2 ], "all"), [ 2 ])
+        self.assertFalse(self.database.claimJob(1, jobOwner(), 60))
+        self.assertTrue(self.database.claimJob(1, "remote:1", 60))
+
+    def test_dead_owner(self):
+        process = subprocess.Popen([ sys.executable, "-c", "pass" ])
+        process.wait()
+
+        self.database.createJobs([ 1, 2 ], "all")
+        self.assertTrue(self.database.claimJob(1, jobOwner(process.pid), 60))
+        self.assertTrue(self.database.claimJob(2, jobOwner(), 60))
+
+        # Restarted coordinator resumes the case of crashed one at once
+        self.assertEqual(self.pending(), [ 1 ])
+        self.assertTrue(self.database.claimJob(1, "restarted", 60))
+
+
+class TestStatus(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dbpath = os.path.join(self.tmpdir.name, "anisotropy.db")
+        self.database = createDatabase(self.tmpdir.name, [ ("simple", [1.0, 0.0, 0.0], n * 0.01) for n in range(1, 6) ])
+
+        for n in range(1, 6):
+            params = self.database.load("simple", [1, 0, 0], n * 0.01)
+            params["meshresult"].update(meshStatus = "Done", meshCalculationTime = 10.0 * n)
+            self.database.update(params)
+
+        self.database.createJobs([ 1, 2, 3, 4, 5 ], "mesh")
+        self.database.finishJobs([ 1 ], "Skipped")
+
+        for structureID in [ 2, 3 ]:
+            self.database.claimJob(structureID, "coordinator", 60)
+            self.database.finishJob(structureID, "coordinator", "Done")
+
+        self.database.claimJob(4, "coordinator", 60)
+
+        # Queue was created half an hour ago, one job is finished before the window
+        now = time.time()
+
+        with sqlite3.connect(self.dbpath) as conn:
+            conn.execute("UPDATE job SET created = ?", (now - 7200, ))
+            conn.execute("UPDATE job SET finished = ? WHERE structure_id = 2", (now - 5400, ))
+            conn.execute("UPDATE job SET finished = ? WHERE structure_id IN (1, 3)", (now - 60, ))
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_status(self):
+        res = self.database.status(3600)
+
+        self.assertEqual(res["cases"], 5)
+        self.assertEqual(res["mesh"], { "Done": 5 })
+        self.assertEqual(res["jobs"], { "mesh": { "Skipped": 1, "Done": 2, "Running": 1, "Queued": 1 } })
+        self.assertEqual(res["remaining"], 2)
+        # Only the computed job inside the window is counted
+        self.assertAlmostEqual(res["throughput"], 1.0)
+        self.assertAlmostEqual(res["eta"], 7200, delta = 1)
+        self.assertEqual(res["durations"]["mesh"], dict(count = 5, mean = 30.0, p95 = 50.0))
+        self.assertEqual(res["durations"]["flow"]["count"], 0)
+
+    def test_young_queue(self):
+        with sqlite3.connect(self.dbpath) as conn:
+            conn.execute("UPDATE job SET created = ?", (time.time() - 1800, ))
+
+        # Rate is measured from creation of the queue
+        self.assertAlmostEqual(self.database.status(3600)["throughput"], 2.0, places = 2)
+
+
+class TestCaseKey(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_normalized(self):
+        key = caseKey("simple", [1.0, 0.0, 0.0], 0.07)
+
+        self.assertEqual(caseKey("simple", [1, 0, 0], 0.07), key)
+        self.assertEqual(caseKey("simple", [1.0, -0.0, 0.0], 0.07000000000000001), key)
+        self.assertEqual(caseKey("simple", [1, 0, 0], 7 * 0.01), key)
+        self.assertNotEqual(caseKey("simple", [1, 0, 0], 0.08), key)
+        self.assertNotEqual(caseKey("simple", [0, 0, 1], 0.07), key)
+
+    def test_load(self):
+        database = createDatabase(self.path, [ ("simple", [1, 0, 0], 7 * 0.01) ])
+
+        try:
+            self.assertEqual(database.load("simple", [1.0, 0.0, 0.0], 0.07)["structure"]["theta"], 7 * 0.01)
+
+        finally:
+            database.close()
+
+    def test_fine_step(self):
+        config = toml.load(env["CONFIG"])
+        config["structures"][0]["structure"]["theta"] = [ 0.01, 0.02, 10 ** -(env["db_theta_digits"] + 1) ]
+        configpath = os.path.join(self.path, "anisotropy.toml")
+
+        with open(configpath, "w") as io:
+            toml.dump(config, io)
+
+        with self.assertRaises(ValueError):
+            list(Anisotropy().loadFromScratch(configpath))
+
+
+class TestRetryOnLock(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def locked(self, times: int, message: str = "database is locked"):
+        def func():
+            self.calls += 1
+
+            if self.calls <= times:
+                raise OperationalError(message)
+
+            return self.calls
+
+        return func
+
+    def test_retry(self):
+        with mock.patch("time.sleep") as sleep:
+            self.assertEqual(retryOnLock(self.locked(3), retries = 5, delay = 0.1, maxDelay = 0.3)(), 4)
+
+        # Delay grows exponentially up to the limit with jitter of 50 %
+        for wait, base in zip([ call.args[0] for call in sleep.call_args_list ], [ 0.1, 0.2, 0.3 ]):
+            self.assertGreaterEqual(wait, 0.5 * base)
+            self.assertLessEqual(wait, 1.5 * base)
+
+        self.assertEqual(sleep.call_count, 3)
+
+    def test_exhausted(self):
+        with mock.patch("time.sleep") as sleep:
+            with self.assertRaises(DatabaseLockedError):
+                retryOnLock(self.locked(10), retries = 2)()
+
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_other_error(self):
+        with mock.patch("time.sleep") as sleep:
+            with self.assertRaises(OperationalError) as ctx:
+                retryOnLock(self.locked(1, "no such table: structure"), retries = 2)()
+
+        self.assertNotIsInstance(ctx.exception, DatabaseLockedError)
+        self.assertEqual(self.calls, 1)
+        sleep.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+try:
+    import pyarrow
+
+except ImportError:
+    pyarrow = None
+
+from anisotropy.core.export import exportCases, readExport
+
+from .test_database import createDatabase
+
+
+def partFiles(path: str) -> list:
+    return sorted([ 
+        os.path.join(root, f) for root, _, files in os.walk(path) 
+            for f in files if f.endswith(".parquet") 
+    ])
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "export")
+        self.database = createDatabase(self.tmpdir.name, [ 
+            ("simple", [1.0, 0.0, 0.0], 0.01),
+            ("simple", [1.0, 0.0, 0.0], 0.02),
+            ("faceCentered", [1.0, 0.0, 0.0], 0.01)
+        ])
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_incremental(self):
+        self.assertEqual(exportCases(self.database, self.path), 3)
+        files = partFiles(self.path)
+        self.assertEqual(len(files), 2)
+
+        # Nothing is changed
+        self.assertEqual(exportCases(self.database, self.path), 0)
+        self.assertEqual(partFiles(self.path), files)
+
+        params = self.database.load("simple", [1, 0, 0], 0.02)
+        params["flow"]["scale"] = [2e-5, 2e-5, 2e-5]
+        self.database.update(params)
+
+        # Only the changed case is appended as a new file
+        self.assertEqual(exportCases(self.database, self.path), 1)
+        added = sorted(set(partFiles(self.path)) - set(files))
+        self.assertEqual(len(added), 1)
+        self.assertEqual(os.path.basename(os.path.dirname(added[0])), "type=simple")
+        self.assertTrue(set(files) < set(partFiles(self.path)))
+
+        df = readExport(self.path, [ "theta", "scale" ])
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df["key"].nunique(), 3)
+
+        scale = df[(df["type"] == "simple") & (df["theta"] == 0.02)]["scale"].iloc[0]
+        self.assertEqual(list(scale), [2e-5, 2e-5, 2e-5])
+
+
+if __name__ == "__main__":
+    unittest.main()
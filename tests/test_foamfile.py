@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from anisotropy import env
+from anisotropy.openfoam import FoamFile
+
+class TestFoamFile(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        shutil.copytree(env["openfoam_template"], self.path, dirs_exist_ok = True)
+
+    def test_roundtrip(self):
+        for d in ["0", "constant", "system"]:
+            for name in os.listdir(os.path.join(self.path, d)):
+                filepath = os.path.join(self.path, d, name)
+
+                with open(filepath, "rb") as io:
+                    original = io.read()
+
+                foamfile = FoamFile(filepath)
+                foamfile.write(filepath + ".new")
+
+                with open(filepath + ".new", "rb") as io:
+                    self.assertEqual(io.read(), original)
+
+    def test_get(self):
+        controlDict = FoamFile(os.path.join(self.path, "system/controlDict"))
+
+        self.assertEqual(controlDict["endTime"], 5000)
+        self.assertEqual(controlDict["functions.flowRatePatch(name=outlet).fields"], ["phi"])
+
+        createPatchDict = FoamFile(os.path.join(self.path, "system/createPatchDict"))
+
+        self.assertEqual(createPatchDict["patches"][1]["patchInfo"]["inGroups"], ["inlet"])
+
+    def test_set(self):
+        filepath = os.path.join(self.path, "0/U")
+
+        with FoamFile(filepath) as foamfile:
+            foamfile.update({
+                "boundaryField.inlet.type": "pressureInletVelocity",
+                "boundaryField.inlet.value": "uniform (1 0 0)",
+                "boundaryField.outlet.value": "uniform (0 0 0)",
+                "boundaryField.extra": { "type": "zeroGradient" }
+            })
+
+        foamfile = FoamFile(filepath)
+
+        self.assertEqual(foamfile["boundaryField.inlet.type"], "pressureInletVelocity")
+        self.assertEqual(foamfile["boundaryField.inlet.value"], ["uniform", [1, 0, 0]])
+        self.assertEqual(foamfile["boundaryField.outlet.value"], ["uniform", [0, 0, 0]])
+        self.assertEqual(foamfile["boundaryField.extra"], { "type": "zeroGradient" })
+        self.assertEqual(foamfile["dimensions"], "[0 1 -1 0 0 0 0]")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from anisotropy import env
+from anisotropy.openfoam import FoamFile, ConvergenceMonitor
+
+
+class TestConvergenceMonitor(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        shutil.copytree(env["openfoam_template"], self.path, dirs_exist_ok = True)
+        self.monitor = ConvergenceMonitor(self.path, tolerance = 1e-3, window = 10, minIterations = 30)
+        self.iteration = 0
+
+        for patch in self.monitor.patches:
+            os.makedirs(os.path.join(self.path, "postProcessing", f"flowRatePatch(name={ patch })", "0"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def solve(self, rates: list):
+        """Appends iterations to solver log and flow rates of patches"""
+        with open(os.path.join(self.path, "simpleFoam.log"), "a") as log:
+            for rate in rates:
+                self.iteration += 1
+                log.write(f"Time = { self.iteration }\n\nsmoothSolver: Solving for Ux\n")
+
+                for patch, sign in zip(self.monitor.patches, [ -1, 1 ]):
+                    datpath = os.path.join(
+                        self.path, "postProcessing", f"flowRatePatch(name={ patch })", "0", "surfaceFieldValue.dat"
+                    )
+
+                    with open(datpath, "a") as io:
+                        if self.iteration == 1:
+                            io.write("# Time    sum(phi)\n")
+
+                        io.write(f"{ self.iteration }\t{ sign * rate }\n")
+
+        self.monitor._read()
+
+        return self.monitor.settled()
+
+    def test_settled(self):
+        # Decaying rates are not settled
+        self.assertFalse(self.solve([ 1e-3 * (1 + 1 / n) for n in range(1, 16) ]))
+
+        # Plateau is not accepted before minIterations
+        self.assertFalse(self.solve([ 1e-3 ] * 10))
+        self.assertEqual(self.monitor.iteration, 25)
+        self.assertFalse(self.solve([ 1e-3 ] * 4))
+        self.assertTrue(self.solve([ 1e-3 ]))
+        self.assertEqual(self.monitor.iteration, 30)
+
+    def test_window(self):
+        self.solve([ 1e-3 * (1 + 1 / n) for n in range(1, 31) ])
+
+        # Plateau is shorter than window
+        self.assertFalse(self.solve([ 1e-3 ] * 9))
+        self.assertTrue(self.solve([ 1e-3 ]))
+
+    def test_stop(self):
+        self.solve([ 1e-3 ] * 30)
+        self.monitor.interval = 0.05
+
+        with self.monitor:
+            self.monitor.join(5)
+
+        self.assertTrue(self.monitor.converged)
+        self.assertEqual(FoamFile(os.path.join(self.path, "system/controlDict"))["stopAt"], "writeNow")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from anisotropy import env, openfoam
+from anisotropy.openfoam import FoamFile
+
+
+class TestWritePolicy(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        shutil.copytree(env["openfoam_template"], self.path, dirs_exist_ok = True)
+        self.controlDict = os.path.join(self.path, "system/controlDict")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_defaults(self):
+        with open(self.controlDict, "rb") as io:
+            original = io.read()
+
+        # Defaults of environment keep the template
+        openfoam.writePolicy(case = self.path, **env["flow_writepolicy"])
+
+        with open(self.controlDict, "rb") as io:
+            self.assertEqual(io.read(), original)
+
+    def test_policy(self):
+        openfoam.writePolicy(case = self.path, format = "binary", compression = True, purgeWrite = 2, writeInterval = 10)
+        controlDict = FoamFile(self.controlDict)
+
+        self.assertEqual(controlDict["writeFormat"], "binary")
+        self.assertEqual(controlDict["writeCompression"], "on")
+        self.assertEqual(controlDict["purgeWrite"], 2)
+        self.assertEqual(controlDict["writeInterval"], 10)
+
+        openfoam.writePolicy(case = self.path, writeAtEnd = True)
+        controlDict = FoamFile(self.controlDict)
+
+        self.assertEqual(controlDict["writeInterval"], controlDict["endTime"])
+        # Values are not changed if not given
+        self.assertEqual(controlDict["writeFormat"], "binary")
+
+
+class TestParallelProcessing(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        shutil.copytree(env["openfoam_template"], self.path, dirs_exist_ok = True)
+        self.dictpath = os.path.join(self.path, "system/decomposeParDict")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_decomposeParDict(self):
+        openfoam.decomposeParDict(8, case = self.path)
+        dictionary = FoamFile(self.dictpath)
+
+        self.assertEqual(dictionary["numberOfSubdomains"], 8)
+        self.assertEqual(dictionary["method"], "scotch")
+        self.assertNotIn("coeffs", dictionary)
+
+    def test_simple(self):
+        openfoam.decomposeParDict(4, method = "simple", case = self.path)
+        dictionary = FoamFile(self.dictpath)
+
+        self.assertEqual(dictionary["method"], "simple")
+        self.assertEqual(dictionary["coeffs.n"], [ 2, 2, 1 ])
+
+    def test_processorDirs(self):
+        for n in [ 10, 2, 0, 1 ]:
+            os.makedirs(os.path.join(self.path, f"processor{ n }"))
+
+        self.assertEqual(
+            [ os.path.basename(d) for d in openfoam.processorDirs(self.path) ], 
+            [ "processor0", "processor1", "processor2", "processor10" ]
+        )
+
+
+def writeDat(case: str, name: str, time: str, rows: list, filename: str = "surfaceFieldValue.dat"):
+    path = os.path.join(case, "postProcessing", name, time)
+    os.makedirs(path, exist_ok = True)
+
+    with open(os.path.join(path, filename), "w") as io:
+        io.write("# Surface field value\n# Time    sum(phi)\n")
+
+        for row in rows:
+            io.write("\t".join([ str(v) for v in row ]) + "\n")
+
+
+class TestPostProcessing(unittest.TestCase):
+    name = "flowRatePatch(name=outlet)"
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_lastValue(self):
+        self.assertIsNone(openfoam.lastValue(self.path, self.name))
+
+        writeDat(self.path, self.name, "0", [ (n, n * 0.5) for n in range(1, 501) ])
+
+        # Lines are split by blocks while seeking from the end
+        for blocksize in [ 7, 4096 ]:
+            self.assertEqual(openfoam.lastValue(self.path, self.name, blocksize = blocksize), (500.0, 250.0))
+
+        # Restarted run writes to a new time directory
+        writeDat(self.path, self.name, "450", [ (450, 1.0), (451, 2.0) ])
+        self.assertEqual(openfoam.lastValue(self.path, self.name), (451.0, 2.0))
+
+        # Empty file of a new run is skipped
+        writeDat(self.path, self.name, "1000", [])
+        self.assertEqual(openfoam.lastValue(self.path, self.name), (451.0, 2.0))
+
+    def test_readSeries(self):
+        self.assertEqual(openfoam.readSeries(self.path, self.name).shape, (0, 2))
+
+        writeDat(self.path, self.name, "0", [ (n, n, -n) for n in range(1, 11) ])
+        writeDat(self.path, self.name, "8", [ (n, 10 * n, 0) for n in range(8, 13) ])
+
+        # Tail of the first run is overwritten by the restarted one
+        series = openfoam.readSeries(self.path, self.name)
+        self.assertEqual(series[:, 0].tolist(), list(range(1, 13)))
+        self.assertEqual(series[:, 1].tolist(), [ 1, 2, 3, 4, 5, 6, 7, 80, 90, 100, 110, 120 ])
+
+        series = openfoam.readSeries(self.path, self.name, column = 2)
+        self.assertEqual(series[: 3, 1].tolist(), [ -1, -2, -3 ])
+
+
+if __name__ == "__main__":
+    unittest.main()
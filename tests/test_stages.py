@@ -0,0 +1,181 @@
+import os
+import tempfile
+from math import sqrt
+import unittest
+from unittest import mock
+
+import numpy
+
+from anisotropy import env
+from anisotropy.core import main
+from anisotropy.core.main import Anisotropy, initStage, computeMeshStage, flowLength, computePermeability, collectFlowSeries
+from anisotropy.core.database import Database, DatabaseServer
+from anisotropy.core.cache import Cache
+
+
+CASE = ("simple", [1.0, 0.0, 0.0], 0.01)
+
+
+def createCase(path: str) -> Database:
+    database = Database(env["db_name"], path)
+    database.setup()
+    database.update(next(Anisotropy().loadFromScratch(env["CONFIG"], *CASE)))
+
+    return database
+
+
+def salomeMesh(manager, scriptpath: str, *args, logpath: str = None, **kwargs):
+    """Writes results of mesh like `cli.py computemesh` in Salome does"""
+    type, direction, theta, path = args[1: 5]
+    model = Anisotropy()
+    model.db = Database(env["db_name"], path)
+    model.load(type, direction, theta)
+    model.params["mesh"].update(maxSize = 0.1, minSize = 0.01, chordalError = 0.05)
+
+    for submesh in model.params["submesh"]:
+        submesh.update(maxSize = 0.01, minSize = 0.001, chordalError = 0.01)
+
+    model.params["meshresult"].update(volume = 0.5, volumeCell = 1.0, surfaceArea = 2.0, elements = 1000)
+    model.update()
+
+    os.makedirs(logpath, exist_ok = True)
+
+    with open(os.path.join(logpath, "mesh.unv"), "w") as io:
+        io.write("mesh")
+
+    return "", "", 0
+
+
+class TestMeshStage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+        self.database = createCase(self.path)
+        self.env = dict(env)
+
+    def tearDown(self):
+        env.clear()
+        env.update(self.env)
+        main.stageDatabase = None
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_server(self):
+        with DatabaseServer(self.database, self.database.loadMany([ CASE ])) as server:
+            initStage(self.path, server.address, server.authkey)
+
+            with mock.patch("anisotropy.salomepl.utils.SalomeManager.execute", salomeMesh):
+                self.assertTrue(computeMeshStage(*CASE, self.path))
+
+        params = self.database.load(*CASE)
+        self.assertEqual(params["meshresult"]["meshStatus"], "Done")
+        self.assertEqual(params["meshresult"]["volume"], 0.5)
+        self.assertEqual(params["meshresult"]["elements"], 1000)
+        self.assertEqual(params["mesh"]["maxSize"], 0.1)
+
+        # Cache stores the values written by Salome
+        case = Anisotropy()
+        case.params = params
+        case.evalParams()
+        cache = Cache(case.getCachePath("mesh", self.path))
+        cached = cache.get(case.meshCacheKey())
+        self.assertEqual(cached["meshresult"]["volume"], 0.5)
+        self.assertEqual(cached["mesh"]["maxSize"], 0.1)
+
+    def test_missed_stats(self):
+        def salomeFailure(manager, scriptpath: str, *args, logpath: str = None, **kwargs):
+            os.makedirs(logpath, exist_ok = True)
+
+            with open(os.path.join(logpath, "mesh.unv"), "w") as io:
+                io.write("mesh")
+
+            return "", "", 0
+
+        main.stageDatabase = None
+
+        with mock.patch("anisotropy.salomepl.utils.SalomeManager.execute", salomeFailure):
+            self.assertTrue(computeMeshStage(*CASE, self.path))
+
+        cachepath = Anisotropy().getCachePath("mesh", self.path)
+        self.assertEqual(os.listdir(cachepath) if os.path.exists(cachepath) else [], [])
+
+
+class TestPermeability(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.database = createCase(self.tmpdir.name)
+
+        params = self.database.load(*CASE)
+        params["structure"].update(L = 2.0, r0 = 1.0)
+        params["flow"].update(
+            scale = [1e-5, 1e-5, 1e-5],
+            transportProperties = { "nu": 1e-6 },
+            pressure = { "boundaryField": { "inlet": { "value": 1e-3 }, "outlet": { "value": 0.0 } } }
+        )
+        params["meshresult"].update(volume = None, volumeCell = 8.0)
+        params["flowresult"].update(flowStatus = "Done", flowRate = -1e-9, porosity = 0.4)
+        self.database.update(params)
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_flowLength(self):
+        lengths = flowLength(
+            [ "simple", "faceCentered", "simple" ], 
+            [ [1, 0, 0], [1.0, 0.0, 0.0], [0, 1, 0] ], 
+            numpy.array([ 2.0, 1.0, 2.0 ]), 
+            numpy.array([ 1.0, 0.5, 1.0 ])
+        )
+
+        self.assertAlmostEqual(lengths[0], 2 * sqrt(2))
+        self.assertAlmostEqual(lengths[1], 1.0)
+        self.assertTrue(numpy.isnan(lengths[2]))
+
+    def test_permeability(self):
+        self.assertEqual(computePermeability(self.database), 1)
+
+        # Pore cell: length = 2 sqrt(2) * 1e-5, area = 8e-15 / length,
+        # k = nu Q length / (area dp) = nu Q length^2 / (volumeCell dp) = 1e-6 * 1e-9 * 8e-10 / (8e-15 * 1e-3)
+        flowresult = self.database.load(*CASE)["flowresult"]
+        self.assertAlmostEqual(flowresult["permeability"] / 1e-7, 1.0)
+        # Porosity of post processing is kept though volume is missed
+        self.assertEqual(flowresult["porosity"], 0.4)
+
+
+class TestFlowSeries(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+        self.database = createCase(self.path)
+
+        params = self.database.load(*CASE)
+        params["flowresult"].update(flowStatus = "Done")
+        self.database.update(params)
+
+    def tearDown(self):
+        self.database.close()
+        self.tmpdir.cleanup()
+
+    def test_collect(self):
+        structure = dict(zip([ "type", "direction", "theta" ], CASE))
+        case = Anisotropy().getCasePath(self.path, structure)
+
+        for name, sign in [ ("inlet", -1), ("outlet", 1) ]:
+            datpath = os.path.join(case, "postProcessing", f"flowRatePatch(name={ name })", "0")
+            os.makedirs(datpath)
+
+            with open(os.path.join(datpath, "surfaceFieldValue.dat"), "w") as io:
+                io.write("# Time    sum(phi)\n")
+                io.writelines([ f"{ n }\t{ sign * n * 1e-9 }\n" for n in range(1, 6) ])
+
+        self.assertEqual(collectFlowSeries(self.database, self.path), 1)
+
+        flowresult = self.database.load(*CASE)["flowresult"]
+        self.assertEqual(flowresult["flowRate"], 5e-9)
+        self.assertEqual(list(flowresult["inletSeries"]), [ -n * 1e-9 for n in range(1, 6) ])
+        self.assertEqual(list(flowresult["outletSeries"]), [ n * 1e-9 for n in range(1, 6) ])
+
+
+if __name__ == "__main__":
+    unittest.main()
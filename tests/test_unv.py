@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+from anisotropy.openfoam import FoamFile, readUNV, unvToFoam
+
+# Two tetrahedrons with common face in plane z = 0 and one grouped triangle
+unv = """    -1
+  2411
+         1         1         1        11
+   0.0000000000000000D+00   0.0000000000000000D+00   0.0000000000000000D+00
+         2         1         1        11
+   1.0000000000000000D+00   0.0000000000000000D+00   0.0000000000000000D+00
+         3         1         1        11
+   0.0000000000000000D+00   1.0000000000000000D+00   0.0000000000000000D+00
+         4         1         1        11
+   0.0000000000000000D+00   0.0000000000000000D+00   1.0000000000000000D+00
+         5         1         1        11
+   0.0000000000000000D+00   0.0000000000000000D+00  -1.0000000000000000D+00
+    -1
+    -1
+  2412
+         1        91         2         1         7         3
+         1         2         4
+         2       111         2         1         7         4
+         1         2         3         4
+         3       111         2         1         7         4
+         1         3         2         5
+    -1
+    -1
+  2467
+         1         0         0         0         0         0         0         1
+smesh_inlet
+         8         1         0         0
+    -1
+"""
+
+class TestUNV(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.mesh = os.path.join(self.path, "mesh.unv")
+
+        with open(self.mesh, "w") as io:
+            io.write(unv)
+
+    def test_read(self):
+        data = readUNV(self.mesh)
+
+        self.assertEqual(data["points"].shape, (5, 3))
+        self.assertEqual(data["points"][4, 2], -1)
+        self.assertEqual(len(data["elements"][(111, 4)][0]), 2)
+        self.assertEqual(data["groups"]["smesh_inlet"].tolist(), [1])
+
+    def test_convert(self):
+        patches = [
+            dict(name = "inlet", patchInfo = dict(type = "patch", inGroups = ["inlet"]), patches = ["smesh_inlet"]),
+            dict(name = "defaultFaces", patchInfo = dict(type = "wall"), patches = ["defaultFaces"])
+        ]
+        stats = unvToFoam(self.mesh, self.path, patches = patches, scale = [2, 2, 2])
+
+        self.assertEqual(stats["nCells"], 2)
+        self.assertEqual(stats["nFaces"], 7)
+        self.assertEqual(stats["nInternalFaces"], 1)
+        self.assertEqual(stats["patches"], { "inlet": 1, "defaultFaces": 5 })
+
+        polyMesh = os.path.join(self.path, "constant/polyMesh")
+        points = FoamFile(os.path.join(polyMesh, "points"))["entry0"]
+        faces = FoamFile(os.path.join(polyMesh, "faces"))["entry0"]
+        owner = FoamFile(os.path.join(polyMesh, "owner"))["entry0"]
+        neighbour = FoamFile(os.path.join(polyMesh, "neighbour"))["entry0"]
+        boundary = FoamFile(os.path.join(polyMesh, "boundary"))["entry0"]
+
+        self.assertEqual(numpy.abs(points).max(), 2)
+        self.assertLess(owner[0], neighbour[0])
+        self.assertEqual(boundary["inlet"]["startFace"], 1)
+
+        # Normal of internal face points from owner to neighbour
+        face = numpy.array(points)[faces[0]]
+        normal = numpy.cross(face[1] - face[0], face[2] - face[0])
+        self.assertGreater(normal[2] * (1 if owner[0] == 1 else -1), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import time
+import tempfile
+import unittest
+
+from anisotropy.core.utils import Task, ProcessPool, pipeline
+from anisotropy.openfoam.application import application
+
+
+def double(n: int, delay: float = 0) -> int:
+    time.sleep(delay)
+
+    return 2 * n
+
+
+def crashOnce(path: str) -> str:
+    marker = os.path.join(path, "crashed")
+
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+
+    return "done"
+
+
+def hang(path: str):
+    # Child in own session like OpenFOAM applications
+    application("sh", "-c", f"echo $$ > { os.path.join(path, 'child.pid') }; exec sleep 60", case = path, timeout = 120)
+
+
+def even(n: int) -> bool:
+    return n % 2 == 0
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+
+    except ProcessLookupError:
+        return False
+
+    # Zombie of reaped group can be left for a moment
+    with open(f"/proc/{ pid }/stat", "r") as io:
+        return io.read().split(")")[-1].split()[0] != "Z"
+
+
+class TestProcessPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_order(self):
+        delays = [ 0.6, 0.1, 0.3 ]
+
+        with ProcessPool(3) as pool:
+            positions = [ pool.submit(Task(double, n, delay)) for n, delay in enumerate(delays) ]
+            results = list(pool.results(0.05))
+
+        self.assertEqual(positions, [ 0, 1, 2 ])
+        # Results are streamed as tasks finished and keep positions of tasks
+        self.assertEqual([ pos for pos, _ in results ], [ 1, 2, 0 ])
+        self.assertEqual(dict(results), { 0: 0, 1: 2, 2: 4 })
+
+    def test_crash_retry(self):
+        with ProcessPool(1, retries = 1) as pool:
+            pool.submit(Task(crashOnce, self.path))
+            self.assertEqual(list(pool.results(0.05)), [ (0, "done") ])
+
+        os.remove(os.path.join(self.path, "crashed"))
+
+        with ProcessPool(1) as pool:
+            pool.submit(Task(crashOnce, self.path))
+            self.assertEqual(list(pool.results(0.05)), [ (0, None) ])
+
+    def test_timeout(self):
+        start = time.monotonic()
+
+        with ProcessPool(1, timeout = 1) as pool:
+            pool.submit(Task(hang, self.path))
+            pool.submit(Task(double, 1))
+            results = list(pool.results(0.1))
+
+        self.assertEqual(results, [ (0, None), (1, 2) ])
+        self.assertLess(time.monotonic() - start, 30)
+
+        # Child process group is stopped with the worker
+        with open(os.path.join(self.path, "child.pid"), "r") as io:
+            pid = int(io.read())
+
+        self.assertFalse(alive(pid))
+
+    def test_pipeline(self):
+        results = pipeline([ (even, 2), (double, 1) ], [ (n, ) for n in range(5) ], interval = 0.05)
+
+        # Odd items are stopped by the first stage
+        self.assertEqual(sorted(results), [ (0, 0), (1, False), (2, 4), (3, False), (4, 8) ])
+
+
+if __name__ == "__main__":
+    unittest.main()